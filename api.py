@@ -2,24 +2,42 @@
 API backend for COVID-19 Sentiment Dashboard
 """
 import json
-import re
 import os
-import datetime
+import numpy as np
 import pandas as pd
-import plotly.express as px
 import plotly.graph_objects as go
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, abort, jsonify, request, send_from_directory
 from pathlib import Path
 
 from utils.formatting import create_event_array
 from utils.formatting import (
     format_df_ma_stats, format_df_ma_sent, format_df_ma_tweet_vol, 
-    format_df_corr, format_df_notable_days, format_df_ma_sent_comp
+    format_df_corr, format_df_notable_days, format_df_ma_sent_comp, format_df_ma_daily_sent
 )
 from utils.plotting import (
-    plot_dropdown_sent_vs_vol, plot_covid_stats, plot_hashtag_table, 
-    plot_sentiment, plot_corr_mat, plot_sentiment_bar, plot_emoji_bar_chart, 
-    emoji_to_colour, plot_notable_days, plot_sentiment_comp
+    plot_corr_mat, 
+    emoji_to_colour, plot_notable_days, plot_county_choropleth
+)
+from utils.aggregations import (
+    CovidStatsCube, EmojiStore, HashtagStore, LabelCounts, RNumberIntervals, SentimentCube, sentiment_labels
+)
+from utils.datasets import TopicRegistry
+from utils.readonly import enable_copy_on_write, freeze
+from utils.shared_arrays import SHARED_DATASETS, share, shared_report, worker_memory_report
+from utils.tweet_store import open_tweet_store
+from utils.schema import compact_frame, deep_memory, summarise_memory_report
+from utils.snapshots import load_csv, load_json, load_report, summarise_load_report
+from utils.artifacts import ARTIFACTS_DIR, ARTIFACTS_ONLY, open_artifacts
+from utils.response_cache import PayloadCache, install_response_cache
+from utils.compression import install_compression
+from utils.assets import AssetIndex
+from utils.news import NewsIndex
+from utils.playback import last_event_id, playback_dates, playback_response
+from utils.serialization import JSONProvider, figure_dict
+from utils.figure_specs import (
+    SeriesTable, covid_stats_spec, covid_stats_template, county_choropleth_spec, emoji_bar_spec, hashtag_table_spec,
+    sent_vs_vol_spec,
+    sent_vs_vol_template, sentiment_comp_spec, sentiment_counts_bar_spec, sentiment_spec, stats_columns
 )
 
 # Define the base directory using pathlib for cross-platform compatibility
@@ -29,7 +47,21 @@ BASE_DIR = Path(__file__).resolve().parent
 print(f"Using BASE_DIR: {BASE_DIR}")
 print(f"Files in data directory: {list(Path(BASE_DIR / 'data').glob('**/*.json'))}")
 
+# Frames derived from the shared datasets behave as copies, request threads never write through to them
+enable_copy_on_write()
+
 app = Flask(__name__, static_folder="static")
+# jsonify and the payload cache encode with orjson when it is installed
+app.json = JSONProvider(app)
+# Flask-Compress for the uncached responses, registered first so that it runs after the response cache
+compression = install_compression(app)
+
+# Responses of the pure /api endpoints are cached per query string, with ETags
+response_cache = install_response_cache(app, exclude={'/api/memory_report', '/api/cache_stats', '/api/playback'})
+# JSON text of the payloads the single endpoints and the timeline bundle are built from
+payload_cache = PayloadCache(app.json.dumps)
+# Static files by case-insensitive and fingerprinted path, read once
+static_assets = AssetIndex(BASE_DIR / 'static')
 
 # READ DATA - use absolute paths with Path
 try:
@@ -37,17 +69,17 @@ try:
     geojson_path = BASE_DIR / 'data/geojson/uk_counties_simpler.json'
     print(f"Checking if GeoJSON file exists: {geojson_path.exists()}")
     
-    df_covid_stats = pd.read_csv(
+    df_covid_stats = load_csv(
         BASE_DIR / 'data/covid-data/uk_covid_stats.csv', skipinitialspace=True)
     
-    with open(geojson_path, 'r') as f:
-        uk_counties = json.load(f)
+    uk_counties = load_json(geojson_path)
         
-    r_numbers = pd.read_csv(BASE_DIR / 'data/covid-data/r_numbers.csv')
-    df_events = pd.read_csv(BASE_DIR / 'data/events/key_events.csv',
+    r_numbers = load_csv(BASE_DIR / 'data/covid-data/r_numbers.csv')
+    df_events = load_csv(BASE_DIR / 'data/events/key_events.csv',
                           skipinitialspace=True, usecols=['Date', 'Event'])
-    counties = pd.read_csv(
+    counties = load_csv(
         BASE_DIR / 'data/geojson/uk-district-list-all.csv')['county'].tolist()
+    df_covid_stats = compact_frame(df_covid_stats, 'covid_stats', 'global/covid_stats')
 except Exception as e:
     print(f"Error loading data files: {e}")
     # Create empty data structures as fallback
@@ -55,48 +87,27 @@ except Exception as e:
     counties = []
     r_numbers = pd.DataFrame()
 try:
-    hashtags_covid = pd.read_csv(BASE_DIR / 'data/covid/top_ten_hashtags_per_day.csv')
-    hashtags_lockdown = pd.read_csv(BASE_DIR / 'data/lockdown/top_ten_hashtags_per_day.csv')
-    geo_df_covid = pd.read_csv(
-        BASE_DIR / 'data/covid/daily_sentiment_county_updated_locations.csv')
-    geo_df_lockdown = pd.read_csv(
-        BASE_DIR / 'data/lockdown/daily_sentiment_county_updated_locations.csv')
-    tweet_count_covid = pd.read_csv(BASE_DIR / 'data/covid/daily_tweet_count_country.csv')
-    tweet_count_lockdown = pd.read_csv(
-        BASE_DIR / 'data/lockdown/daily_tweet_count_country.csv')
-    all_sentiments_covid = pd.read_csv(BASE_DIR / 'data/covid/all_tweet_sentiments.csv')
-    all_sentiments_lockdown = pd.read_csv(BASE_DIR / 'data/lockdown/all_tweet_sentiments.csv')
-    notable_days_covid = pd.read_csv(BASE_DIR / 'data/covid/notable_days_months.csv')
-    notable_days_lockdown = pd.read_csv(BASE_DIR / 'data/lockdown/notable_days_months.csv')
-    scatter_covid = pd.read_csv(BASE_DIR / 'data/covid/scatter.csv')
-    scatter_lockdown = pd.read_csv(BASE_DIR / 'data/lockdown/scatter.csv')
-
-    emojis_covid = pd.read_csv(BASE_DIR / 'data/covid/weekly_emojis_with_colours.csv')
-    emojis_lockdown = pd.read_csv(BASE_DIR / 'data/lockdown/weekly_emojis_with_colours.csv')
-    news_df = pd.read_csv(BASE_DIR / 'data/events/news_timeline.csv')
+    news_df = load_csv(BASE_DIR / 'data/events/news_timeline.csv')
+    news_df = compact_frame(news_df, 'news', 'global/news')
 except Exception as e:
     print(f"Error loading additional data files: {e}")
-    # Create empty DataFrames as fallback
-    hashtags_covid = hashtags_lockdown = geo_df_covid = geo_df_lockdown = \
-    tweet_count_covid = tweet_count_lockdown = all_sentiments_covid = \
-    all_sentiments_lockdown = notable_days_covid = notable_days_lockdown = \
-    scatter_covid = scatter_lockdown = emojis_covid = emojis_lockdown = \
     news_df = pd.DataFrame()
 
+# Headlines and HTML links per date, and the inverted index of the headline words
+try:
+    news_index = NewsIndex(news_df)
+except Exception as e:
+    print(f"Error indexing the news: {e}")
+    news_index = None
+
 countries = ['England', 'Scotland', 'Northern Ireland', 'Wales']
+topics = ['covid', 'lockdown']
 
 # Data Sources
 emoji_wordcloud_urls = {'covid': 'covid_emoji_wordcloud.png',
                   'lockdown': 'lockdown_emoji_wordcloud.png'}
 wordcloud_urls = {'covid': 'covid_wordcloud.png',
                   'lockdown': 'lockdown_wordcloud.png'}
-hashtag_data_sources = {'covid': hashtags_covid,
-                        'lockdown': hashtags_lockdown}
-geo_df_data_sources = {'covid': geo_df_covid,
-                       'lockdown': geo_df_lockdown}
-
-complete_data_sources = {'covid': all_sentiments_covid,
-                         'lockdown': all_sentiments_lockdown}
 
 sentiment_dropdown_value_to_avg_score = {'nn': 'nn-score_avg', 'textblob': 'textblob-score_avg',
                                          'vader': 'vader-score_avg', 'native': 'native-score_avg'}
@@ -104,76 +115,174 @@ sentiment_dropdown_value_to_score = {'nn': 'nn-score', 'textblob': 'textblob-sco
                                      'vader': 'vader-score', 'native': 'native-score'}
 sentiment_dropdown_value_to_predictions = {'nn': 'nn-predictions', 'textblob': 'textblob-predictions',
                                            'vader': 'vader-predictions', 'native': 'native-predictions'}
-tweet_counts_sources = {'covid': tweet_count_covid,
-                        'lockdown': tweet_count_lockdown}
 regions_lists = {'county': counties, 'country': countries}
 
-notable_days_sources = {'covid': notable_days_covid,
-                        'lockdown': notable_days_lockdown}
+# Feature order of the county GeoJSON, which the per date choropleth values follow
+county_features = uk_counties.get('features', []) if isinstance(uk_counties, dict) else []
+county_feature_ids = [feature['properties']['id'] for feature in county_features]
+county_feature_names = [feature['properties']['NAME'] for feature in county_features]
+
+# With ARTIFACTS_ONLY=1 the formatted frames come from build.py instead of the aggregations
+artifacts = open_artifacts(ARTIFACTS_DIR, required=True) if ARTIFACTS_ONLY else None
+formatted_names = ['formatted_tweet_count', 'formatted_tweet_sent', 'formatted_sent_comp']
+
+
+def load_topic_datasets(topic):
+    """Load the raw and formatted frames of one topic on its first request"""
+    # The per-tweet CSV is only read when its memory-mapped store has not been built
+    tweet_store = open_tweet_store(BASE_DIR / f'data/{topic}/tweet_store')
+    built = artifacts.topic_frames(topic) if artifacts is not None else {}
+    try:
+        datasets = {
+            'hashtags': load_csv(BASE_DIR / f'data/{topic}/top_ten_hashtags_per_day.csv'),
+            'geo': load_csv(BASE_DIR / f'data/{topic}/daily_sentiment_county_updated_locations.csv'),
+            'tweet_count': load_csv(BASE_DIR / f'data/{topic}/daily_tweet_count_country.csv'),
+            'all_sentiments': pd.DataFrame() if tweet_store is not None else
+            load_csv(BASE_DIR / f'data/{topic}/all_tweet_sentiments.csv'),
+            'notable_days': built['notable_days'] if 'notable_days' in built else
+            load_csv(BASE_DIR / f'data/{topic}/notable_days_months.csv'),
+            'scatter': built['scatter'] if 'scatter' in built else load_csv(BASE_DIR / f'data/{topic}/scatter.csv'),
+            'emojis': load_csv(BASE_DIR / f'data/{topic}/weekly_emojis_with_colours.csv'),
+        }
+    except Exception as e:
+        print(f"Error loading {topic} data files: {e}")
+        # Create empty DataFrames as fallback
+        datasets = {name: pd.DataFrame() for name in
+                    ['hashtags', 'geo', 'tweet_count', 'all_sentiments', 'notable_days', 'scatter', 'emojis']}
+    # Only build.py ranks notable days per country
+    datasets['notable_days_by_country'] = built.get('notable_days_by_country', pd.DataFrame())
+    datasets = {name: compact_frame(df, name, f'{topic}/{name}') for name, df in datasets.items()}
+    datasets['tweet_store'] = tweet_store
+    # Day x region cubes of the geo scores, queried by the choropleth and the moving averages
+    geo = datasets['geo']
+    try:
+        datasets['county_cube'] = SentimentCube.from_frame(geo, 'county', start_global, end_global, id_column='id')
+        datasets['country_cube'] = SentimentCube.from_frame(geo, 'country', start_global, end_global, countries)
+    except Exception as e:
+        print(f"Error building {topic} sentiment cubes: {e}")
+        datasets['county_cube'] = datasets['country_cube'] = None
+    # Tweets per day, country, model and label, the sentiment bar chart reads it instead of the tweets
+    try:
+        if 'label_counts' in built:
+            datasets['label_counts'] = LabelCounts.from_table(built['label_counts'], start_global, end_global, countries)
+        elif tweet_store is not None:
+            datasets['label_counts'] = LabelCounts.from_frame(
+                tweet_store.day_frame(start_global, end_global, with_dates=True), start_global, end_global, countries)
+        else:
+            datasets['label_counts'] = LabelCounts.from_frame(
+                datasets['all_sentiments'], start_global, end_global, countries)
+    except Exception as e:
+        print(f"Error counting {topic} sentiment labels: {e}")
+        datasets['label_counts'] = None
+    # Daily top ten hashtags parsed once into integer coded arrays
+    try:
+        datasets['hashtag_store'] = HashtagStore.from_frame(datasets['hashtags'])
+    except Exception as e:
+        print(f"Error parsing {topic} hashtags: {e}")
+        datasets['hashtag_store'] = None
+    # Weekly emoji counts by week number, with the bar chart of every week built once
+    try:
+        emoji_store = datasets['emoji_store'] = EmojiStore.from_frame(datasets['emojis'], start_global)
+        datasets['emoji_bars'] = [emoji_bar_spec(*emoji_store.week(week), f'Beginning: {emoji_store.week_starts[week]}')
+                                  if emoji_store.offsets[week + 1] > emoji_store.offsets[week] else None
+                                  for week in range(emoji_store.n_weeks)]
+    except Exception as e:
+        print(f"Error indexing {topic} emojis: {e}")
+        datasets['emoji_store'] = datasets['emoji_bars'] = None
+    if artifacts is not None:
+        for name in formatted_names:
+            datasets[name] = built.get(name, pd.DataFrame())
+        return add_figure_series(topic, datasets)
+    # Formatted - wrapped in try/except to handle errors gracefully
+    try:
+        datasets['formatted_tweet_count'] = format_df_ma_tweet_vol(datasets['tweet_count'], countries)
+        datasets['formatted_tweet_sent'] = format_df_ma_sent(datasets['country_cube'])
+        if tweet_store is not None:
+            datasets['formatted_sent_comp'] = format_df_ma_daily_sent(
+                tweet_store.daily_score_means(start_global, end_global))
+        else:
+            datasets['formatted_sent_comp'] = format_df_ma_sent_comp(datasets['all_sentiments'])
+    except Exception as e:
+        print(f"Error formatting {topic} data: {e}")
+        datasets['formatted_tweet_count'] = pd.DataFrame()
+        datasets['formatted_tweet_sent'] = pd.DataFrame()
+        datasets['formatted_sent_comp'] = pd.DataFrame()
+    return add_figure_series(topic, datasets)
+
+
+def add_figure_series(topic, datasets):
+    """Per country arrays of the formatted frames, which the figure specs slice by date"""
+    score_columns = list(sentiment_dropdown_value_to_avg_score.values())
+    try:
+        datasets['sent_series'] = SeriesTable(datasets['formatted_tweet_sent'], score_columns, key='region_name')
+        datasets['count_series'] = SeriesTable(datasets['formatted_tweet_count'], countries)
+        datasets['sent_comp_series'] = SeriesTable(datasets['formatted_sent_comp'], score_columns)
+    except Exception as e:
+        print(f"Error building {topic} figure series: {e}")
+        datasets['sent_series'] = datasets['count_series'] = datasets['sent_comp_series'] = None
+    return datasets
+
+
+# Per-topic frames are materialised on the first request for that topic, then read-only
+topic_datasets = TopicRegistry(lambda topic: freeze(load_topic_datasets(topic)), topics)
 
-scatter_sources = {'covid': scatter_covid, 'lockdown': scatter_lockdown}
-# Formatted - wrapped in try/except to handle errors gracefully
 try:
-    formatted_tweet_count = {'covid': format_df_ma_tweet_vol(tweet_count_covid, countries),
-                            'lockdown': format_df_ma_tweet_vol(tweet_count_lockdown, countries)}
-    formatted_tweet_sent = {'covid': format_df_ma_sent(
-        geo_df_covid), 'lockdown': format_df_ma_sent(geo_df_lockdown)}
-    
-    formatted_covid_stats = format_df_ma_stats(df_covid_stats, countries)
-    
-    formatted_sent_comp = {'covid': format_df_ma_sent_comp(all_sentiments_covid),
-                          'lockdown': format_df_ma_sent_comp(all_sentiments_lockdown)}
+    if artifacts is not None:
+        formatted_covid_stats = artifacts.frame('global/formatted_covid_stats', pd.DataFrame())
+    else:
+        formatted_covid_stats = format_df_ma_stats(df_covid_stats, countries)
 except Exception as e:
     print(f"Error formatting data: {e}")
-    # Create empty defaults
-    formatted_tweet_count = {'covid': pd.DataFrame(), 'lockdown': pd.DataFrame()}
-    formatted_tweet_sent = {'covid': pd.DataFrame(), 'lockdown': pd.DataFrame()}
     formatted_covid_stats = pd.DataFrame()
-    formatted_sent_comp = {'covid': pd.DataFrame(), 'lockdown': pd.DataFrame()}
-
-emojis_weekly_source = {'covid': emojis_covid, 'lockdown': emojis_lockdown}
+try:
+    covid_stats_series = SeriesTable(formatted_covid_stats, stats_columns, key='country')
+except Exception as e:
+    print(f"Error building COVID stats series: {e}")
+    covid_stats_series = None
+# Date x country arrays of the raw and averaged stats, for the point and range lookups
+try:
+    covid_stats_cube = CovidStatsCube.from_frames(df_covid_stats, formatted_covid_stats, countries)
+except Exception as e:
+    print(f"Error building COVID stats cube: {e}")
+    covid_stats_cube = None
 
 # Dates
-weeks = r_numbers['date'].tolist()
-week_pairs = [(weeks[i], weeks[i + 1]) for i in range(0, len(weeks) - 1)]
+# Weekly R number ranges as sorted day number intervals, a date's week is one bisect
+r_intervals = RNumberIntervals.from_frame(r_numbers)
 start_global = '2020-03-20'
 end_global = '2021-03-25'
 dates_list = pd.date_range(start=start_global, end=end_global)
 str_dates_list = [str(date.date()) for date in dates_list]
 
 # Events
-events_array = create_event_array(df_events, start_global, end_global)
-
-def check_between_dates(start, end, current):
-    start, end, current = pd.to_datetime(start, format='%d/%m/%Y'), \
-                          pd.to_datetime(end, format='%d/%m/%Y'), \
-                          pd.to_datetime(current, format='%Y-%m-%d')
-    return start < current <= end
+if artifacts is not None:
+    events_array = artifacts.json('global/events_array', [])
+else:
+    events_array = create_event_array(df_events, start_global, end_global)
+
+# Layout and trace attributes of the 2x2 subplot graphs, requests only fill in the arrays
+stats_graph_template = covid_stats_template(countries, events_array)
+sent_vs_vol_graph_template = sent_vs_vol_template(countries, events_array)
+
+# Shared by every request thread from here on, so in-place writes raise instead of racing
+global_datasets = [df_covid_stats, r_numbers, df_events, news_df, news_index, formatted_covid_stats,
+                   covid_stats_series, covid_stats_cube, r_intervals]
+freeze(*global_datasets)
+
+if os.environ.get('PRELOAD_TOPICS'):
+    topic_datasets.preload(os.environ['PRELOAD_TOPICS'].split(','))
+
+# Under gunicorn.conf.py this runs in the master, the forked workers map the same segments
+if SHARED_DATASETS:
+    (df_covid_stats, r_numbers, df_events, news_df, news_index, formatted_covid_stats, covid_stats_series,
+     covid_stats_cube, r_intervals) = global_datasets = share('global', *global_datasets)
+    for topic in topic_datasets.loaded_topics():
+        share(topic, topic_datasets[topic])
 
 def fig_to_json(fig):
     """Convert a plotly figure to a JSON representation for the API"""
-    fig_dict = fig.to_dict()
-    # Convert numpy arrays and data types to Python native types
-    import json
-    import numpy as np
-    
-    class NumpyEncoder(json.JSONEncoder):
-        def default(self, obj):
-            if isinstance(obj, np.integer):
-                return int(obj)
-            if isinstance(obj, np.floating):
-                return float(obj)
-            if isinstance(obj, np.ndarray):
-                return obj.tolist()
-            return super(NumpyEncoder, self).default(obj)
-    
-    # First convert to JSON string then back to dict to ensure Python native types
-    sanitized_dict = json.loads(json.dumps(fig_dict, cls=NumpyEncoder))
-    
-    return {
-        'data': sanitized_dict['data'],
-        'layout': sanitized_dict['layout']
-    }
+    # The figure's own data and layout, NumPy arrays included, encoded once by the app's JSON provider
+    return figure_dict(fig)
 
 # Add health check route
 @app.route('/health')
@@ -183,11 +292,16 @@ def health_check():
 # Serve static files from the static directory
 @app.route('/')
 def index():
-    return send_from_directory(BASE_DIR / 'static', 'index.html')
+    # index.html referencing the fingerprinted script, style and image paths
+    return static_files('index.html')
 
 @app.route('/<path:path>')
 def static_files(path):
-    return send_from_directory(BASE_DIR / 'static', path)
+    # From the asset index, with the .br / .gz body when the client accepts it
+    response = static_assets.response(app, path)
+    if response is None:
+        abort(404)
+    return response
 
 # API Routes
 
@@ -212,6 +326,10 @@ def debug_info():
             'status': 'app is running',
             'base_dir': str(BASE_DIR),
             'files': file_info,
+            'topics_loaded': topic_datasets.loaded_topics(),
+            'load_times': load_report,
+            'load_summary': summarise_load_report(),
+            'artifacts': artifacts.describe() if artifacts is not None else None,
             'env': dict(os.environ)
         })
     except Exception as e:
@@ -229,40 +347,105 @@ def get_dates():
         'end_date': end_global
     })
 
+@app.route('/api/memory_report')
+def get_memory_report():
+    """Deep memory usage of the loaded datasets before and after compaction"""
+    keys = ['global/covid_stats', 'global/news']
+    derived = {}
+    for topic in topic_datasets.loaded_topics():
+        for name, df in topic_datasets[topic].items():
+            if name.startswith('formatted_'):
+                derived[f'{topic}/{name}'] = deep_memory(df)
+            elif isinstance(df, (SentimentCube, LabelCounts, SeriesTable, HashtagStore, EmojiStore)):
+                derived[f'{topic}/{name}'] = df.nbytes
+            elif isinstance(df, pd.DataFrame):
+                keys.append(f'{topic}/{name}')
+    if covid_stats_cube is not None:
+        derived['global/covid_stats_cube'] = covid_stats_cube.nbytes
+    derived['static_assets'] = static_assets.nbytes
+    report = summarise_memory_report(keys)
+    report['derived'] = derived
+    report['topics_loaded'] = topic_datasets.loaded_topics()
+    report['shared_arrays'] = shared_report()
+    report['process'] = worker_memory_report()
+    return jsonify(report)
+
+@app.route('/api/cache_stats')
+def get_cache_stats():
+    """Hit, miss and eviction counters of the response and payload caches"""
+    return jsonify(dict(response_cache.stats(), payloads=payload_cache.stats()))
+
+def cached_json(builder, *args):
+    """JSON response of builder(*args), encoded once per distinct arguments"""
+    return app.response_class(payload_cache.encoded(builder, *args), mimetype='application/json')
+
+def covid_stats_payload(date):
+    """Cumulative UK deaths and cases on date"""
+    totals = covid_stats_cube.day_totals(date)
+    
+    return {
+        'date': date,
+        'total_deaths': totals['cumDeathsByDeathDate'],
+        'total_cases': totals['cumCasesByPublishDate']
+    }
+
 @app.route('/api/covid_stats')
 def get_covid_stats():
     """Get COVID stats for a given date"""
-    date = request.args.get('date')
-    
-    total_deaths = df_covid_stats.loc[df_covid_stats['date'] == date, 'cumDeathsByDeathDate'].sum()
-    total_cases = df_covid_stats.loc[df_covid_stats['date'] == date, 'cumCasesByPublishDate'].sum()
-    
-    return jsonify({
+    return cached_json(covid_stats_payload, request.args.get('date'))
+
+def covid_stats_range_payload(start, end, columns):
+    """Columns of every country from start to end (inclusive), one list per country and column"""
+    columns = columns.split(',') if columns else covid_stats_cube.columns
+    unknown = [column for column in columns if column not in covid_stats_cube.columns]
+    if unknown:
+        return {
+            'error': f"Unknown columns {', '.join(unknown)}, expected some of {', '.join(covid_stats_cube.columns)}"
+        }
+    dates, series = covid_stats_cube.range_series(start, end, columns)
+    return {
+        'start': start,
+        'end': end,
+        'dates': dates,
+        'columns': columns,
+        'series': series
+    }
+
+@app.route('/api/covid_stats_range')
+def get_covid_stats_range():
+    """Get the daily COVID stats of every country in a date window"""
+    return cached_json(covid_stats_range_payload, request.args.get('start', start_global),
+                       request.args.get('end', end_global), request.args.get('columns'))
+
+def r_numbers_payload(date):
+    """Mid-point of the R number range of the week containing date"""
+    return {
         'date': date,
-        'total_deaths': int(total_deaths),
-        'total_cases': int(total_cases)
-    })
+        'r_number': r_intervals.label(date)
+    }
 
 @app.route('/api/r_numbers')
 def get_r_numbers():
     """Get R numbers for a given date"""
-    date = request.args.get('date')
-    r_number = 'N/A'
-    
-    for i, (start, end) in enumerate(week_pairs):
-        if check_between_dates(start, end, date):
-            df = r_numbers.loc[r_numbers['date'] == start]
-            # Fix the deprecated Series float conversion
-            upper = df['upper'].iloc[0] if not df['upper'].empty else 0
-            lower = df['lower'].iloc[0] if not df['lower'].empty else 0
-            avg_r = round((upper + lower) / 2, 2)
-            if avg_r != 0:
-                r_number = f"~{avg_r}"
-    
-    return jsonify({
-        'date': date,
-        'r_number': r_number
-    })
+    return cached_json(r_numbers_payload, request.args.get('date'))
+
+def r_numbers_range_payload(start, end):
+    """R number label and range of every day from start to end (inclusive) that the weekly data covers"""
+    dates, labels, lower, upper = r_intervals.range_series(start, end)
+    return {
+        'start': start,
+        'end': end,
+        'dates': dates,
+        'r_number': labels,
+        'lower': lower,
+        'upper': upper
+    }
+
+@app.route('/api/r_numbers_range')
+def get_r_numbers_range():
+    """Get the R number series of a date window"""
+    return cached_json(r_numbers_range_payload, request.args.get('start', start_global),
+                       request.args.get('end', end_global))
 
 @app.route('/api/county_choropleth')
 def get_county_choropleth():
@@ -271,137 +454,332 @@ def get_county_choropleth():
     nlp_type = request.args.get('nlp_type', 'nn')
     topic = request.args.get('topic', 'covid')
     
-    geo_df = geo_df_data_sources[topic]
     color = sentiment_dropdown_value_to_avg_score[nlp_type]
     
-    geo_df = geo_df.loc[geo_df['date'] == date]
-    fig = px.choropleth_mapbox(
-        geo_df,
-        locations="id",
-        featureidkey='properties.id',
-        geojson=uk_counties,
-        color=color,
-        hover_name='county',
-        mapbox_style='white-bg',
-        color_continuous_scale=px.colors.diverging.Temps_r,
-        zoom=3.5,
-        center={"lat": 55, "lon": 0},
-        animation_frame='date',
-        range_color=[-1, 1],
-    )
-    fig.update_layout(autosize=True, height=900)
+    # The day's row of the county cube
+    geo_df = topic_datasets[topic]['county_cube'].day_frame(date)
+    spec = county_choropleth_spec(uk_counties, geo_df['id'].to_numpy(), geo_df['region_name'].to_numpy(),
+                                  geo_df[color].to_numpy(), date, color)
+    
+    return jsonify(spec)
+
+@app.route('/api/county_geometry')
+def get_county_geometry():
+    """Get the county choropleth without values, with the GeoJSON feature ids and hover names"""
+    fig = plot_county_choropleth(uk_counties, county_feature_ids, county_feature_names)
+    response = jsonify(dict(fig_to_json(fig), ids=county_feature_ids, names=county_feature_names))
+    # The geometry never changes while the app runs, the browser may keep it for a day
+    response.cache_control.public = True
+    response.cache_control.max_age = 86400
+    return response
+
+def county_choropleth_values_payload(date, topic, nlp_type):
+    """Sentiment of every county on date, in the GeoJSON feature order"""
+    if nlp_type not in SentimentCube.models:
+        return {
+            'error': 'Invalid NLP type'
+        }
+    cube = topic_datasets[topic]['county_cube']
+    if cube is None:
+        return {
+            'error': 'No geo data available'
+        }
+    means = cube.day_means(date, cube.id_positions(county_feature_ids))[:, SentimentCube.models.index(nlp_type)]
+    return {
+        'date': date,
+        'score': sentiment_dropdown_value_to_avg_score[nlp_type],
+        'values': [None if np.isnan(value) else round(float(value), 4) for value in means],
+    }
+
+@app.route('/api/county_choropleth_values')
+def get_county_choropleth_values():
+    """Get the sentiment of every county on a date, in the feature order of /api/county_geometry"""
+    return cached_json(county_choropleth_values_payload, request.args.get('date'),
+                       request.args.get('topic', 'covid'), request.args.get('nlp_type', 'nn'))
+
+@app.route('/api/region_sentiment')
+def get_region_sentiment():
+    """Mean sentiment of every county or country between two dates (inclusive)"""
+    topic = request.args.get('topic', 'covid')
+    region_type = request.args.get('region_type', 'county')
+    nlp_type = request.args.get('nlp_type', 'nn')
+    start = request.args.get('start', start_global)
+    end = request.args.get('end', end_global)
     
-    return jsonify(fig_to_json(fig))
+    if region_type not in regions_lists or nlp_type not in SentimentCube.models:
+        return jsonify({
+            'error': 'Invalid region type or NLP type'
+        })
+    cube = topic_datasets[topic][f'{region_type}_cube']
+    if cube is None:
+        return jsonify({
+            'error': 'No geo data available'
+        })
+    means = cube.range_mean(start, end, fill=np.nan)[:, SentimentCube.models.index(nlp_type)]
+    result = {
+        'start': start,
+        'end': end,
+        'regions': cube.regions,
+        'values': [None if np.isnan(value) else float(value) for value in means],
+    }
+    if cube.region_ids is not None:
+        result['ids'] = cube.region_ids.tolist()
+    return jsonify(result)
+
+def sentiment_counts_payload(start, end, source, nlp_type):
+    """Tweets per sentiment label (rows) and country (columns) from start to end (inclusive, end defaults to start)"""
+    label_counts = topic_datasets[source]['label_counts']
+    counts = label_counts.range_counts(start, end)[:, LabelCounts.models.index(nlp_type)].T
+    return {
+        'start': start,
+        'end': end or start,
+        'labels': sentiment_labels,
+        'countries': countries,
+        'counts': counts.tolist(),
+    }
+
+@app.route('/api/sentiment_counts')
+def get_sentiment_counts():
+    """Tweets per sentiment label and country on a date, or summed from start to end (inclusive)"""
+    start = request.args.get('start', request.args.get('date', start_global))
+    return cached_json(sentiment_counts_payload, start, request.args.get('end'),
+                       request.args.get('topic', 'covid'), request.args.get('nlp_type', 'vader'))
+
+def sentiment_bar_chart_payload(date, source, nlp_type):
+    """Figure of the tweets per country and sentiment label on date"""
+    label_counts = topic_datasets[source]['label_counts']
+    counts = label_counts.range_counts(date)[:, LabelCounts.models.index(nlp_type)].T
+    
+    return sentiment_counts_bar_spec(counts, countries)
 
 @app.route('/api/sentiment_bar_chart')
 def get_sentiment_bar_chart():
     """Get sentiment bar chart data"""
-    date = request.args.get('date')
-    source = request.args.get('source', 'covid')
-    nlp_type = request.args.get('nlp_type', 'vader')
-    
-    data = complete_data_sources[source]
-    data['date'] = pd.to_datetime(data['date']).dt.date
-    df = data[data['date'] == datetime.datetime.strptime(date, '%Y-%m-%d').date()]
-    label = sentiment_dropdown_value_to_predictions[nlp_type]
-    
-    fig = plot_sentiment_bar(df, label, countries)
-    
-    return jsonify(fig_to_json(fig))
+    return cached_json(sentiment_bar_chart_payload, request.args.get('date'),
+                       request.args.get('source', 'covid'), request.args.get('nlp_type', 'vader'))
+
+def emoji_bar_chart_payload(date, topic):
+    """Figure of the top emojis of the week containing date"""
+    emoji_store = topic_datasets[topic]['emoji_store']
+    # Built when the topic was loaded, None for a week without rows
+    figure = topic_datasets[topic]['emoji_bars'][emoji_store.week_of(date)]
+    if figure is None:
+        return {
+            'data': [],
+            'layout': {'title': 'No data available for this week'}
+        }
+    return figure
+
+def emoji_range_chart_payload(start, end, topic, k):
+    """Figure of the k emojis used most in the weeks from start to end"""
+    emoji_store = topic_datasets[topic]['emoji_store']
+    first, last = emoji_store.week_of(start), emoji_store.week_of(end)
+    title = f'Weeks beginning {emoji_store.week_starts[first]} to {emoji_store.week_starts[max(first, last)]}'
+    return emoji_bar_spec(*emoji_store.top_k(start, end, k), title)
 
 @app.route('/api/emoji_bar_chart')
 def get_emoji_bar_chart():
-    """Get emoji bar chart data"""
-    date = request.args.get('date')
+    """Get emoji bar chart data of the week of date, or of the top k emojis from start to end"""
     topic = request.args.get('topic', 'covid')
+    if 'start' in request.args or 'end' in request.args:
+        k = min(max(request.args.get('k', 10, type=int), 1), 50)
+        return cached_json(emoji_range_chart_payload, request.args.get('start', start_global),
+                           request.args.get('end', end_global), topic, k)
+    return cached_json(emoji_bar_chart_payload, request.args.get('date'), topic)
+
+def top_hashtags(date, source):
+    """[hashtag, count] pairs of the top ten hashtags on date, None when the date has no row"""
+    hashtag_store = topic_datasets[source]['hashtag_store']
+    return hashtag_store.day_top(date) if hashtag_store is not None else None
+
+def hashtag_table_payload(date, source):
+    """Table of the top ten hashtags on date"""
+    hashtags = top_hashtags(date, source)
+    
+    if hashtags is None:
+        return {
+            'data': [],
+            'layout': {'title': 'No data available for this date'}
+        }
     
-    # Adjust to get the weekly start date
-    date_obj = datetime.datetime.strptime(date, '%Y-%m-%d')
-    date_index = (dates_list == date_obj).argmax()
-    weekly_index = date_index - (date_index % 7)
-    weekly_date = str(dates_list[weekly_index].date())
-    
-    emoji_df = emojis_weekly_source[topic]
-    fig = plot_emoji_bar_chart(emoji_df, weekly_date)
-    
-    return jsonify(fig_to_json(fig))
+    return hashtag_table_spec(hashtags)
 
 @app.route('/api/hashtag_table')
 def get_hashtag_table():
     """Get hashtag table data"""
-    date = request.args.get('date')
-    source = request.args.get('source', 'covid')
-    
-    hashtags_df = hashtag_data_sources[source]
-    hashtag_date = hashtags_df.loc[hashtags_df['date'] == date]
-    
-    if hashtag_date.empty:
+    return cached_json(hashtag_table_payload, request.args.get('date'), request.args.get('source', 'covid'))
+
+def hashtag_trends_payload(topic, hashtags, start, end, k):
+    """Daily counts of hashtags (default the top k of the window) from start to end (inclusive)"""
+    hashtag_store = topic_datasets[topic]['hashtag_store']
+    top = hashtag_store.top_k(start, end, k)
+    hashtags = [hashtag.strip() for hashtag in hashtags.split(',')] if hashtags else [hashtag for hashtag, _ in top]
+    hashtags = [hashtag if hashtag.startswith('#') else '#' + hashtag for hashtag in hashtags]
+    dates, series = hashtag_store.trends(hashtags, start, end)
+    return {
+        'topic': topic,
+        'start': start,
+        'end': end,
+        'dates': dates,
+        'top': top,
+        'series': dict(zip(hashtags, series))
+    }
+
+@app.route('/api/hashtag_trends')
+def get_hashtag_trends():
+    """Get the daily counts of a set of hashtags, or of the top k of the window, across a date range"""
+    topic = request.args.get('topic', 'covid')
+    if topic not in topics:
         return jsonify({
-            'data': [],
-            'layout': {'title': 'No data available for this date'}
+            'error': 'Invalid topic'
         })
-    
-    hashtags = [tuple(x.split(',')) for x in re.findall(
-        "\((.*?)\)", hashtag_date['top_ten_hashtags'].values[0])]
-    hash_dict = {'Hashtag': [], 'Count': []}
-    for hashtag, count in hashtags:
-        hash_dict['Hashtag'].append('#' + hashtag.replace("'", ''))
-        hash_dict['Count'].append(int(count))
-    hash_df = pd.DataFrame(hash_dict)
-    
-    fig = plot_hashtag_table(hash_df)
-    
-    return jsonify(fig_to_json(fig))
+    k = min(max(request.args.get('k', 5, type=int), 1), 50)
+    return cached_json(hashtag_trends_payload, topic, request.args.get('hashtags'),
+                       request.args.get('start', start_global), request.args.get('end', end_global), k)
+
+def news_items(date):
+    """[headline, URL] pairs of the news of date"""
+    return news_index.items(date)
+
+def daily_news_payload(date):
+    """Links to the news headlines of date"""
+    return {
+        'date': date,
+        'content': news_index.fragment(date)
+    }
 
 @app.route('/api/daily_news')
 def get_daily_news():
     """Get daily news content"""
-    date = request.args.get('date')
-    
-    df = news_df.loc[news_df['Date'] == date]
-    links = ''
-    for ind in df.index:
-        headline = news_df['Headline'][ind]
-        URL = df['URL'][ind]
-        link = f'<a href="{URL}" target="_blank"><b>{headline}</b></a><br><br>'
-        links += link
-    
-    return jsonify({
-        'date': date,
-        'content': links
-    })
+    return cached_json(daily_news_payload, request.args.get('date'))
+
+def news_search_payload(query, start, end, limit):
+    """Headlines of start to end (inclusive) matching the words of query, best first"""
+    if not query:
+        return {
+            'error': 'Missing search query q'
+        }
+    total, results = news_index.search(query, start, end, limit)
+    return {
+        'q': query,
+        'start': start,
+        'end': end,
+        'total': total,
+        'results': [{
+            'date': news_index.dates[i],
+            'headline': news_index.headlines[i],
+            'url': news_index.urls[i],
+            'score': round(score, 3)
+        } for i, score in results]
+    }
+
+@app.route('/api/news_search')
+def get_news_search():
+    """Search the news headlines of the whole timeline, or of a date window"""
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    return cached_json(news_search_payload, request.args.get('q', '').strip(), request.args.get('start'),
+                       request.args.get('end'), limit)
+
+def stats_graph_payload(date):
+    """Figure of the COVID case and death moving averages up to date"""
+    return covid_stats_spec(covid_stats_series, stats_graph_template, start_global, date)
 
 @app.route('/api/stats_graph')
 def get_stats_graph():
     """Get COVID stats graph"""
-    date = request.args.get('date')
-    
-    fig = plot_covid_stats(formatted_covid_stats, countries, events_array, start_global, date)
+    return cached_json(stats_graph_payload, request.args.get('date'))
+
+def ma_sent_graph_payload(date, topic, sentiment_type):
+    """Figure of the per country sentiment moving averages up to date"""
+    sentiment_col = sentiment_dropdown_value_to_avg_score[sentiment_type]
+    sent_series = topic_datasets[topic]['sent_series']
     
-    return jsonify(fig_to_json(fig))
+    return sentiment_spec(sent_series, sentiment_col, start_global, date)
 
 @app.route('/api/ma_sent_graph')
 def get_ma_sent_graph():
     """Get moving average sentiment graph"""
+    return cached_json(ma_sent_graph_payload, request.args.get('date'),
+                       request.args.get('topic', 'covid'), request.args.get('sentiment_type', 'vader'))
+
+@app.route('/api/timeline_bundle')
+def get_timeline_bundle():
+    """Get every payload of the timeline page for a date in one response"""
     date = request.args.get('date')
     topic = request.args.get('topic', 'covid')
-    sentiment_type = request.args.get('sentiment_type', 'vader')
-    
-    sentiment_col = sentiment_dropdown_value_to_avg_score[sentiment_type]
-    tweet_sent_df = formatted_tweet_sent[topic]
+    nlp_type = request.args.get('nlp_type', 'vader')
     
-    fig = plot_sentiment(tweet_sent_df, sentiment_col, start_global, date)
+    # Keyed like the endpoints they replace, each part cached on its own arguments
+    return app.response_class(payload_cache.compose({
+        'covid_stats': (covid_stats_payload, (date,)),
+        'r_numbers': (r_numbers_payload, (date,)),
+        'county_choropleth_values': (county_choropleth_values_payload, (date, topic, nlp_type)),
+        'sentiment_bar_chart': (sentiment_bar_chart_payload, (date, topic, nlp_type)),
+        'emoji_bar_chart': (emoji_bar_chart_payload, (date, topic)),
+        'hashtag_table': (hashtag_table_payload, (date, topic)),
+        'daily_news': (daily_news_payload, (date,)),
+        'stats_graph': (stats_graph_payload, (date,)),
+        'ma_sent_graph': (ma_sent_graph_payload, (date, topic, nlp_type)),
+    }), mimetype='application/json')
+
+def playback_figures():
+    """Specs of the bar chart and hashtag table of the playback, without data; the frames restyle them"""
+    return {
+        'sentiment_bar_chart': sentiment_counts_bar_spec(np.zeros((len(sentiment_labels), len(countries)), int),
+                                                         countries),
+        'hashtag_table': hashtag_table_spec([]),
+    }
+
+def playback_frame(date, topic, nlp_type):
+    """JSON text of one /api/playback frame, joined from the cached parts of the timeline payloads"""
+    return payload_cache.compose({
+        'covid_stats': (covid_stats_payload, (date,)),
+        'r_numbers': (r_numbers_payload, (date,)),
+        'county_choropleth_values': (county_choropleth_values_payload, (date, topic, nlp_type)),
+        'sentiment_counts': (sentiment_counts_payload, (date, None, topic, nlp_type)),
+        'hashtags': (top_hashtags, (date, topic)),
+        'news': (news_items, (date,)),
+    })
+
+@app.route('/api/playback')
+def get_playback():
+    """Stream one compact frame per date from start to end as server-sent events"""
+    topic = request.args.get('topic', 'covid')
+    nlp_type = request.args.get('nlp_type', 'vader')
+    start = request.args.get('start', start_global)
+    end = request.args.get('end', end_global)
     
-    return jsonify(fig_to_json(fig))
+    if topic not in topics or nlp_type not in SentimentCube.models:
+        return jsonify({
+            'error': 'Invalid topic or NLP type'
+        })
+    dates = playback_dates(str_dates_list, start, end, last_event_id())
+    return playback_response(app, dates, lambda date: playback_frame(date, topic, nlp_type),
+                             payload_cache.encoded(playback_figures))
+
+def filter_notable_days(source, nlp_type, k, country=None):
+    """Rows of one model (and country) down to rank k, tables without a rank column hold rank 1 only"""
+    df = source.loc[source['sentiment_type'] == nlp_type]
+    if country:
+        df = df.loc[df['country'] == country]
+    if 'rank' in df.columns:
+        df = df.loc[df['rank'] <= k]
+    return df
 
 @app.route('/api/notable_days')
 def get_notable_days():
     """Get notable days table"""
     topic = request.args.get('topic', 'covid')
     nlp_type = request.args.get('nlp_type', 'vader')
+    k = request.args.get('k', 1, type=int)
+    country = request.args.get('country')
     
-    source = notable_days_sources[topic]
-    df = source.loc[source['sentiment_type'] == nlp_type]
+    source = topic_datasets[topic]['notable_days_by_country' if country else 'notable_days']
+    if source.empty:
+        return jsonify({
+            'error': 'No notable days data available'
+        })
+    df = filter_notable_days(source, nlp_type, k, country)
     
     fig = plot_notable_days(df)
     
@@ -416,22 +794,21 @@ def get_dropdown_figure():
     
     selected_date = end_global
     sentiment_col = sentiment_dropdown_value_to_avg_score[sentiment_type]
-    tweet_count_df = formatted_tweet_count[topic]
-    tweet_sent_df = formatted_tweet_sent[topic]
+    datasets = topic_datasets[topic]
     
     if chart_value == 'show_sentiment_vs_time':
-        fig = plot_dropdown_sent_vs_vol(
-            tweet_sent_df, tweet_count_df, sentiment_col, events_array, countries, start_global, selected_date
+        spec = sent_vs_vol_spec(
+            datasets['sent_series'], datasets['count_series'], sentiment_col, sent_vs_vol_graph_template,
+            start_global, selected_date
         )
     elif chart_value == 'show_sentiment_comparison':
-        df = formatted_sent_comp[topic]
-        fig = plot_sentiment_comp(df, start_global, selected_date)
+        spec = sentiment_comp_spec(datasets['sent_comp_series'], start_global, selected_date)
     else:
         return jsonify({
             'error': 'Invalid chart type'
         })
     
-    return jsonify(fig_to_json(fig))
+    return jsonify(spec)
 
 @app.route('/api/corr_mat')
 def get_corr_mat():
@@ -440,7 +817,7 @@ def get_corr_mat():
     sentiment_type = request.args.get('sentiment_type', 'vader')
     
     sentiment_col = sentiment_dropdown_value_to_avg_score[sentiment_type]
-    data = scatter_sources[topic]
+    data = topic_datasets[topic]['scatter']
     
     fig = plot_corr_mat(data, sentiment_col)
     
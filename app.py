@@ -18,8 +18,9 @@ from utils.formatting import format_df_ma_stats, format_df_ma_sent, format_df_ma
     format_df_notable_days, format_df_ma_sent_comp
 
 from utils.plotting import plot_dropdown_sent_vs_vol, plot_covid_stats, plot_hashtag_table, \
-    plot_sentiment, plot_corr_mat, plot_sentiment_bar, plot_emoji_bar_chart, emoji_to_colour, \
-    plot_notable_days, plot_sentiment_comp
+    plot_sentiment, plot_corr_mat, plot_emoji_bar_chart, emoji_to_colour, \
+    plot_notable_days, plot_sentiment_comp, plot_sentiment_counts_bar
+from utils.aggregations import LabelCounts, RNumberIntervals
 
 # Define the base directory using pathlib for cross-platform compatibility
 BASE_DIR = Path(__file__).resolve().parent
@@ -103,12 +104,15 @@ formatted_sent_comp = {'covid': format_df_ma_sent_comp(all_sentiments_covid),
 emojis_weekly_source = {'covid': emojis_covid, 'lockdown': emojis_lockdown}
 
 # Dates
-weeks = r_numbers['date'].tolist()
-week_pairs = [(weeks[i], weeks[i + 1]) for i in range(0, len(weeks) - 1)]
+r_intervals = RNumberIntervals.from_frame(r_numbers)
 start_global = '2020-03-20'
 end_global = '2021-03-25'
 dates_list = pd.date_range(start=start_global, end=end_global)
 
+# Tweets per day, country, model and label for the sentiment bar chart
+label_counts_sources = {source: LabelCounts.from_frame(data, start_global, end_global, countries)
+                        for source, data in complete_data_sources.items()}
+
 #
 events_array = create_event_array(df_events, start_global, end_global)
 
@@ -133,13 +137,6 @@ fig_0 = px.choropleth_mapbox(
 emoji_covid_fig = plot_emoji_bar_chart(emojis_covid, start_global)
 
 
-def check_between_dates(start, end, current):
-    start, end, current = pd.to_datetime(start, format='%d/%m/%Y'), \
-                          pd.to_datetime(end, format='%d/%m/%Y'), \
-                          pd.to_datetime(current, format='%Y-%m-%d')
-    return start < current <= end
-
-
 def indicator(color, text, id_value):
     return html.Div(
         [
@@ -827,17 +824,7 @@ layout_faq = [
 @app.callback(Output('r_number_indicator', 'children'), [Input("days-slider", "value")])
 def update_r_text(date_index):
     selected_date = str(dates_list[date_index].date())
-    for i, (start, end) in enumerate(week_pairs):
-        if check_between_dates(start, end, selected_date):
-            df = r_numbers.loc[r_numbers['date'] == start]
-            # Fix dtype incompatibility by properly accessing Series elements
-            upper = df['upper'].iloc[0] if not df['upper'].empty else 0
-            lower = df['lower'].iloc[0] if not df['lower'].empty else 0
-            avg_r = round((upper + lower) / 2, 2)
-            if avg_r == 0:
-                return 'N/A'
-            return "~{}".format(avg_r)
-    return 'N/A'
+    return r_intervals.label(selected_date)
 
 
 @app.callback(Output('total_cases_indicator', 'children'), [Input("days-slider", "value")])
@@ -875,11 +862,8 @@ def update_map_title(selected_date, source):
                                           'value'), Input('nlp-dropdown', 'value')]
 )
 def update_bar_chart(selected_date, source, nlp):
-    data = complete_data_sources[source]
-    data['date'] = pd.to_datetime(data['date']).dt.date
-    df = data[data['date'] == dates_list[selected_date]]
-    label = sentiment_dropdown_value_to_predictions[nlp]
-    return plot_sentiment_bar(df, label, countries)
+    counts = label_counts_sources[source].range_counts(str(dates_list[selected_date].date()))
+    return plot_sentiment_counts_bar(counts[:, LabelCounts.models.index(nlp)].T, countries)
 
 
 #
@@ -0,0 +1,966 @@
+"""
+Benchmarks of the data pipeline
+
+Each subcommand checks a rewritten code path against a reference
+implementation on synthetic data and reports how both scale.
+
+    python benchmark.py region-aggregation
+    python benchmark.py region-aggregation --regions 4 96 217 --rows-per-cell 1 5
+    python benchmark.py notable-days --tweets 10000 1000000 -k 5
+    python benchmark.py label-counts --tweets 100000 1000000
+    python benchmark.py r-numbers --weeks 52 520
+    python benchmark.py covid-stats --days 371 3650
+    python benchmark.py news --copies 1 10
+    python benchmark.py hashtags --days 371 3650
+    python benchmark.py emojis --weeks 53 530
+    python benchmark.py serialization
+    python benchmark.py figure-specs
+    python benchmark.py compression --app robust_api --date 2020-06-01
+    python benchmark.py concurrency --app robust_api --threads 1 8 32
+    python benchmark.py shared-memory --app robust_api --workers 1 4 8
+"""
+import argparse
+import gc
+import gzip
+import importlib
+import json
+import multiprocessing
+import os
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+from utils.aggregations import (
+    aggregate_sentiment_by_region_type_by_date, avg_score_columns, prediction_types, prediction_columns,
+    sentiment_labels, map_dates_to_months, months, aggregate_stats_per_day_per_country, CovidStatsCube, EmojiStore,
+    HashtagStore, LabelCounts, RNumberIntervals
+)
+from utils.formatting import death_str, format_df_ma_stats, format_df_notable_days, str_dates_list, countries
+from utils.paths import BASE_DIR, data_path
+from utils.plotting import (
+    plot_covid_stats, plot_county_choropleth, plot_dropdown_sent_vs_vol, plot_emoji_bar_chart, plot_sentiment,
+    plot_sentiment_comp, plot_sentiment_counts_bar
+)
+from utils import figure_specs
+from utils.schema import compact_frame, date_to_day, to_day_numbers
+from utils import compression, serialization
+from utils.news import NewsIndex
+from utils.readonly import is_frozen
+from utils import shared_arrays
+
+start_global = '2020-03-20'
+
+
+def _timeit(func, repeat=3):
+    """Best wall time of repeat calls, and the result of the last one"""
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def _print_table(header, rows):
+    widths = [max(len(str(value)) for value in column) for column in zip(header, *rows)]
+    for row in [header] + rows:
+        print('  '.join(str(value).rjust(width) for value, width in zip(row, widths)))
+
+
+# Region aggregation
+
+def reference_sentiment_by_region_type_by_date(data, region_list, region_header, start, end):
+    """The per date, per region .loc loop that aggregate_sentiment_by_region_type_by_date replaced"""
+    date_list = [str(date.date()) for date in pd.date_range(start=start, end=end).tolist()]
+    score_by_region = {'{}-score_avg'.format(prediction_version): [] for
+                       prediction_version in prediction_types}
+    dates = []
+    regions = []
+    days = to_day_numbers(data['date'])
+    for date in date_list:
+        date_data = data.loc[days == date_to_day(date)]
+        for region in region_list:
+            region_data = date_data.loc[date_data[region_header] == region]
+            dates.append(date)
+            regions.append(region)
+            for prediction_version in score_by_region:
+                if not region_data.empty:
+                    val = region_data[prediction_version].mean()
+                    score_by_region[prediction_version].append(0.0 if pd.isna(val) else val)
+                else:
+                    score_by_region[prediction_version].append(0.0)
+    return pd.concat(
+        [pd.DataFrame({'date': dates}), pd.DataFrame({'region_name': regions}),
+         pd.DataFrame(score_by_region)], axis=1)
+
+
+def synthetic_geo(n_days, n_regions, rows_per_cell, missing=0.1, seed=0):
+    """
+    Frame shaped like daily_sentiment_county_updated_locations.csv with
+    rows_per_cell rows per (day, region) pair and a fraction of pairs missing.
+    """
+    rng = np.random.default_rng(seed)
+    dates = [str(date.date()) for date in pd.date_range(start_global, periods=n_days)]
+    regions = [f'County {i}' for i in range(n_regions)]
+    date_col = np.repeat(dates, n_regions * rows_per_cell)
+    region_col = np.tile(np.repeat(regions, rows_per_cell), n_days)
+    keep = rng.random(len(date_col)) >= missing
+    df = pd.DataFrame({'date': date_col[keep], 'county': region_col[keep]})
+    for column in avg_score_columns:
+        values = rng.normal(size=len(df.index))
+        values[rng.random(len(df.index)) < 0.02] = np.nan
+        df[column] = values
+    return df, regions
+
+
+def bench_region_aggregation(args):
+    rows = []
+    for n_regions in args.regions:
+        for rows_per_cell in args.rows_per_cell:
+            df, regions = synthetic_geo(args.days, n_regions, rows_per_cell)
+            df = compact_frame(df, 'geo')
+            end = str((pd.Timestamp(start_global) + pd.Timedelta(days=args.days - 1)).date())
+            new_seconds, new = _timeit(
+                lambda: aggregate_sentiment_by_region_type_by_date(df, regions, 'county', start_global, end))
+            if n_regions * args.days <= args.reference_max_cells:
+                old_seconds, old = _timeit(
+                    lambda: reference_sentiment_by_region_type_by_date(df, regions, 'county', start_global, end),
+                    repeat=1)
+                # The loop yields float32 columns when no cell is empty, float64 otherwise; compare values only,
+                # to float32 precision since the loop also averages in float32
+                pd.testing.assert_frame_equal(new, old, check_dtype=False, check_exact=False, rtol=1e-6, atol=1e-6)
+                old_text, speedup = f'{old_seconds:.3f}', f'{old_seconds / new_seconds:.0f}x'
+            else:
+                old_text, speedup = 'skipped', '-'
+            rows.append([n_regions, args.days, len(df.index), f'{new_seconds:.4f}', old_text, speedup])
+    _print_table(['regions', 'days', 'rows', 'groupby_s', 'loop_s', 'speedup'], rows)
+
+
+# Notable days
+
+def reference_notable_days(df_sent, df_count, dates):
+    """The per model, per date and per month loops that format_df_notable_days replaced"""
+    def ratio_by_day(column, label):
+        resulting_day, result_ratio = None, 0
+        for day in dates:
+            daily_df = df_sent.loc[df_sent['date'] == day]
+            label_ratio = round(len(daily_df.loc[daily_df[column] == label].index) / len(daily_df), 2)
+            if label_ratio > result_ratio:
+                result_ratio, resulting_day = label_ratio, day
+        return resulting_day, result_ratio
+
+    def ratio_by_month(column, label):
+        df = map_dates_to_months(df_sent)
+        resulting_month, result_ratio = None, 0
+        for month in months:
+            monthly_df = df.loc[df['date'] == month]
+            label_ratio = round(len(monthly_df.loc[monthly_df[column] == label].index) / len(monthly_df.index), 2)
+            if label_ratio > result_ratio:
+                result_ratio, resulting_month = label_ratio, month
+        return resulting_month, result_ratio
+
+    def volume_by_day():
+        highest_vol, highest_day = 0, None
+        for day in dates:
+            total_vol = df_count.loc[df_count['date'] == day, countries].sum(axis=1).values[0]
+            if total_vol > highest_vol:
+                highest_vol, highest_day = total_vol, day
+        return highest_day, highest_vol
+
+    rows = []
+    for sentiment in prediction_types:
+        column = prediction_columns[sentiment]
+        # Month volume left out: the loop reported the first day of the month, not its total
+        for notable_label, (date, rate) in [
+                ('Highest Tweet Volume Day', volume_by_day()),
+                ('Highest Positive Sentiment Ratio Day', ratio_by_day(column, 'pos')),
+                ('Highest Positive Sentiment Ratio Month', ratio_by_month(column, 'pos')),
+                ('Highest Negative Sentiment Ratio Day', ratio_by_day(column, 'neg')),
+                ('Highest Negative Sentiment Ratio Month', ratio_by_month(column, 'neg'))]:
+            rows.append({'notable_label': notable_label, 'date': date, 'rate': float(rate),
+                         'sentiment_type': sentiment})
+    return pd.DataFrame(rows)
+
+
+def synthetic_tweets(n_tweets, n_days, seed=0):
+    """Per-tweet frame shaped like all_tweet_sentiments.csv and the matching daily volume per country"""
+    rng = np.random.default_rng(seed)
+    dates = np.array([str(date.date()) for date in pd.date_range(start_global, periods=n_days)])
+    df = pd.DataFrame({'date': dates[rng.integers(0, n_days, n_tweets)],
+                       'country': rng.choice(countries, n_tweets, p=[.7, .15, .05, .1])})
+    for prediction_type in prediction_types:
+        df[prediction_columns[prediction_type]] = rng.choice(sentiment_labels, n_tweets)
+    df_count = pd.crosstab(df['date'], df['country']).reindex(index=dates, columns=countries, fill_value=0) \
+        .rename_axis(index='date', columns=None).reset_index()
+    return df, df_count
+
+
+def bench_notable_days(args):
+    rows = []
+    for n_tweets in args.tweets:
+        df, df_count = synthetic_tweets(n_tweets, len(str_dates_list))
+        new_seconds, new = _timeit(lambda: format_df_notable_days(df, df_count, k=args.k))
+        by_country_seconds, _ = _timeit(lambda: format_df_notable_days(df, df_count, k=args.k, by_country=True))
+        if n_tweets <= args.reference_max_tweets:
+            old_seconds, old = _timeit(lambda: reference_notable_days(df, df_count, str_dates_list), repeat=1)
+            top = new.loc[(new['rank'] == 1) & (new['notable_label'] != 'Highest Tweet Volume Month'),
+                          old.columns].reset_index(drop=True)
+            pd.testing.assert_frame_equal(top, old)
+            old_text, speedup = f'{old_seconds:.2f}', f'{old_seconds / new_seconds:.0f}x'
+        else:
+            old_text, speedup = 'skipped', '-'
+        rows.append([n_tweets, args.k, f'{new_seconds:.4f}', f'{by_country_seconds:.4f}', old_text, speedup])
+    _print_table(['tweets', 'k', 'engine_s', 'by_country_s', 'loops_s', 'speedup'], rows)
+
+
+# Label counts
+
+def reference_label_counts(df_sent, date, sentiment_col):
+    """The per request parse of the date column and the 12 filters of plot_sentiment_bar"""
+    days = pd.to_datetime(df_sent['date']).dt.date
+    df = df_sent[days == pd.Timestamp(date).date()]
+    return [[len(df[(df['country'] == country) & (df[sentiment_col] == sentiment)].index)
+             for country in countries] for sentiment in sentiment_labels]
+
+
+def bench_label_counts(args):
+    rows = []
+    for n_tweets in args.tweets:
+        df, _ = synthetic_tweets(n_tweets, len(str_dates_list))
+        build_seconds, label_counts = _timeit(
+            lambda: LabelCounts.from_frame(df, str_dates_list[0], str_dates_list[-1], countries), repeat=1)
+        dates = str_dates_list[::max(len(str_dates_list) // args.dates, 1)][:args.dates]
+        model = prediction_types.index('vader')
+        new_seconds, _ = _timeit(lambda: [label_counts.range_counts(date)[:, model].T for date in dates])
+        old_seconds, _ = _timeit(lambda: [reference_label_counts(df, date, prediction_columns['vader'])
+                                          for date in dates], repeat=1)
+        for date in dates:
+            assert label_counts.range_counts(date)[:, model].T.tolist() == \
+                reference_label_counts(df, date, prediction_columns['vader'])
+        rows.append([n_tweets, f'{build_seconds:.3f}', f'{new_seconds / len(dates) * 1e6:.1f}',
+                     f'{old_seconds / len(dates) * 1e3:.1f}', f'{old_seconds / new_seconds:.0f}x'])
+    _print_table(['tweets', 'build_s', 'lookup_us', 'filter_ms', 'speedup'], rows)
+
+
+# COVID stats
+
+def synthetic_covid_stats(n_days, seed=0):
+    """Daily stats per country in the layout of uk_covid_stats.csv, newest date first"""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start_global, periods=n_days).strftime('%Y-%m-%d')[::-1]
+    df = pd.DataFrame({'date': np.repeat(dates, len(countries)), 'country': countries * n_days})
+    for new, cum in [('newCasesByPublishDate', 'cumCasesByPublishDate'), ('newDeathsByDeathDate', 'cumDeathsByDeathDate')]:
+        df[new] = rng.integers(0, 5000, len(df))
+        df[cum] = df[::-1].groupby('country')[new].cumsum()[::-1]
+    return compact_frame(df, 'covid_stats')
+
+
+def reference_stats_per_day_per_country(df_stats, countries, col, dates):
+    """aggregate_stats_per_day_per_country as it was, parsing the whole date column for every date"""
+    stats_list = []
+    for date in dates:
+        df_stats['date'] = pd.to_datetime(df_stats.date, format='%Y-%m-%d')
+        dates_df = df_stats.loc[df_stats['date'] == date]
+        for country in countries:
+            country_df = dates_df.loc[dates_df['country'] == country, col]
+            if country_df.empty or pd.isna(country_df.values[0]):
+                stats_list.append(0.0)
+            else:
+                stats_list.append(country_df.values[0])
+    return stats_list
+
+
+def reference_covid_totals(df_stats, date):
+    """The two string filters of covid_stats_payload"""
+    return (int(df_stats.loc[df_stats['date'] == date, 'cumDeathsByDeathDate'].sum()),
+            int(df_stats.loc[df_stats['date'] == date, 'cumCasesByPublishDate'].sum()))
+
+
+def bench_covid_stats(args):
+    rows = []
+    for n_days in args.days:
+        df = synthetic_covid_stats(n_days)
+        build_seconds, cube = _timeit(lambda: CovidStatsCube.from_frames(df, format_df_ma_stats(df, countries),
+                                                                         countries), repeat=1)
+        dates = cube.dates[::max(len(cube.dates) // args.dates, 1)][:args.dates]
+        new_seconds, totals = _timeit(lambda: [cube.day_totals(date) for date in dates])
+        old_seconds, reference = _timeit(lambda: [reference_covid_totals(df, date) for date in dates], repeat=1)
+        assert [(total['cumDeathsByDeathDate'], total['cumCasesByPublishDate']) for total in totals] == reference
+        range_seconds, _ = _timeit(lambda: cube.range_series(cube.dates[0], cube.dates[-1]))
+        window = pd.to_datetime(cube.dates[:args.aggregate_days])
+        agg_seconds, aggregated = _timeit(lambda: aggregate_stats_per_day_per_country(df, countries, death_str, window))
+        loop_seconds, looped = _timeit(lambda: reference_stats_per_day_per_country(
+            df.copy(), countries, death_str, window), repeat=1)
+        assert aggregated == looped
+        rows.append([n_days, f'{build_seconds * 1e3:.1f}', f'{new_seconds / len(dates) * 1e6:.1f}',
+                     f'{old_seconds / len(dates) * 1e6:.0f}', f'{range_seconds * 1e3:.2f}',
+                     f'{agg_seconds * 1e3:.1f}', f'{loop_seconds * 1e3:.0f}'])
+    _print_table(['days', 'build_ms', 'lookup_us', 'filter_us', 'range_ms', 'aggregate_ms', 'reparse_ms'], rows)
+
+
+# Hashtags
+
+def synthetic_hashtags(n_days, n_hashtags=500, seed=0):
+    """Daily top ten hashtags in the layout of top_ten_hashtags_per_day.csv"""
+    rng = np.random.default_rng(seed)
+    popularity = rng.zipf(1.5, n_hashtags).astype(np.float64)
+    rows = []
+    for date in pd.date_range(start_global, periods=n_days).strftime('%Y-%m-%d'):
+        tags = rng.choice(n_hashtags, 10, replace=False, p=popularity / popularity.sum())
+        counts = np.sort(rng.integers(10, 1000, 10))[::-1]
+        rows.append({'top_ten_hashtags': str([(f'tag{tag}', int(count)) for tag, count in zip(tags, counts)]),
+                     'date': date})
+    return pd.DataFrame(rows)
+
+
+def reference_top_hashtags(hashtags_df, date):
+    """The per request filter and regex of top_hashtags"""
+    hashtag_date = hashtags_df.loc[hashtags_df['date'] == date]
+    if hashtag_date.empty:
+        return None
+    hashtags = [tuple(x.split(',')) for x in re.findall(r"\((.*?)\)", hashtag_date['top_ten_hashtags'].values[0])]
+    return [['#' + hashtag.replace("'", ''), int(count)] for hashtag, count in hashtags]
+
+
+def bench_hashtags(args):
+    rows = []
+    for n_days in args.days:
+        df = synthetic_hashtags(n_days)
+        build_seconds, store = _timeit(lambda: HashtagStore.from_frame(df), repeat=1)
+        dates = store.dates[::max(len(store.dates) // args.dates, 1)][:args.dates]
+        new_seconds, tops = _timeit(lambda: [store.day_top(date) for date in dates])
+        old_seconds, reference = _timeit(lambda: [reference_top_hashtags(df, date) for date in dates], repeat=1)
+        assert tops == reference
+        top_seconds, top = _timeit(lambda: store.top_k(store.dates[0], store.dates[-1], args.k))
+        trend_seconds, _ = _timeit(lambda: store.trends([hashtag for hashtag, _ in top],
+                                                        store.dates[0], store.dates[-1]))
+        rows.append([n_days, len(store.names), f'{build_seconds * 1e3:.0f}', f'{new_seconds / len(dates) * 1e6:.1f}',
+                     f'{old_seconds / len(dates) * 1e6:.0f}', f'{top_seconds * 1e3:.2f}', f'{trend_seconds * 1e3:.2f}'])
+    _print_table(['days', 'hashtags', 'build_ms', 'lookup_us', 'regex_us', 'top_k_ms', 'trends_ms'], rows)
+
+
+# Emojis
+
+def synthetic_emojis(n_weeks, n_emojis=300, per_week=10, seed=0):
+    """Weekly top emojis in the layout of weekly_emojis_with_colours.csv"""
+    rng = np.random.default_rng(seed)
+    popularity = rng.zipf(1.5, n_emojis).astype(np.float64)
+    colours = [f'rgb({r}, {g}, {b})' for r, g, b in rng.integers(0, 256, (n_emojis, 3))]
+    rows = []
+    for date in pd.date_range(start_global, periods=n_weeks, freq='7D').strftime('%Y-%m-%d'):
+        for emoji in rng.choice(n_emojis, per_week, replace=False, p=popularity / popularity.sum()):
+            rows.append({'emoji': chr(0x1F600 + int(emoji)), 'date': date, 'count': int(rng.integers(10, 1000)),
+                         'colour': colours[emoji]})
+    return pd.DataFrame(rows)
+
+
+def reference_emoji_bar_chart(emoji_df, dates, date):
+    """The argmax over the dates and the string filter of emoji_bar_chart_payload"""
+    date_index = (dates == pd.Timestamp(date)).argmax()
+    weekly_date = str(dates[date_index - (date_index % 7)].date())
+    return serialization.figure_dict(plot_emoji_bar_chart(emoji_df, weekly_date))
+
+
+def reference_top_emojis(emoji_df, start, end, k):
+    """Counts of the weeks from start to end summed with a groupby, most used first"""
+    rows = emoji_df[(emoji_df['date'] >= start) & (emoji_df['date'] <= end)]
+    totals = rows.groupby('emoji', sort=False)['count'].sum()
+    top = totals.iloc[np.argsort(-totals.to_numpy(), kind='stable')][:k]
+    return top.index.tolist(), top.tolist()
+
+
+def bench_emojis(args):
+    # Both emoji files hold the same weekly counts, the separated one without colours
+    with_colours = EmojiStore.from_frame(pd.read_csv(data_path('data/covid/weekly_emojis_with_colours.csv')),
+                                         start_global)
+    separated = EmojiStore.from_frame(pd.read_csv(data_path('data/covid/covid_emoji_count_separated.csv')),
+                                      start_global)
+    assert [with_colours.week(w)[:2] for w in range(with_colours.n_weeks)] == \
+        [separated.week(w)[:2] for w in range(separated.n_weeks)]
+
+    rows = []
+    for n_weeks in args.weeks:
+        df = synthetic_emojis(n_weeks)
+        build_seconds, store = _timeit(lambda: EmojiStore.from_frame(df, start_global), repeat=1)
+        bars_seconds, bars = _timeit(lambda: [
+            figure_specs.emoji_bar_spec(*store.week(w), f'Beginning: {store.week_starts[w]}')
+            for w in range(store.n_weeks)], repeat=1)
+        dates = pd.date_range(start_global, periods=n_weeks * 7)
+        sample = dates[::max(len(dates) // args.dates, 1)][:args.dates].strftime('%Y-%m-%d')
+        new_seconds, figures = _timeit(lambda: [bars[store.week_of(date)] for date in sample])
+        old_seconds, reference = _timeit(lambda: [reference_emoji_bar_chart(df, dates, date) for date in sample],
+                                         repeat=1)
+        assert [json.loads(serialization.dumps(figure)) for figure in figures] == \
+            [json.loads(serialization.dumps(figure)) for figure in reference]
+        first, last = store.week_starts[0], store.week_starts[-1]
+        top_seconds, top = _timeit(lambda: store.top_k(first, last, args.k))
+        group_seconds, grouped = _timeit(lambda: reference_top_emojis(df, first, last, args.k), repeat=1)
+        assert top[:2] == grouped
+        rows.append([n_weeks, len(store.names), f'{build_seconds * 1e3:.0f}', f'{bars_seconds * 1e3:.0f}',
+                     f'{new_seconds / len(sample) * 1e6:.2f}', f'{old_seconds / len(sample) * 1e3:.1f}',
+                     f'{top_seconds * 1e3:.2f}', f'{group_seconds * 1e3:.2f}'])
+    _print_table(['weeks', 'emojis', 'build_ms', 'bars_ms', 'lookup_us', 'plotly_ms', 'top_k_ms', 'groupby_ms'],
+                 rows)
+
+
+# News
+
+def repeated_news(copies):
+    """news_timeline.csv repeated copies times, each copy a year earlier than the one before"""
+    news = pd.read_csv(data_path('data/events/news_timeline.csv'))
+    shifted = [news.assign(Date=(pd.to_datetime(news['Date']) - pd.DateOffset(years=i)).dt.strftime('%Y-%m-%d'))
+               for i in range(copies)]
+    return pd.concat(shifted, ignore_index=True)
+
+
+def reference_daily_news(news_df, date):
+    """The filter and string concatenation of daily_news_payload"""
+    df = news_df.loc[news_df['Date'] == date]
+    links = ''
+    for headline, URL in zip(df['Headline'], df['URL']):
+        links += f'<a href="{URL}" target="_blank"><b>{headline}</b></a><br><br>'
+    return links
+
+
+def bench_news(args):
+    rows = []
+    for copies in args.copies:
+        news = repeated_news(copies)
+        build_seconds, index = _timeit(lambda: NewsIndex(news), repeat=1)
+        dates = news['Date'].drop_duplicates().tolist()[:args.dates]
+        new_seconds, fragments = _timeit(lambda: [index.fragment(date) for date in dates])
+        old_seconds, reference = _timeit(lambda: [reference_daily_news(news, date) for date in dates], repeat=1)
+        assert fragments == reference
+        search_seconds, _ = _timeit(lambda: [index.search(query) for query in args.queries])
+        rows.append([len(news), index.vocabulary_size, f'{build_seconds * 1e3:.0f}',
+                     f'{new_seconds / len(dates) * 1e6:.2f}', f'{old_seconds / len(dates) * 1e6:.0f}',
+                     f'{search_seconds / len(args.queries) * 1e3:.2f}'])
+    _print_table(['headlines', 'terms', 'build_ms', 'lookup_us', 'filter_us', 'search_ms'], rows)
+
+
+# R numbers
+
+def synthetic_r_numbers(n_weeks, seed=0):
+    """Weekly R number ranges in the layout of r_numbers.csv, some of them 0 like the early weeks"""
+    rng = np.random.default_rng(seed)
+    lower = np.round(rng.uniform(0.5, 1.4, n_weeks), 1)
+    lower[rng.random(n_weeks) < 0.2] = 0
+    return pd.DataFrame({'date': pd.date_range(start_global, periods=n_weeks, freq='7D').strftime('%d/%m/%Y'),
+                         'lower': lower, 'upper': np.where(lower > 0, lower + 0.2, 0)})
+
+
+def reference_r_number(r_numbers, week_pairs, date):
+    """The loop of r_numbers_payload over every week, parsing three dates per week"""
+    r_number = 'N/A'
+    for start, end in week_pairs:
+        if pd.to_datetime(start, format='%d/%m/%Y') < pd.to_datetime(date, format='%Y-%m-%d') <= \
+                pd.to_datetime(end, format='%d/%m/%Y'):
+            df = r_numbers.loc[r_numbers['date'] == start]
+            avg_r = round((df['upper'].iloc[0] + df['lower'].iloc[0]) / 2, 2)
+            if avg_r != 0:
+                r_number = f"~{avg_r}"
+    return r_number
+
+
+def bench_r_numbers(args):
+    rows = []
+    for n_weeks in args.weeks:
+        r_numbers = synthetic_r_numbers(n_weeks)
+        weeks = r_numbers['date'].tolist()
+        week_pairs = [(weeks[i], weeks[i + 1]) for i in range(0, len(weeks) - 1)]
+        build_seconds, intervals = _timeit(lambda: RNumberIntervals.from_frame(r_numbers), repeat=1)
+        days = pd.date_range(start_global, periods=n_weeks * 7 + 7)
+        dates = [str(date.date()) for date in days[::max(len(days) // args.dates, 1)][:args.dates]]
+        new_seconds, labels = _timeit(lambda: [intervals.label(date) for date in dates])
+        old_seconds, reference = _timeit(lambda: [reference_r_number(r_numbers, week_pairs, date)
+                                                  for date in dates], repeat=1)
+        assert labels == reference
+        range_seconds, _ = _timeit(lambda: intervals.range_series(start_global, str(days[-1].date())))
+        rows.append([n_weeks, f'{build_seconds * 1e3:.1f}', f'{new_seconds / len(dates) * 1e6:.1f}',
+                     f'{old_seconds / len(dates) * 1e3:.1f}', f'{old_seconds / new_seconds:.0f}x',
+                     f'{range_seconds * 1e3:.1f}'])
+    _print_table(['weeks', 'build_ms', 'lookup_us', 'loop_ms', 'speedup', 'range_ms'], rows)
+
+
+# Figure serialisation
+
+def reference_fig_to_json(fig):
+    """The to_dict, NumPy encoder and json.loads round trip of the old fig_to_json, then jsonify's dumps"""
+    class NumpyEncoder(json.JSONEncoder):
+        def default(self, obj):
+            if isinstance(obj, np.integer):
+                return int(obj)
+            if isinstance(obj, np.floating):
+                return float(obj)
+            if isinstance(obj, np.ndarray):
+                return obj.tolist()
+            return super(NumpyEncoder, self).default(obj)
+
+    sanitized_dict = json.loads(json.dumps(fig.to_dict(), cls=NumpyEncoder))
+    return json.dumps({'data': sanitized_dict['data'], 'layout': sanitized_dict['layout']})
+
+
+def _null_nan(obj):
+    """obj with NaN replaced by None, as the new encoder writes it"""
+    if isinstance(obj, dict):
+        return {key: _null_nan(value) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [_null_nan(value) for value in obj]
+    return None if isinstance(obj, float) and obj != obj else obj
+
+
+def serialization_figures():
+    """The stats graph up to the last date and the county choropleth with one day of values, from data/"""
+    df_stats = pd.read_csv(data_path('data/covid-data/uk_covid_stats.csv'), skipinitialspace=True)
+    stats = plot_covid_stats(format_df_ma_stats(df_stats, countries), countries, [''] * len(str_dates_list),
+                             str_dates_list[0], str_dates_list[-1])
+    with open(data_path('data/geojson/uk_counties_simpler.json')) as f:
+        geojson = json.load(f)
+    ids = [feature['properties']['id'] for feature in geojson['features']]
+    choropleth = plot_county_choropleth(geojson, ids, [feature['properties']['NAME'] for feature in geojson['features']])
+    choropleth.data[0].z = np.random.default_rng(0).uniform(-1, 1, len(ids))
+    return {'stats_graph': stats, 'county_choropleth': choropleth}
+
+
+def bench_serialization(args):
+    encoders = [('orjson' if serialization.orjson is not None else 'json', serialization.dumps)]
+    if serialization.orjson is not None:
+        encoders.append(('json', lambda obj: json.dumps(obj, cls=serialization.PlotlyJSONEncoder)))
+    rows = []
+    for name, fig in serialization_figures().items():
+        old_seconds, old = _timeit(lambda: reference_fig_to_json(fig), repeat=args.repeat)
+        expected = _null_nan(json.loads(old))
+        for encoder_name, encode in encoders:
+            new_seconds, new = _timeit(lambda: encode(serialization.figure_dict(fig, typed_arrays=False)),
+                                       repeat=args.repeat)
+            assert json.loads(new) == expected, f'{name} differs with {encoder_name}'
+            rows.append([name, encoder_name, len(new), f'{new_seconds * 1e3:.2f}', f'{old_seconds * 1e3:.2f}',
+                         f'{old_seconds / new_seconds:.1f}x'])
+        typed_seconds, typed = _timeit(lambda: serialization.dumps(serialization.figure_dict(fig, typed_arrays=True)),
+                                       repeat=args.repeat)
+        rows.append([name, 'typed arrays', len(typed), f'{typed_seconds * 1e3:.2f}', f'{old_seconds * 1e3:.2f}',
+                     f'{old_seconds / typed_seconds:.1f}x'])
+    _print_table(['figure', 'encoder', 'bytes', 'new_ms', 'old_ms', 'speedup'], rows)
+
+
+# Figure specs
+
+def synthetic_figure_frames(seed=0):
+    """Formatted frames shaped like the ones the graphs are drawn from, over every date, with a few NaN"""
+    rng = np.random.default_rng(seed)
+    n_days = len(str_dates_list)
+    long_dates = np.repeat(str_dates_list, len(countries))
+    long_countries = np.tile(countries, n_days)
+    sent = pd.DataFrame({'date': long_dates, 'region_name': long_countries})
+    for column in figure_specs.sent_comp_names:
+        sent[column] = np.where(rng.random(len(sent)) < 0.02, np.nan, rng.uniform(-0.4, 0.5, len(sent)))
+    count = pd.DataFrame({country: rng.uniform(0, 5000, n_days) for country in countries}).assign(date=str_dates_list)
+    comp = sent.groupby('date', as_index=False)[list(figure_specs.sent_comp_names)].mean()
+    # The stats frame is newest first, as format_df_ma_stats leaves it
+    stats = pd.DataFrame({'date': long_dates[::-1], 'country': np.repeat(countries, n_days),
+                          'newCasesByPublishDate': rng.uniform(0, 60000, len(sent)),
+                          'newDeathsByDeathDate': rng.uniform(0, 1200, len(sent))})
+    events = [f'Event {i}' if rng.random() < 0.05 else '' for i in range(n_days)]
+    return sent, count, comp, stats, events
+
+
+def reference_county_choropleth(geojson, geo_df, score, date):
+    """The px.choropleth_mapbox figure of /api/county_choropleth"""
+    fig = px.choropleth_mapbox(geo_df.assign(date=date), locations='id', featureidkey='properties.id',
+                               geojson=geojson, color=score, hover_name='county', mapbox_style='white-bg',
+                               color_continuous_scale=px.colors.diverging.Temps_r, zoom=3.5,
+                               center={"lat": 55, "lon": 0}, animation_frame='date', range_color=[-1, 1])
+    fig.update_layout(autosize=True, height=900)
+    return fig
+
+
+def figure_spec_cases(end):
+    """(name, plotly builder, spec builder) of each hot figure up to end"""
+    sent, count, comp, stats, events = synthetic_figure_frames()
+    sent_series = figure_specs.SeriesTable(sent, figure_specs.sent_comp_names, key='region_name')
+    count_series = figure_specs.SeriesTable(count, countries)
+    comp_series = figure_specs.SeriesTable(comp, figure_specs.sent_comp_names)
+    stats_series = figure_specs.SeriesTable(stats, figure_specs.stats_columns, key='country')
+    counts = np.random.default_rng(0).integers(0, 2000, (3, len(countries)))
+    with open(data_path('data/geojson/uk_counties_simpler.json')) as f:
+        geojson = json.load(f)
+    features = geojson['features'][::2]
+    geo_df = pd.DataFrame({'id': [feature['properties']['id'] for feature in features],
+                           'county': [feature['properties']['NAME'] for feature in features],
+                           'vader-score_avg': np.random.default_rng(0).uniform(-1, 1, len(features))})
+    stats_template = figure_specs.covid_stats_template(countries, events)
+    sent_vs_vol_template = figure_specs.sent_vs_vol_template(countries, events)
+    return [
+        ('stats_graph', lambda: plot_covid_stats(stats, countries, events, start_global, end),
+         lambda: figure_specs.covid_stats_spec(stats_series, stats_template, start_global, end)),
+        ('sent_vs_vol', lambda: plot_dropdown_sent_vs_vol(sent, count, 'vader-score_avg', events, countries,
+                                                          start_global, end),
+         lambda: figure_specs.sent_vs_vol_spec(sent_series, count_series, 'vader-score_avg', sent_vs_vol_template,
+                                               start_global, end)),
+        ('ma_sent_graph', lambda: plot_sentiment(sent, 'native-score_avg', start_global, end),
+         lambda: figure_specs.sentiment_spec(sent_series, 'native-score_avg', start_global, end)),
+        ('sentiment_comp', lambda: plot_sentiment_comp(comp, start_global, end),
+         lambda: figure_specs.sentiment_comp_spec(comp_series, start_global, end)),
+        ('sentiment_bar', lambda: plot_sentiment_counts_bar(counts, countries),
+         lambda: figure_specs.sentiment_counts_bar_spec(counts, countries)),
+        ('county_choropleth', lambda: reference_county_choropleth(geojson, geo_df, 'vader-score_avg', end),
+         lambda: figure_specs.county_choropleth_spec(geojson, geo_df['id'].to_numpy(), geo_df['county'].to_numpy(),
+                                                     geo_df['vader-score_avg'].to_numpy(), end, 'vader-score_avg')),
+    ]
+
+
+def bench_figure_specs(args):
+    rows = []
+    for end in args.ends:
+        for name, plot, spec in figure_spec_cases(end):
+            old_seconds, old = _timeit(lambda: serialization.dumps(serialization.figure_dict(plot())),
+                                       repeat=args.repeat)
+            build_seconds, _ = _timeit(spec, repeat=args.repeat)
+            new_seconds, new = _timeit(lambda: serialization.dumps(spec()), repeat=args.repeat)
+            assert json.loads(new) == json.loads(old), f'{name} up to {end} differs from the plotly figure'
+            rows.append([name, end, f'{build_seconds * 1e6:.0f}', f'{new_seconds * 1e3:.2f}',
+                         f'{old_seconds * 1e3:.2f}', f'{old_seconds / new_seconds:.0f}x'])
+    # build_us leaves out the encoding, spec_ms and plotly_ms include it
+    _print_table(['figure', 'end', 'build_us', 'spec_ms', 'plotly_ms', 'speedup'], rows)
+
+
+# Compression
+
+compression_endpoints = [
+    '/api/county_geometry',
+    '/api/timeline_bundle?date={date}&topic=covid&nlp_type=vader',
+    '/api/stats_graph?date={date}',
+    '/api/ma_sent_graph?date={date}&topic=covid&sentiment_type=vader',
+    '/api/county_choropleth?date={date}&topic=covid&nlp_type=vader',
+    '/api/county_choropleth_values?date={date}&topic=covid&nlp_type=vader',
+    '/api/sentiment_bar_chart?date={date}&source=covid&nlp_type=vader',
+    '/api/hashtag_table?date={date}&source=covid',
+    '/api/daily_news?date={date}',
+    '/api/dropdown_figure?topic=covid&sentiment_type=vader&chart_value=show_sentiment_vs_time',
+    '/api/corr_mat?topic=covid&sentiment_type=vader',
+]
+
+
+def _decode(response):
+    data = response.get_data()
+    encoding = response.headers.get('Content-Encoding')
+    if encoding == 'br':
+        return compression.brotli.decompress(data)
+    return gzip.decompress(data) if encoding == 'gzip' else data
+
+
+def bench_compression(args):
+    """Bytes each endpoint and static file sends per Accept-Encoding, through the app's test client"""
+    app = importlib.import_module(args.app).app
+    client = app.test_client()
+    encodings = compression.available_encodings()
+    rows = []
+    urls = [url.format(date=args.date) for url in compression_endpoints] + \
+        [str(path.relative_to(BASE_DIR / 'static')) for path in sorted((BASE_DIR / 'static').rglob('*'))
+         if path.suffix in compression.static_extensions]
+    for url in urls:
+        identity = client.get(url, headers={'Accept-Encoding': 'identity'})
+        row, body = [url.split('?')[0], len(identity.get_data())], identity.get_data()
+        for encoding in encodings:
+            response = client.get(url, headers={'Accept-Encoding': encoding})
+            assert _decode(response) == body, f'{url} differs when sent as {encoding}'
+            sent = response.headers.get('Content-Encoding') == encoding
+            row.append(len(response.get_data()) if sent else '-')
+        best = min([size for size in row[2:] if size != '-'], default=row[1])
+        row.append(f'{1 - best / row[1]:.0%}' if row[1] else '-')
+        rows.append(row)
+    # '-': sent uncompressed (under Flask-Compress's 500 bytes, or an already compressed image)
+    _print_table(['path', 'identity'] + encodings + ['saved'], rows)
+    check_encoding_etags(client, compression_endpoints[1].format(date=args.date), encodings)
+
+
+def check_encoding_etags(client, url, encodings):
+    """Each encoding of a cached response has its own ETag, and a 304 still varies on Accept-Encoding"""
+    etags = {}
+    for encoding in ['identity'] + encodings:
+        client.get(url, headers={'Accept-Encoding': encoding})
+        response = client.get(url, headers={'Accept-Encoding': encoding})
+        etags[encoding] = response.headers['ETag']
+        revalidated = client.get(url, headers={'Accept-Encoding': encoding, 'If-None-Match': etags[encoding]})
+        assert revalidated.status_code == 304, f'{url} sent as {encoding} is not revalidated by its ETag'
+        assert 'Accept-Encoding' in revalidated.headers.get('Vary', ''), f'304 of {url} does not vary on Accept-Encoding'
+    assert len(set(etags.values())) == len(etags), f'{url} has the same ETag in two encodings: {etags}'
+    print('ETags per encoding: ' + ', '.join(f'{encoding} {etag}' for encoding, etag in etags.items()))
+
+
+
+# Concurrency
+
+concurrency_endpoints = [
+    '/api/dates',
+    '/api/covid_stats?date={date}',
+    '/api/covid_stats_range?start={start}&end={date}',
+    '/api/r_numbers?date={date}',
+    '/api/r_numbers_range?start={start}&end={date}',
+    '/api/county_choropleth?date={date}&topic={topic}&nlp_type=vader',
+    '/api/county_geometry',
+    '/api/county_choropleth_values?date={date}&topic={topic}&nlp_type=vader',
+    '/api/region_sentiment?topic={topic}&nlp_type=vader&region_type=country&start={start}&end={date}',
+    '/api/sentiment_counts?topic={topic}&start={start}&end={date}',
+    '/api/sentiment_bar_chart?date={date}&source={topic}&nlp_type=vader',
+    '/api/emoji_bar_chart?date={date}&topic={topic}',
+    '/api/emoji_bar_chart?start={start}&end={date}&topic={topic}',
+    '/api/hashtag_table?date={date}&source={topic}',
+    '/api/hashtag_trends?topic={topic}&start={start}&end={date}',
+    '/api/daily_news?date={date}',
+    '/api/news_search?q=lockdown&end={date}',
+    '/api/stats_graph?date={date}',
+    '/api/ma_sent_graph?date={date}&topic={topic}&sentiment_type=vader',
+    '/api/timeline_bundle?date={date}&topic={topic}&nlp_type=vader',
+    '/api/notable_days?topic={topic}&nlp_type=vader',
+    '/api/dropdown_figure?topic={topic}&sentiment_type=vader&chart_value=show_sentiment_vs_time',
+    '/api/dropdown_figure?topic={topic}&sentiment_type=vader&chart_value=show_sentiment_comparison',
+    '/api/corr_mat?topic={topic}&sentiment_type=vader',
+]
+# Report live process state or stream, their responses differ between calls
+concurrency_excluded = {'/api/memory_report', '/api/cache_stats', '/api/playback'}
+
+
+def _endpoint_urls(module, dates):
+    return list(dict.fromkeys(url.format(date=date, topic=topic, start=start_global)
+                              for url in concurrency_endpoints for date in dates for topic in module.topics))
+
+
+def _fetch_all(app, urls):
+    client = app.test_client()
+    return [(url, *_response_of(client, url)) for url in urls]
+
+
+def _response_of(client, url):
+    response = client.get(url)
+    return response.status_code, response.get_data()
+
+
+def bench_concurrency(args):
+    """
+    Every endpoint requested from many threads at once with the caches off, so each request
+    rebuilds its payload from the shared datasets; every response must equal the serial one.
+    """
+    os.environ['RESPONSE_CACHE_SIZE'] = os.environ['PAYLOAD_CACHE_SIZE'] = '0'
+    module = importlib.import_module(args.app)
+    routes = {rule.rule for rule in module.app.url_map.iter_rules() if rule.rule.startswith('/api/')}
+    missing = routes - concurrency_excluded - {url.split('?')[0] for url in concurrency_endpoints}
+    assert not missing, f'concurrency_endpoints does not cover {sorted(missing)}'
+    urls = _endpoint_urls(module, args.dates)
+
+    # The first pass loads the topics, the second one is the serial baseline
+    expected = {url: (status, body) for url, status, body in _fetch_all(module.app, urls)}
+    serial_seconds, _ = _timeit(lambda: _fetch_all(module.app, urls), repeat=1)
+
+    shared = [(f'{topic}/{name}', value) for topic in module.topic_datasets.loaded_topics()
+              for name, value in module.topic_datasets[topic].items()]
+    writeable = [name for name, value in shared
+                 if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)) and not is_frozen(value)]
+    assert not writeable, f'writeable shared datasets: {writeable}'
+
+    rows, mismatches = [[1, len(urls), f'{serial_seconds:.2f}', f'{len(urls) / serial_seconds:.0f}', 0]], []
+    for threads in args.threads:
+        work = urls * args.rounds
+        random.Random(threads).shuffle(work)
+        chunks = [work[i::threads * 4] for i in range(threads * 4)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as executor:
+            results = [result for chunk in executor.map(lambda chunk: _fetch_all(module.app, chunk), chunks)
+                       for result in chunk]
+        seconds = time.perf_counter() - start
+        wrong = [url for url, status, body in results if (status, body) != expected[url]]
+        mismatches += wrong
+        rows.append([threads, len(work), f'{seconds:.2f}', f'{len(work) / seconds:.0f}', len(wrong)])
+    # threads 1 is the serial pass, each later row requests every url rounds times in a shuffled order
+    _print_table(['threads', 'requests', 'seconds', 'requests_per_s', 'mismatches'], rows)
+    assert not mismatches, f'responses differing from the serial ones: {sorted(set(mismatches))[:10]}'
+
+
+
+# Shared memory
+
+shared_memory_modes = {
+    'lazy': {'PRELOAD_TOPICS': '', 'SHARED_DATASETS': '0'},
+    'preload': {'PRELOAD_TOPICS': 'covid,lockdown', 'SHARED_DATASETS': '0'},
+    'shared': {'PRELOAD_TOPICS': 'covid,lockdown', 'SHARED_DATASETS': '1'},
+}
+
+
+def _prefork_master(app, mode, n_workers, dates, results):
+    """
+    Run in a fresh process: import the app as gunicorn.conf.py does, fork n_workers that
+    request every endpoint, and put the smaps_rollup reports of the master and workers in results.
+    """
+    os.environ.update(shared_memory_modes[mode], RESPONSE_CACHE_SIZE='0', PAYLOAD_CACHE_SIZE='0')
+    # This module imported utils.shared_arrays before the environment was set
+    shared_arrays.SHARED_DATASETS = os.environ['SHARED_DATASETS'] == '1'
+    module = importlib.import_module(app)
+    urls = _endpoint_urls(module, dates)
+    # As gunicorn.conf.py does before forking
+    gc.freeze()
+    pipes, pids = [], []
+    for _ in range(n_workers):
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read)
+            _fetch_all(module.app, urls)
+            os.write(write, json.dumps(shared_arrays.worker_memory_report()).encode('utf-8'))
+            os._exit(0)
+        os.close(write)
+        pipes.append(read)
+        pids.append(pid)
+    workers = []
+    for read, pid in zip(pipes, pids):
+        with os.fdopen(read) as f:
+            workers.append(json.loads(f.read()))
+        os.waitpid(pid, 0)
+    results.put({'master': shared_arrays.worker_memory_report(), 'workers': workers})
+
+
+def check_shared_frames():
+    """share() leaves every frame equal to the original, write-protected and reading from the segment"""
+    geo = compact_frame(pd.read_csv(data_path('data/covid/daily_sentiment_county_updated_locations.csv')), 'geo')
+    stats = compact_frame(pd.read_csv(data_path('data/covid-data/uk_covid_stats.csv'), skipinitialspace=True),
+                          'covid_stats')
+    datasets = {'geo': geo, 'stats': stats, 'counts': geo['vader-score_avg'], 'again': geo}
+    originals = {name: value.copy(deep=True) for name, value in datasets.items()}
+    try:
+        shared_datasets, shared_stats = shared_arrays.share('check', datasets, stats)
+        segment = np.ndarray(shared_arrays.shared_report()['bytes'], np.uint8,
+                             buffer=next(iter(shared_arrays.segments.values())).memory.buf)
+        assert shared_datasets is datasets and shared_stats is datasets['stats']
+        assert datasets['again'] is datasets['geo']
+        for name, original in originals.items():
+            value = datasets[name]
+            assert value is not original
+            if isinstance(value, pd.DataFrame):
+                pd.testing.assert_frame_equal(value, original)
+            else:
+                pd.testing.assert_series_equal(value, original)
+            assert is_frozen(value), f'{name} is writeable after share()'
+        assert np.shares_memory(datasets['geo']['vader-score_avg'].to_numpy(), segment)
+        assert np.shares_memory(datasets['geo']['county'].array.codes, segment)
+    finally:
+        shared_arrays.release()
+
+
+def bench_shared_memory(args):
+    """
+    Memory of a master and its forked workers after each served every endpoint: topics loaded
+    lazily by every worker, preloaded in the master, and preloaded into shared memory.
+    PSS divides each shared page between the processes mapping it, so the total is what they use together.
+    """
+    check_shared_frames()
+    context = multiprocessing.get_context('spawn')
+    rows = []
+    for n_workers in args.workers:
+        for mode in shared_memory_modes:
+            results = context.Queue()
+            master = context.Process(target=_prefork_master, args=(args.app, mode, n_workers, args.dates, results))
+            master.start()
+            report = results.get()
+            master.join()
+            workers = report['workers']
+            assert workers and all(workers), 'smaps_rollup is not available'
+            total = report['master']['pss'] + sum(worker['pss'] for worker in workers)
+            rows.append([n_workers, mode, f"{total / 2 ** 20:.1f}",
+                         f"{sum(worker['private'] for worker in workers) / len(workers) / 2 ** 20:.1f}",
+                         f"{sum(worker['shared'] for worker in workers) / len(workers) / 2 ** 20:.1f}",
+                         f"{report['master']['shared_datasets'] / 2 ** 20:.1f}"])
+    _print_table(['workers', 'mode', 'total_pss_mib', 'private_mib', 'shared_mib', 'segments_mib'], rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    region = subparsers.add_parser('region-aggregation',
+                                   help='aggregate_sentiment_by_region_type_by_date against the per-date loop')
+    region.add_argument('--days', type=int, default=60)
+    region.add_argument('--regions', type=int, nargs='+', default=[4, 24, 96, 217])
+    region.add_argument('--rows-per-cell', type=int, nargs='+', default=[1, 4])
+    region.add_argument('--reference-max-cells', type=int, default=60 * 217,
+                        help='skip the loop when days x regions exceeds this')
+    region.set_defaults(run=bench_region_aggregation)
+
+    notable = subparsers.add_parser('notable-days', help='format_df_notable_days against the per-date loops')
+    notable.add_argument('--tweets', type=int, nargs='+', default=[10000, 100000, 1000000])
+    notable.add_argument('-k', type=int, default=3)
+    notable.add_argument('--reference-max-tweets', type=int, default=100000,
+                         help='skip the loops above this many tweets')
+    notable.set_defaults(run=bench_notable_days)
+
+    counts = subparsers.add_parser('label-counts', help='LabelCounts lookups against filtering the tweets per request')
+    counts.add_argument('--tweets', type=int, nargs='+', default=[10000, 100000, 1000000])
+    counts.add_argument('--dates', type=int, default=10, help='dates looked up per run')
+    counts.set_defaults(run=bench_label_counts)
+
+    stats = subparsers.add_parser('covid-stats', help='CovidStatsCube lookups against filtering the stats frame')
+    stats.add_argument('--days', type=int, nargs='+', default=[371, 3650])
+    stats.add_argument('--dates', type=int, default=20, help='dates looked up per run')
+    stats.add_argument('--aggregate-days', type=int, default=120,
+                       help='dates of aggregate_stats_per_day_per_country against the reparsing loop')
+    stats.set_defaults(run=bench_covid_stats)
+
+    hashtags = subparsers.add_parser('hashtags', help='HashtagStore lookups against the regex over the daily lists')
+    hashtags.add_argument('--days', type=int, nargs='+', default=[371, 3650])
+    hashtags.add_argument('--dates', type=int, default=50, help='dates looked up per run')
+    hashtags.add_argument('-k', type=int, default=5, help='hashtags of the whole range followed by trends')
+    hashtags.set_defaults(run=bench_hashtags)
+
+    emojis = subparsers.add_parser('emojis', help='EmojiStore weeks and top k against the argmax and plotly path')
+    emojis.add_argument('--weeks', type=int, nargs='+', default=[53, 530])
+    emojis.add_argument('--dates', type=int, default=20, help='dates looked up per run')
+    emojis.add_argument('-k', type=int, default=10, help='emojis of the whole range')
+    emojis.set_defaults(run=bench_emojis)
+
+    news = subparsers.add_parser('news', help='NewsIndex fragments and search against filtering the news frame')
+    news.add_argument('--copies', type=int, nargs='+', default=[1, 10, 100],
+                      help='times news_timeline.csv is repeated')
+    news.add_argument('--dates', type=int, default=50, help='dates looked up per run')
+    news.add_argument('--queries', nargs='+', default=['lockdown', 'vaccine rollout', 'boris johnson tier system'])
+    news.set_defaults(run=bench_news)
+
+    r_numbers = subparsers.add_parser('r-numbers', help='RNumberIntervals lookups against the loop over every week')
+    r_numbers.add_argument('--weeks', type=int, nargs='+', default=[52, 520])
+    r_numbers.add_argument('--dates', type=int, default=20, help='dates looked up per run')
+    r_numbers.set_defaults(run=bench_r_numbers)
+
+    serialise = subparsers.add_parser('serialization', help='figure_dict + dumps against the old fig_to_json')
+    serialise.add_argument('--repeat', type=int, default=5)
+    serialise.set_defaults(run=bench_serialization)
+
+    specs = subparsers.add_parser('figure-specs', help='figure_specs builders against the plotly figures')
+    specs.add_argument('--ends', nargs='+', default=['2020-04-20', '2020-09-01', str_dates_list[-1]],
+                       help='last date of the graphs')
+    specs.add_argument('--repeat', type=int, default=5)
+    specs.set_defaults(run=bench_figure_specs)
+
+    compress = subparsers.add_parser('compression', help='bytes sent per endpoint with and without compression')
+    compress.add_argument('--app', default='api', choices=['api', 'robust_api'])
+    compress.add_argument('--date', default='2020-06-01')
+    compress.set_defaults(run=bench_compression)
+
+    concurrency = subparsers.add_parser('concurrency',
+                                        help='every endpoint from many threads against the serial responses')
+    concurrency.add_argument('--app', default='api', choices=['api', 'robust_api'])
+    concurrency.add_argument('--threads', type=int, nargs='+', default=[8, 32])
+    concurrency.add_argument('--rounds', type=int, default=3, help='times each url is requested per thread count')
+    concurrency.add_argument('--dates', nargs='+', default=['2020-04-01', '2020-11-05', '2021-03-25'])
+    concurrency.set_defaults(run=bench_concurrency)
+
+    shared = subparsers.add_parser('shared-memory', help='memory of forked workers with and without shared datasets')
+    shared.add_argument('--app', default='robust_api', choices=['api', 'robust_api'])
+    shared.add_argument('--workers', type=int, nargs='+', default=[1, 4])
+    shared.add_argument('--dates', nargs='+', default=['2020-04-01', '2021-03-25'])
+    shared.set_defaults(run=bench_shared_memory)
+
+    args = parser.parse_args()
+    args.run(args)
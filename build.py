@@ -0,0 +1,157 @@
+"""
+Offline build of the dashboard's formatted datasets
+
+Runs the moving averages, the sentiment comparison, the label counts, the notable
+days and the correlation (scatter) frames once for every topic and writes them, with a
+manifest of the sources they came from, to data/artifacts. Start the API with
+ARTIFACTS_ONLY=1 to serve them without running any aggregation. The static files
+get .br and .gz copies next to them, which the API sends to clients accepting them.
+
+    python build.py
+    python build.py --topics covid --tweet-stores --out /tmp/artifacts
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from utils.aggregations import LabelCounts
+from utils.artifacts import ARTIFACTS_DIR, ArtifactWriter
+from utils.compression import precompress_static
+from utils.formatting import (
+    create_event_array, format_df_ma_stats, format_df_ma_sent, format_df_ma_tweet_vol,
+    format_df_corr, format_df_notable_days, format_df_ma_sent_comp, format_df_ma_daily_sent,
+    start_global, end_global, str_dates_list, countries
+)
+from utils.paths import BASE_DIR, data_path
+from utils.schema import compact_frame
+from utils.snapshots import load_csv
+from utils.tweet_store import build_tweet_store, open_tweet_store
+
+topics = ['covid', 'lockdown']
+
+
+def _read(writer, relative_path, name=None, **kwargs):
+    """Load (and compact) a data/ file, recording it as a source of the build"""
+    path = data_path(relative_path)
+    if path is None:
+        print(f"Warning: Could not find file {relative_path}")
+        return pd.DataFrame()
+    writer.add_source(path)
+    df = load_csv(path, **kwargs)
+    return compact_frame(df, name) if name else df
+
+
+def _timed(label, build):
+    start = time.perf_counter()
+    result = build()
+    print(f"Built {label} in {time.perf_counter() - start:.2f}s")
+    return result
+
+
+def build_topic(writer, topic, df_covid_stats, tweet_stores=False, notable_k=3):
+    tweet_count = _read(writer, f'data/{topic}/daily_tweet_count_country.csv', 'tweet_count')
+    geo = _read(writer, f'data/{topic}/daily_sentiment_county_updated_locations.csv', 'geo')
+
+    csv_path = data_path(f'data/{topic}/all_tweet_sentiments.csv')
+    store_path = BASE_DIR / f'data/{topic}/tweet_store'
+    if tweet_stores and csv_path is not None:
+        _timed(f'{topic} tweet store', lambda: build_tweet_store(csv_path, store_path))
+    tweet_store = open_tweet_store(store_path)
+
+    writer.write_frame(f'{topic}/formatted_tweet_count',
+                       _timed(f'{topic} tweet volume', lambda: format_df_ma_tweet_vol(tweet_count, countries)))
+    writer.write_frame(f'{topic}/formatted_tweet_sent',
+                       _timed(f'{topic} sentiment', lambda: format_df_ma_sent(geo)))
+
+    if tweet_store is not None:
+        writer.add_source(store_path / 'meta.json')
+        tweets = tweet_store.day_frame(start_global, end_global, with_dates=True)
+        sent_comp = _timed(f'{topic} sentiment comparison', lambda: format_df_ma_daily_sent(
+            tweet_store.daily_score_means(start_global, end_global)))
+    elif csv_path is not None:
+        tweets = _read(writer, f'data/{topic}/all_tweet_sentiments.csv', 'all_sentiments')
+        sent_comp = _timed(f'{topic} sentiment comparison', lambda: format_df_ma_sent_comp(tweets))
+    else:
+        print(f"Skipping {topic} sentiment comparison, no all_tweet_sentiments.csv or tweet store")
+        tweets = pd.DataFrame()
+        sent_comp = None
+    if sent_comp is not None:
+        writer.write_frame(f'{topic}/formatted_sent_comp', sent_comp)
+
+    if not tweets.empty:
+        writer.write_frame(f'{topic}/label_counts', _timed(f'{topic} label counts', lambda: LabelCounts.from_frame(
+            tweets, start_global, end_global, countries).to_frame()))
+        writer.write_frame(f'{topic}/notable_days', _timed(f'{topic} notable days', lambda: format_df_notable_days(
+            tweets, tweet_count, k=notable_k)))
+        writer.write_frame(f'{topic}/notable_days_by_country', _timed(
+            f'{topic} notable days by country', lambda: format_df_notable_days(
+                tweets, tweet_count, k=notable_k, by_country=True)))
+    else:
+        # Without the per-tweet labels the committed table is the best available
+        writer.write_frame(f'{topic}/notable_days',
+                           _read(writer, f'data/{topic}/notable_days_months.csv', 'notable_days'))
+
+    scatter = _timed(f'{topic} correlation', lambda: format_df_corr(
+        geo, tweet_count, df_covid_stats.copy(), str_dates_list))
+    writer.write_frame(f'{topic}/scatter', compact_frame(scatter, 'scatter'))
+
+
+def build_static(static_dir=BASE_DIR / 'static'):
+    """Write the .br / .gz copies of the static files and print how many bytes they save"""
+    report = _timed('static compression', lambda: precompress_static(static_dir))
+    for encoding in ['br', 'gzip']:
+        compressed = {path: sizes for path, sizes in report.items() if sizes.get(encoding)}
+        total = sum(sizes['bytes'] for sizes in compressed.values())
+        sent = sum(sizes[encoding] for sizes in compressed.values())
+        if total:
+            print(f"Static files as {encoding}: {len(compressed)} files, {sent} of {total} bytes "
+                  f"({1 - sent / total:.0%} saved)")
+    # Already compressed formats (the PNG wordclouds) do not shrink and are sent as they are
+    skipped = [path for path, sizes in report.items() if not any(sizes.get(encoding) for encoding in ['br', 'gzip'])]
+    if skipped:
+        print(f"Not compressed, saving under 5%: {', '.join(skipped)}")
+    return report
+
+
+def build(out_dir=ARTIFACTS_DIR, build_topics=None, tweet_stores=False, notable_k=3, static=True):
+    """
+    :param out_dir: Directory to write the artifacts and manifest to (replaced as a whole)
+    :param build_topics: Topics to build, defaults to all of them
+    :param tweet_stores: Also (re)build data/<topic>/tweet_store from all_tweet_sentiments.csv
+    :param notable_k: Days/months kept per notable-days ranking
+    :param static: Also precompress the static files
+    :return:
+    The written manifest.
+    """
+    start = time.perf_counter()
+    writer = ArtifactWriter(out_dir)
+    try:
+        df_covid_stats = _read(writer, 'data/covid-data/uk_covid_stats.csv', 'covid_stats', skipinitialspace=True)
+        df_events = _read(writer, 'data/events/key_events.csv', skipinitialspace=True, usecols=['Date', 'Event'])
+        writer.write_frame('global/formatted_covid_stats',
+                           _timed('covid stats', lambda: format_df_ma_stats(df_covid_stats, countries)))
+        writer.write_json('global/events_array', create_event_array(df_events, start_global, end_global))
+        for topic in build_topics or topics:
+            build_topic(writer, topic, df_covid_stats, tweet_stores, notable_k)
+        manifest = writer.finish()
+    except BaseException:
+        writer.abort()
+        raise
+    if static:
+        build_static()
+    print(f"Wrote {len(manifest['artifacts'])} artifacts to {out_dir} in {time.perf_counter() - start:.2f}s")
+    return manifest
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Precompute the formatted datasets served by the API')
+    parser.add_argument('--out', default=str(ARTIFACTS_DIR), help='artifact directory (default: %(default)s)')
+    parser.add_argument('--topics', nargs='+', choices=topics, help='topics to build (default: all)')
+    parser.add_argument('--tweet-stores', action='store_true',
+                        help='rebuild data/<topic>/tweet_store from all_tweet_sentiments.csv first')
+    parser.add_argument('--notable-k', type=int, default=3,
+                        help='days/months kept per notable-days ranking (default: %(default)s)')
+    parser.add_argument('--no-static', action='store_true', help='skip the .br / .gz copies of the static files')
+    args = parser.parse_args()
+    build(args.out, args.topics, args.tweet_stores, args.notable_k, static=not args.no_static)
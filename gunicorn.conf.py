@@ -0,0 +1,53 @@
+"""
+gunicorn settings of the Procfile deployment
+
+The app is imported once in the master (preload_app) with every topic loaded,
+before the workers are forked, so the workers share its pages copy-on-write instead
+of each loading its own copy; the datasets are write-protected, so those pages stay
+shared. SHARED_DATASETS=1 also moves the dataset arrays into shared memory
+(utils/shared_arrays.py), off by default: it did not lower the total PSS in
+benchmark.py shared-memory. The master's objects are frozen out of the garbage collector
+before each fork, so collections in a worker do not copy their pages. Every worker
+logs its shared and private bytes once it starts; /api/memory_report returns the
+same numbers on request.
+
+WEB_CONCURRENCY sets the number of workers and PORT the port, as gunicorn reads them.
+"""
+import gc
+import os
+
+# Read by the app module when the master imports it
+os.environ.setdefault('PRELOAD_TOPICS', 'covid,lockdown')
+
+preload_app = True
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+
+def _mib(size):
+    return f'{size / 2 ** 20:.1f} MiB'
+
+
+def when_ready(server):
+    from utils.shared_arrays import shared_report
+    report = shared_report()
+    server.log.info(f"{len(report['segments'])} shared dataset segments, {_mib(report['bytes'])}")
+
+
+def pre_fork(server, worker):
+    # The objects loaded so far are never collected, so the collector does not write to their pages
+    # and the workers keep sharing them with the master
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    from utils.shared_arrays import worker_memory_report
+    report = worker_memory_report()
+    if report:
+        worker.log.info(f"Worker {worker.pid}: rss {_mib(report['rss'])}, shared {_mib(report['shared'])}, "
+                        f"private {_mib(report['private'])}, dataset arrays in shared memory {_mib(report['shared_datasets'])}")
+
+
+def on_exit(server):
+    # Removes the segment names, the workers only unmap them
+    from utils.shared_arrays import release
+    release()
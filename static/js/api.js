@@ -42,6 +42,11 @@ class CovidDataAPI {
   }
 
   // Timeline page data endpoints
+  // Every timeline payload of a date in one request, keyed by the endpoints below
+  async getTimelineBundle(date, topic, nlpType) {
+    return this.fetchData('timeline_bundle', { date, topic, nlp_type: nlpType });
+  }
+
   async getCovidStats(date) {
     return this.fetchData('covid_stats', { date });
   }
@@ -54,6 +59,16 @@ class CovidDataAPI {
     return this.fetchData('county_choropleth', { date, nlp_type: nlpType, topic });
   }
 
+  // Geometry, feature ids and hover names of the county map, fetched once
+  async getCountyGeometry() {
+    return this.fetchData('county_geometry');
+  }
+
+  // Sentiment per county for one date, in the feature order of getCountyGeometry
+  async getCountyChoroplethValues(date, nlpType, topic) {
+    return this.fetchData('county_choropleth_values', { date, nlp_type: nlpType, topic });
+  }
+
   async getSentimentBarChart(date, source, nlpType) {
     return this.fetchData('sentiment_bar_chart', { date, source, nlp_type: nlpType });
   }
@@ -78,6 +93,15 @@ class CovidDataAPI {
     return this.fetchData('ma_sent_graph', { date, topic, sentiment_type: sentimentType });
   }
 
+  // Server-sent event stream of one compact frame per date from start to end
+  openPlayback(start, topic, nlpType, end = null) {
+    const params = new URLSearchParams({ start, topic, nlp_type: nlpType });
+    if (end) {
+      params.set('end', end);
+    }
+    return new EventSource(`${this.baseUrl}/playback?${params.toString()}`);
+  }
+
   // Analysis page data endpoints
   async getNotableDays(topic, nlpType) {
     return this.fetchData('notable_days', { topic, nlp_type: nlpType });
@@ -20,9 +20,18 @@ let allDates = [];
 let currentDateIndex = 0;
 let isPlaying = false;
 let playInterval;
+let playbackSource = null;
+let playbackQueue = [];
+let playbackEnded = false;
+let countyMapDrawn = false;
 const START_DATE = '2020-03-20';
 const END_DATE = '2021-03-25';
 
+// Fingerprinted path of a static file, written into index.html by the server
+function assetUrl(path) {
+  return (window.ASSET_URLS || {})[path] || path;
+}
+
 // -------------------------
 // Navigation
 // -------------------------
@@ -113,29 +122,66 @@ function initButtons() {
   });
   
   playButton.addEventListener('click', () => {
-    isPlaying = !isPlaying;
-    playButton.textContent = isPlaying ? 'Stop' : 'Play';
-    
-    if (isPlaying) {
-      playInterval = setInterval(() => {
-        if (currentDateIndex < allDates.length - 1) {
-          currentDateIndex++;
-          updateSlider();
-          updateTimelineData();
-        } else {
-          stopPlayback();
-        }
-      }, 1000);
+    if (!isPlaying && currentDateIndex < allDates.length - 1) {
+      startPlayback();
     } else {
       stopPlayback();
     }
   });
 }
 
+function startPlayback() {
+  isPlaying = true;
+  document.getElementById('play-button').textContent = 'Stop';
+  
+  // The server streams the frames ahead of time, one is shown per tick
+  playbackQueue = [];
+  playbackEnded = false;
+  playbackSource = api.openPlayback(
+    allDates[currentDateIndex + 1],
+    document.getElementById('source-dropdown').value,
+    document.getElementById('nlp-dropdown').value
+  );
+  // The bar chart and hashtag table are drawn once from the server's specs, the frames only restyle them
+  playbackSource.addEventListener('figures', (event) => {
+    const figures = JSON.parse(event.data);
+    Plotly.react('sentiment-bar-chart', figures.sentiment_bar_chart.data, figures.sentiment_bar_chart.layout);
+    Plotly.react('hashtag-table', figures.hashtag_table.data, figures.hashtag_table.layout);
+  });
+  playbackSource.onmessage = (event) => {
+    playbackQueue.push({ date: event.lastEventId, frame: JSON.parse(event.data) });
+  };
+  playbackSource.addEventListener('end', () => {
+    playbackEnded = true;
+    playbackSource.close();
+  });
+  
+  playInterval = setInterval(() => {
+    const next = playbackQueue.shift();
+    if (next) {
+      currentDateIndex = allDates.indexOf(next.date);
+      updateSlider();
+      renderPlaybackFrame(next.date, next.frame);
+    } else if (playbackEnded) {
+      stopPlayback();
+    }
+  }, 1000);
+}
+
 function stopPlayback() {
+  const wasPlaying = isPlaying;
   isPlaying = false;
   document.getElementById('play-button').textContent = 'Play';
   clearInterval(playInterval);
+  if (playbackSource) {
+    playbackSource.close();
+    playbackSource = null;
+  }
+  playbackQueue = [];
+  // The frames leave out the graphs, bring the whole page up to the current date
+  if (wasPlaying) {
+    updateTimelineData();
+  }
 }
 
 function updateSlider() {
@@ -206,28 +252,19 @@ async function updateTimelineData() {
   document.getElementById('current-date-indicator').textContent = currentDate;
   
   try {
-    // Load all data in parallel
-    const [
-      covidStats,
-      rNumbers,
-      countyChoropleth,
-      sentimentBarChart,
-      emojiBarChart,
-      hashtagTable,
-      dailyNews,
-      statsGraph,
-      maSentGraph
-    ] = await Promise.all([
-      api.getCovidStats(currentDate),
-      api.getRNumbers(currentDate),
-      api.getCountyChoropleth(currentDate, nlpType, source),
-      api.getSentimentBarChart(currentDate, source, nlpType),
-      api.getEmojiBarChart(currentDate, source),
-      api.getHashtagTable(currentDate, source),
-      api.getDailyNews(currentDate),
-      api.getStatsGraph(currentDate),
-      api.getMASentGraph(currentDate, source, nlpType)
-    ]);
+    // One request returns the payloads of every timeline chart
+    const bundle = await api.getTimelineBundle(currentDate, source, nlpType);
+    const {
+      covid_stats: covidStats,
+      r_numbers: rNumbers,
+      county_choropleth_values: countyChoropleth,
+      sentiment_bar_chart: sentimentBarChart,
+      emoji_bar_chart: emojiBarChart,
+      hashtag_table: hashtagTable,
+      daily_news: dailyNews,
+      stats_graph: statsGraph,
+      ma_sent_graph: maSentGraph
+    } = bundle;
     
     // Update indicators
     document.getElementById('total-deaths-indicator').textContent = covidStats.total_deaths;
@@ -239,7 +276,7 @@ async function updateTimelineData() {
       `Heatmap of Sentiment Within ${source} Related Tweets in the UK. Date: ${currentDate}`;
     
     // Update visualizations with Plotly
-    Plotly.react('county-choropleth', countyChoropleth.data, countyChoropleth.layout);
+    await updateCountyChoropleth(countyChoropleth);
     Plotly.react('sentiment-bar-chart', sentimentBarChart.data, sentimentBarChart.layout);
     Plotly.react('emoji-bar-chart', emojiBarChart.data, emojiBarChart.layout);
     Plotly.react('hashtag-table', hashtagTable.data, hashtagTable.layout);
@@ -254,6 +291,53 @@ async function updateTimelineData() {
   }
 }
 
+async function updateCountyChoropleth(values) {
+  // The geometry is drawn once, every later date only restyles the colour values
+  if (!countyMapDrawn) {
+    const geometry = await api.getCountyGeometry();
+    await Plotly.react('county-choropleth', geometry.data, geometry.layout);
+    countyMapDrawn = true;
+  }
+  Plotly.restyle('county-choropleth', {
+    z: [values.values],
+    'colorbar.title.text': values.score
+  });
+}
+
+function renderPlaybackFrame(date, frame) {
+  const source = document.getElementById('source-dropdown').value;
+  
+  document.getElementById('current-date-indicator').textContent = date;
+  document.getElementById('total-deaths-indicator').textContent = frame.covid_stats.total_deaths;
+  document.getElementById('total-cases-indicator').textContent = frame.covid_stats.total_cases;
+  document.getElementById('r-number-indicator').textContent = frame.r_numbers.r_number;
+  document.getElementById('heatmap-title').textContent = 
+    `Heatmap of Sentiment Within ${source} Related Tweets in the UK. Date: ${date}`;
+  
+  updateCountyChoropleth(frame.county_choropleth_values);
+  
+  // One y array per sentiment label, in the trace order of the figure spec
+  const counts = frame.sentiment_counts;
+  if (counts.counts) {
+    Plotly.restyle('sentiment-bar-chart', { y: counts.counts });
+  }
+  
+  const hashtags = frame.hashtags || [];
+  Plotly.restyle('hashtag-table', {
+    'cells.values': [[hashtags.map(h => h[0]), hashtags.map(h => h[1])]]
+  });
+  
+  document.getElementById('daily-news').innerHTML = frame.news
+    .map(([headline, url]) => `<a href="${escapeHtml(url)}" target="_blank"><b>${escapeHtml(headline)}</b></a><br><br>`)
+    .join('');
+}
+
+function escapeHtml(text) {
+  const div = document.createElement('div');
+  div.textContent = text;
+  return div.innerHTML.replace(/"/g, '&quot;');
+}
+
 // -------------------------
 // Analysis Page
 // -------------------------
@@ -292,8 +376,8 @@ async function updateAnalysisData() {
     Plotly.react('corr-mat', corrMat.data, corrMat.layout);
     
     // Update wordcloud images
-    document.getElementById('emoji-wordcloud').src = `assets/${source}_emoji_wordcloud.png`;
-    document.getElementById('wordcloud').src = `assets/${source}_wordcloud.png`;
+    document.getElementById('emoji-wordcloud').src = assetUrl(`assets/${source}_emoji_wordcloud.png`);
+    document.getElementById('wordcloud').src = assetUrl(`assets/${source}_wordcloud.png`);
     
   } catch (error) {
     console.error('Error updating analysis data:', error);
@@ -1,5 +1,12 @@
+import heapq
+import re
+from bisect import bisect_left
+
+import numpy as np
 import pandas as pd
 
+from utils.schema import to_day_numbers, date_to_day, day_to_date
+
 avg_score_columns = ['nn-score_avg', 'textblob-score_avg',
                      'vader-score_avg', 'native-score_avg']
 score_columns = {'nn': 'nn-score', 'textblob': 'textblob-score',
@@ -49,50 +56,211 @@ def map_dates_to_months(df):
 
 def map_label_to_score(df, label):
     map_func = lambda x: sentiments[x]
-    df[label] = df[label].map(map_func)
-    return df
+    return df.assign(**{label: df[label].map(map_func)})
 
 
 def aggregate_sentiment_by_region_type_by_date(data, region_list, region_header,
                                                start,
                                                end):
     """
-    :param data:
-    :param region_list:
-    :param region_header:
+    :param data: Long format frame with a 'date' column, region_header and the *-score_avg columns
+    :param region_list: Regions to report, in output order
+    :param region_header: 'country' or 'county'
     :param start:
     :param end:
     :return:
-    DataFrame where each column is each region, each row is each date. Cells contain average sentiment/score of that region
-    within specified date.
+    DataFrame with one row per date and region (dates outermost, regions in region_list order). Cells contain
+    the average sentiment/score of that region within the date, 0.0 where the region has no data that day.
 
     """
     date_list = [str(date.date()) for date in pd.date_range(start=start, end=end).tolist()]
-    score_by_region = {'{}-score_avg'.format(prediction_version): [] for
-                       prediction_version in prediction_types}
-    dates = []
-    regions = []
-    data['date'] = pd.to_datetime(data.date)
-    for date in date_list:
-        date_data = data.loc[data['date'] == date]
-        for region in region_list:
-            region_data = date_data.loc[date_data[region_header] == region]
-            dates.append(date)
-            regions.append(region)
-            for i, prediction_version in enumerate(avg_score_columns):
-                if not region_data.empty:
-                    # Replace NaN with 0.0
-                    val = region_data[prediction_version].mean()
-                    score_by_region[prediction_version].append(0.0 if pd.isna(val) else val)
-                else:
-                    # If no data, use 0.0 as default
-                    score_by_region[prediction_version].append(0.0)
-    full_data = pd.concat(
-        [pd.DataFrame({'date': dates}), pd.DataFrame({'region_name': regions}),
-         pd.DataFrame(score_by_region)], axis=1)
+    score_cols = ['{}-score_avg'.format(prediction_version) for prediction_version in prediction_types]
+    # Dates may be ISO strings or day offsets (see utils.schema), group on day offsets
+    days = to_day_numbers(data['date'])
+    first_day, last_day = date_to_day(start), date_to_day(end)
+    in_range = ((days >= first_day) & (days <= last_day)).to_numpy()
+    # One groupby over the rows in range instead of a .loc filter per date and region
+    means = data.loc[in_range, score_cols] \
+        .groupby([days.to_numpy()[in_range], np.asarray(data[region_header], dtype=object)[in_range]], sort=False) \
+        .mean()
+    cells = pd.MultiIndex.from_product([range(first_day, last_day + 1), region_list])
+    scores = means.reindex(cells).to_numpy(dtype=np.float64)
+    full_data = pd.DataFrame({'date': [date for date in date_list for _ in region_list],
+                              'region_name': list(region_list) * len(date_list)})
+    for i, column in enumerate(score_cols):
+        # Replace NaN (no rows, or only NaN scores) with 0.0
+        full_data[column] = np.where(np.isnan(scores[:, i]), 0.0, scores[:, i])
     return full_data
 
 
+class SentimentCube:
+    """
+    Dense day x region x model arrays of a long format sentiment frame such as
+    daily_sentiment_county_updated_locations.csv.
+
+    sums[d, r, m] and counts[d, r, m] are the total and the number of non-NaN
+    scores of model m (in prediction_types order) for region r on day d, rows[d, r]
+    the number of source rows. Only the cumulative sums along the day axis are
+    stored, so the mean of any region over any date range is two subtractions
+    instead of a filter over the frame. The files hold one score per
+    county and day rather than tweet counts, so a count is a number of
+    county-day observations and range means weight every county and day equally,
+    as aggregate_sentiment_by_region_type_by_date does.
+    """
+
+    models = prediction_types
+    score_columns = ['{}-score_avg'.format(prediction_version) for prediction_version in prediction_types]
+
+    def __init__(self, regions, start, sums, counts, rows, region_ids=None):
+        self.regions = list(regions)
+        self.region_ids = region_ids
+        self.first_day = date_to_day(start)
+        self.dates = [str(date.date()) for date in pd.date_range(start=start, periods=sums.shape[0])]
+        self.rows = rows.astype(np.int32)
+        zero = np.zeros((1,) + sums.shape[1:])
+        self.sum_prefix = np.concatenate([zero, np.cumsum(sums, axis=0)])
+        self.count_prefix = np.concatenate([zero, np.cumsum(counts, axis=0)]).astype(np.int32)
+
+    @classmethod
+    def from_frame(cls, data, region_header, start, end, regions=None, id_column=None):
+        """
+        :param data: Long format frame with a 'date' column, region_header and the *-score_avg columns
+        :param region_header: 'country' or 'county'
+        :param start:
+        :param end:
+        :param regions: Region axis, defaults to the regions of data in order of appearance
+        :param id_column: Column holding a numeric id per region (the GeoJSON feature id)
+        :return:
+        SentimentCube covering every date from start to end.
+        """
+        n_days = (pd.Timestamp(end) - pd.Timestamp(start)).days + 1
+        region_values = np.asarray(data[region_header], dtype=object)
+        if regions is None:
+            regions = [region for region in pd.unique(region_values) if not pd.isna(region)]
+        day = to_day_numbers(data['date']).to_numpy().astype(np.int64) - date_to_day(start)
+        region = pd.Index(regions).get_indexer(region_values)
+        keep = (day >= 0) & (day < n_days) & (region >= 0)
+        cell = day[keep] * len(regions) + region[keep]
+        n_cells = n_days * len(regions)
+
+        scores = data[cls.score_columns].to_numpy(dtype=np.float64)[keep]
+        sums = np.zeros((n_cells, len(cls.models)))
+        counts = np.zeros((n_cells, len(cls.models)))
+        for m in range(len(cls.models)):
+            valid = ~np.isnan(scores[:, m])
+            sums[:, m] = np.bincount(cell[valid], weights=scores[valid, m], minlength=n_cells)
+            counts[:, m] = np.bincount(cell[valid], minlength=n_cells)
+        rows = np.bincount(cell, minlength=n_cells).reshape(n_days, len(regions))
+
+        region_ids = None
+        if id_column is not None:
+            # First id seen for each region, -1 for regions without rows
+            region_ids = np.full(len(regions), -1, dtype=np.int64)
+            seen, first = np.unique(region[keep], return_index=True)
+            region_ids[seen] = data[id_column].to_numpy()[keep][first]
+        shape = (n_days, len(regions), len(cls.models))
+        return cls(regions, start, sums.reshape(shape), counts.reshape(shape), rows, region_ids)
+
+    @property
+    def sums(self):
+        return np.diff(self.sum_prefix, axis=0)
+
+    @property
+    def counts(self):
+        return np.diff(self.count_prefix, axis=0)
+
+    @property
+    def nbytes(self):
+        return self.rows.nbytes + self.sum_prefix.nbytes + self.count_prefix.nbytes
+
+    def day_index(self, date):
+        return date_to_day(date) - self.first_day
+
+    def _bounds(self, start, end):
+        n_days = len(self.dates)
+        first = min(max(self.day_index(start), 0), n_days)
+        last = min(max(self.day_index(end if end is not None else start) + 1, first), n_days)
+        return first, last
+
+    def range_totals(self, start, end=None):
+        """Score totals and observation counts, each regions x models, from start to end (inclusive)"""
+        first, last = self._bounds(start, end)
+        return self.sum_prefix[last] - self.sum_prefix[first], self.count_prefix[last] - self.count_prefix[first]
+
+    def range_mean(self, start, end=None, fill=0.0):
+        """Mean score of every region and model from start to end (inclusive), fill where there is no data"""
+        sums, counts = self.range_totals(start, end)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(counts > 0, sums / counts, fill)
+
+    def id_positions(self, ids):
+        """Position on the region axis of each of ids (e.g. the GeoJSON feature ids), -1 where no region has it"""
+        position = {int(region_id): i for i, region_id in enumerate(self.region_ids) if region_id >= 0} \
+            if self.region_ids is not None else {}
+        return np.array([position.get(int(region_id), -1) for region_id in ids], dtype=np.int64)
+
+    def day_means(self, date, positions=None):
+        """
+        :param date:
+        :param positions: Region axis positions to return, in order, as from id_positions
+        :return:
+        regions x models means on date, NaN where a region has no score (or is missing from positions).
+        """
+        means = self.range_mean(date, fill=np.nan)
+        if positions is None:
+            return means
+        return np.where((positions >= 0)[:, None], means[positions], np.nan)
+
+    def daily_means(self, fill=0.0):
+        """days x regions x models means, fill where a region has no score that day"""
+        sums, counts = self.sums, self.counts
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(counts > 0, sums / counts, fill)
+
+    def moving_average(self, window):
+        """
+        Trailing window-day mean of the daily means (0.0 for days without data), the same values as a
+        pandas rolling mean per region with the first window - 1 days set to 0.0.
+        """
+        means = self.daily_means()
+        daily = np.concatenate([np.zeros((1,) + means.shape[1:]), np.cumsum(means, axis=0)])
+        averages = np.zeros(means.shape)
+        if window <= len(self.dates):
+            averages[window - 1:] = (daily[window:] - daily[:len(daily) - window]) / window
+        return averages
+
+    def to_frame(self, values=None):
+        """
+        :param values: days x regions x models array, defaults to daily_means()
+        :return:
+        Long frame with the columns and row order of aggregate_sentiment_by_region_type_by_date.
+        """
+        values = self.daily_means() if values is None else values
+        full_data = pd.DataFrame({'date': [date for date in self.dates for _ in self.regions],
+                                  'region_name': self.regions * len(self.dates)})
+        for m, column in enumerate(self.score_columns):
+            full_data[column] = values[:, :, m].reshape(-1)
+        return full_data
+
+    def day_frame(self, date):
+        """
+        Regions with rows on date and their mean scores (NaN where all scores were NaN),
+        with the region ids when the cube was built with an id_column.
+        """
+        day = self.day_index(date)
+        in_range = 0 <= day < len(self.dates)
+        present = np.flatnonzero(self.rows[day]) if in_range else np.array([], dtype=np.int64)
+        sums, counts = self.range_totals(date)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.where(counts[present] > 0, sums[present] / counts[present], np.nan)
+        data = {'region_name': [self.regions[i] for i in present]}
+        if self.region_ids is not None:
+            data['id'] = self.region_ids[present]
+        for m, column in enumerate(self.score_columns):
+            data[column] = means[:, m]
+        return pd.DataFrame(data)
+
+
 def aggregate_sentiment_by_date(data,
                                 start,
                                 end):
@@ -109,9 +277,9 @@ def aggregate_sentiment_by_date(data,
     score_by_day = {'{}-score_avg'.format(prediction_version): [] for
                     prediction_version in prediction_types}
     dates = []
-    data['date'] = pd.to_datetime(data.date)
+    days = to_day_numbers(data['date'])
     for date in date_list:
-        date_data = data.loc[data['date'] == date]
+        date_data = data.loc[days == date_to_day(date)]
         dates.append(date)
         for i, (k, prediction_version) in enumerate(score_columns.items()):
             if not date_data.empty:
@@ -129,8 +297,9 @@ def aggregate_sentiment_by_date(data,
 
 def aggregate_all_sentiments_per_day_per_country(df_sent, dates, countries):
     sentiments = []
+    days = to_day_numbers(df_sent['date'])
     for date in dates:
-        date_df = df_sent.loc[df_sent['date'] == date]
+        date_df = df_sent.loc[days == date_to_day(date)]
         for country in countries:
             region_df = date_df.loc[date_df['country'] == country]
             if region_df.empty:
@@ -156,67 +325,542 @@ def aggregate_vol_per_day_per_country(df_count, dates, countries):
 
 
 def aggregate_stats_per_day_per_country(df_stats, countries, col, dates):
-    stats_list = []
-    for date in dates:
-        df_stats['date'] = pd.to_datetime(df_stats.date, format='%Y-%m-%d')
-        dates_df = df_stats.loc[df_stats['date'] == date]
-        for country in countries:
-            country_df = dates_df.loc[dates_df['country'] == country, col]
-            # If no data is found or value is NaN, use 0 as default
-            if country_df.empty or pd.isna(country_df.values[0]):
-                stats_list.append(0.0)
-            else:
-                stats_list.append(country_df.values[0])
-    return stats_list
-
-
-def notable_day_by_sent_label(df, column, label, dates):
-    resulting_day, result_ratio = None, 0
-    column = prediction_columns[column]
-    for day in dates:
-        daily_df = df.loc[df['date'] == day]
-        label_ratio = round(len(daily_df.loc[daily_df[column] == label].index) / len(daily_df), 2)
-        if label_ratio > result_ratio:
-            result_ratio = label_ratio
-            resulting_day = day
-    return resulting_day, result_ratio
-
-
-def notable_month_by_sent_label(df, column, label):
-    df = map_dates_to_months(df)
-
-    resulting_month, result_ratio = None, 0
-    column = prediction_columns[column]
-    for month in months:
-        monthly_df = df.loc[df['date'] == month]
-        label_ratio = round(len(monthly_df.loc[monthly_df[column] == label].index) / len(monthly_df.index), 2)
-        if label_ratio > result_ratio:
-            result_ratio = label_ratio
-            resulting_month = month
-    return resulting_month, result_ratio
-
-
-def notable_days_count(df, dates, countries):
-    highest_vol, highest_day = 0, None
-    for day in dates:
-        daily_df = df.loc[df['date'] == day]
-        total_vol = daily_df.loc[:, countries].sum(axis=1).values[0]
-        if total_vol > highest_vol:
-            highest_vol = total_vol
-            highest_day = day
-    return highest_day, highest_vol
-
-
-def notable_months_count(df, countries):
-    df = map_dates_to_months(df)
-    highest_vol, highest_month = 0, None
-    for month in months:
-        monthly_df = df.loc[df['date'] == month]
-        total_vol = monthly_df.loc[:, countries].sum(axis=1).values[0]
-        if total_vol > highest_vol:
-            highest_vol = total_vol
-            highest_month = month
-    return highest_month, highest_vol
+    # The date column is parsed once, not again for every date
+    days = pd.to_datetime(df_stats['date'], format='%Y-%m-%d')
+    values = pd.Series(df_stats[col].to_numpy(dtype=np.float64),
+                       index=pd.MultiIndex.from_arrays([days, np.asarray(df_stats['country'], dtype=object)]))
+    # First row of every date and country, NaN where there is none
+    values = values[~values.index.duplicated()]
+    stats = values.reindex(pd.MultiIndex.from_product([pd.to_datetime(list(dates)), countries])).to_numpy()
+    # If no data is found or value is NaN, use 0 as default
+    return np.where(np.isnan(stats), 0.0, stats).tolist()
+
+
+sentiment_labels = ['neg', 'neu', 'pos']
+
+
+def _label_codes(values, labels):
+    """Position of every value in labels, -1 for missing or unknown values"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        mapping = pd.Index(labels).get_indexer(values.cat.categories)
+        codes = values.cat.codes.to_numpy()
+        return np.where(codes >= 0, mapping[codes], -1)
+    return pd.Index(labels).get_indexer(np.asarray(values, dtype=object))
+
+
+def count_sentiment_labels(df_sent, start, end, countries=None):
+    """
+    :param df_sent: Per-tweet frame with 'date' (ISO strings or day offsets), the *-predictions columns
+    and, when countries is given, 'country'
+    :param start:
+    :param end:
+    :param countries: Split the counts per country, in this order
+    :return:
+    (labels, tweets): int64 arrays of shape days x regions x models x sentiment_labels and days x regions,
+    where regions is len(countries) or 1. tweets counts every tweet, whatever its labels.
+    """
+    n_days = (pd.Timestamp(end) - pd.Timestamp(start)).days + 1
+    n_regions = len(countries) if countries is not None else 1
+    day = to_day_numbers(df_sent['date']).to_numpy().astype(np.int64) - date_to_day(start)
+    keep = (day >= 0) & (day < n_days)
+    if countries is not None:
+        region = _label_codes(df_sent['country'], countries)
+        keep &= region >= 0
+    else:
+        region = np.zeros(len(day), dtype=np.int64)
+    cell = day * n_regions + region
+    tweets = np.bincount(cell[keep], minlength=n_days * n_regions).reshape(n_days, n_regions)
+    labels = np.zeros((n_days, n_regions, len(prediction_types), len(sentiment_labels)), dtype=np.int64)
+    for m, prediction_type in enumerate(prediction_types):
+        label = _label_codes(df_sent[prediction_columns[prediction_type]], sentiment_labels)
+        valid = keep & (label >= 0)
+        labels[:, :, m] = np.bincount(cell[valid] * len(sentiment_labels) + label[valid],
+                                      minlength=n_days * n_regions * len(sentiment_labels)) \
+            .reshape(n_days, n_regions, len(sentiment_labels))
+    return labels, tweets
+
+
+class LabelCounts:
+    """
+    Tweets per day x country x model x sentiment label of a per-tweet frame such as
+    all_tweet_sentiments.csv, held as cumulative sums along the day axis so the
+    counts of a single day or of any date range are one subtraction.
+    """
+
+    models = prediction_types
+    labels = sentiment_labels
+
+    def __init__(self, counts, start, countries):
+        self.countries = list(countries)
+        self.first_day = date_to_day(start)
+        self.dates = [str(date.date()) for date in pd.date_range(start=start, periods=counts.shape[0])]
+        zero = np.zeros((1,) + counts.shape[1:], dtype=np.int64)
+        self.prefix = np.concatenate([zero, np.cumsum(counts, axis=0, dtype=np.int64)])
+
+    @classmethod
+    def from_frame(cls, df_sent, start, end, countries):
+        """
+        :param df_sent: Per-tweet frame with 'date', 'country' and the *-predictions columns
+        :param start:
+        :param end:
+        :param countries: Country axis, tweets from other countries are left out
+        """
+        labels, _ = count_sentiment_labels(df_sent, start, end, countries)
+        return cls(labels, start, countries)
+
+    @classmethod
+    def from_table(cls, table, start, end, countries):
+        """Inverse of to_frame, for the table stored by build.py"""
+        n_days = (pd.Timestamp(end) - pd.Timestamp(start)).days + 1
+        counts = np.zeros((n_days, len(countries), len(cls.models), len(cls.labels)), dtype=np.int64)
+        day = to_day_numbers(table['date']).to_numpy().astype(np.int64) - date_to_day(start)
+        country = _label_codes(table['country'], countries)
+        keep = (day >= 0) & (day < n_days) & (country >= 0)
+        for m, model in enumerate(cls.models):
+            for i, label in enumerate(cls.labels):
+                counts[day[keep], country[keep], m, i] = table[f'{model}-{label}'].to_numpy()[keep]
+        return cls(counts, start, countries)
+
+    @property
+    def nbytes(self):
+        return self.prefix.nbytes
+
+    def range_counts(self, start, end=None):
+        """countries x models x labels tweet counts from start to end (inclusive), zero outside the table"""
+        n_days = len(self.dates)
+        first = min(max(date_to_day(start) - self.first_day, 0), n_days)
+        last = min(max(date_to_day(end if end is not None else start) - self.first_day + 1, first), n_days)
+        return self.prefix[last] - self.prefix[first]
+
+    def to_frame(self):
+        """One row per day and country with a count column per model and label, e.g. 'vader-neg'"""
+        counts = np.diff(self.prefix, axis=0)
+        table = pd.DataFrame({'date': [date for date in self.dates for _ in self.countries],
+                              'country': self.countries * len(self.dates)})
+        for m, model in enumerate(self.models):
+            for i, label in enumerate(self.labels):
+                table[f'{model}-{label}'] = counts[:, :, m, i].reshape(-1)
+        return table
+
+
+class CovidStatsCube:
+    """
+    Day x country arrays of uk_covid_stats.csv: the new and cumulative cases and deaths
+    as published, and the 7 day moving averages of format_df_ma_stats. A date is an
+    offset into the day axis, so the UK totals of a date are a sum over four countries
+    instead of two string filters over the frame, and a window is a slice.
+    """
+
+    count_columns = ['newCasesByPublishDate', 'cumCasesByPublishDate',
+                     'newDeathsByDeathDate', 'cumDeathsByDeathDate']
+    # Name in the range payload -> column of format_df_ma_stats holding the moving average
+    ma_columns = {'newCasesByPublishDate_7ma': 'newCasesByPublishDate',
+                  'newDeathsByDeathDate_7ma': 'newDeathsByDeathDate'}
+
+    def __init__(self, start, countries, counts, present, moving_averages):
+        self.countries = list(countries)
+        self.first_day = date_to_day(start)
+        self.dates = [str(date.date()) for date in pd.date_range(start=start, periods=counts.shape[0])]
+        self._positions = {date: i for i, date in enumerate(self.dates)}
+        self.counts = counts
+        self.present = present
+        self.moving_averages = moving_averages
+
+    @classmethod
+    def from_frames(cls, df_stats, formatted_stats, countries):
+        """
+        :param df_stats: uk_covid_stats.csv, one row per date and country
+        :param formatted_stats: format_df_ma_stats of df_stats
+        :param countries: Country axis, rows of other countries are left out
+        :return:
+        CovidStatsCube covering every date from the first to the last of df_stats. Rows
+        repeating a date and country are summed, as the old payload did.
+        """
+        day = to_day_numbers(df_stats['date']).to_numpy().astype(np.int64)
+        first_day, n_days = day.min(), day.max() - day.min() + 1
+        country = _label_codes(df_stats['country'], countries)
+        keep = country >= 0
+        cell = (day[keep] - first_day) * len(countries) + country[keep]
+        n_cells = n_days * len(countries)
+
+        counts = np.zeros((n_cells, len(cls.count_columns)), dtype=np.int64)
+        for c, column in enumerate(cls.count_columns):
+            counts[:, c] = np.bincount(cell, weights=df_stats[column].to_numpy(dtype=np.float64)[keep],
+                                       minlength=n_cells)
+        present = np.bincount(cell, minlength=n_cells) > 0
+
+        moving_averages = np.full((n_cells, len(cls.ma_columns)), np.nan)
+        ma_day = to_day_numbers(formatted_stats['date']).to_numpy().astype(np.int64) - first_day
+        ma_country = _label_codes(formatted_stats['country'], countries)
+        ma_keep = (ma_day >= 0) & (ma_day < n_days) & (ma_country >= 0)
+        ma_cell = ma_day[ma_keep] * len(countries) + ma_country[ma_keep]
+        for c, column in enumerate(cls.ma_columns.values()):
+            moving_averages[ma_cell, c] = formatted_stats[column].to_numpy(dtype=np.float64)[ma_keep]
+
+        shape = (n_days, len(countries))
+        return cls(day_to_date(first_day), countries, counts.reshape(shape + (len(cls.count_columns),)),
+                   present.reshape(shape), moving_averages.reshape(shape + (len(cls.ma_columns),)))
+
+    @property
+    def columns(self):
+        return self.count_columns + list(self.ma_columns)
+
+    @property
+    def nbytes(self):
+        return self.counts.nbytes + self.present.nbytes + self.moving_averages.nbytes
+
+    def day_index(self, date):
+        """Offset of date on the day axis, None outside it or when date is not a date"""
+        if date in self._positions:
+            return self._positions[date]
+        try:
+            index = date_to_day(date) - self.first_day
+        except (AttributeError, TypeError, ValueError):
+            # None (NaT) or an unparseable string
+            return None
+        return index if 0 <= index < len(self.dates) else None
+
+    def day_totals(self, date):
+        """Sum over the countries of every count column on date, zero on dates without rows"""
+        index = self.day_index(date)
+        if index is None:
+            return {column: 0 for column in self.count_columns}
+        return dict(zip(self.count_columns, self.counts[index].sum(axis=0).tolist()))
+
+    def range_series(self, start, end, columns=None):
+        """
+        :param start:
+        :param end:
+        :param columns: Columns to return, defaults to all of them
+        :return:
+        (dates, {country: {column: values}}) of every date from start to end (inclusive) the
+        data covers, with None for the counts and NaN for the averages of missing rows.
+        """
+        columns = columns or self.columns
+        first = max(date_to_day(start) - self.first_day, 0)
+        last = min(date_to_day(end) - self.first_day + 1, len(self.dates))
+        if last <= first:
+            return [], {country: {column: [] for column in columns} for country in self.countries}
+        series = {}
+        for c, country in enumerate(self.countries):
+            present = self.present[first:last, c]
+            series[country] = {}
+            for column in columns:
+                if column in self.ma_columns:
+                    values = self.moving_averages[first:last, c, list(self.ma_columns).index(column)]
+                    series[country][column] = values.tolist()
+                else:
+                    values = self.counts[first:last, c, self.count_columns.index(column)].tolist()
+                    series[country][column] = values if present.all() else \
+                        [value if ok else None for value, ok in zip(values, present)]
+        return self.dates[first:last], series
+
+
+def parse_top_hashtags(text):
+    """[hashtag, count] pairs of a top_ten_hashtags cell, the str() of a list of (hashtag, count) tuples"""
+    hashtags = [tuple(x.split(',')) for x in re.findall(r"\((.*?)\)", text)]
+    return [['#' + hashtag.replace("'", ''), int(count)] for hashtag, count in hashtags]
+
+
+class HashtagStore:
+    """
+    The daily top ten hashtags of top_ten_hashtags_per_day.csv, parsed once into
+    integer coded arrays sorted by day: tags[i] (a position in names) was used
+    counts[i] times on day days[i], and rows offsets[d]:offsets[d + 1] are the
+    top ten of day d in rank order. A day's table is a slice, and the top k of a
+    window sums the daily lists with a bincount and picks the k largest with a heap.
+    """
+
+    def __init__(self, names, first_day, offsets, tags, counts, has_row):
+        self.names = list(names)
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        self.first_day = first_day
+        self.offsets = offsets
+        self.tags = tags
+        self.counts = counts
+        self.has_row = has_row
+        self.dates = [str(date.date()) for date in
+                      pd.date_range(start=day_to_date(first_day), periods=len(has_row))]
+
+    @classmethod
+    def from_frame(cls, hashtags_df):
+        """
+        :param hashtags_df: Frame with 'date' and 'top_ten_hashtags' columns, only the first
+        row of a date is used
+        """
+        hashtags_df = hashtags_df.drop_duplicates('date')
+        days = to_day_numbers(hashtags_df['date']).to_numpy().astype(np.int64)
+        if not len(days):
+            return cls([], 0, np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32),
+                       np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool))
+        first_day, n_days = days.min(), days.max() - days.min() + 1
+        names, ids = [], {}
+        daily = [[] for _ in range(n_days)]
+        for day, text in zip(days - first_day, hashtags_df['top_ten_hashtags']):
+            daily[day] = [(ids.setdefault(name, len(ids)), count) for name, count in parse_top_hashtags(text)]
+        names = list(ids)
+        has_row = np.zeros(n_days, dtype=bool)
+        has_row[days - first_day] = True
+        offsets = np.concatenate([[0], np.cumsum([len(pairs) for pairs in daily])]).astype(np.int64)
+        tags = np.array([tag for pairs in daily for tag, _ in pairs], dtype=np.int32)
+        counts = np.array([count for pairs in daily for _, count in pairs], dtype=np.int64)
+        return cls(names, int(first_day), offsets, tags, counts, has_row)
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.tags.nbytes + self.counts.nbytes + self.has_row.nbytes
+
+    def _bounds(self, start, end):
+        """Day positions first:last of start to end (inclusive), clipped to the store"""
+        n_days = len(self.has_row)
+        first = min(max(date_to_day(start) - self.first_day, 0), n_days)
+        last = min(max(date_to_day(end if end is not None else start) - self.first_day + 1, first), n_days)
+        return first, last
+
+    def day_top(self, date):
+        """[hashtag, count] pairs of the top ten hashtags on date, None when the date has no row"""
+        try:
+            day = date_to_day(date) - self.first_day
+        except (AttributeError, TypeError, ValueError):
+            # None (NaT) or an unparseable string
+            return None
+        if not 0 <= day < len(self.has_row) or not self.has_row[day]:
+            return None
+        rows = slice(self.offsets[day], self.offsets[day + 1])
+        return [[self.names[tag], count] for tag, count in zip(self.tags[rows].tolist(), self.counts[rows].tolist())]
+
+    def top_k(self, start, end, k=10):
+        """
+        [hashtag, count] pairs of the k hashtags used most from start to end (inclusive), counting
+        only the days a hashtag made the top ten. Ties go to the hashtag that made a top ten first.
+        """
+        first, last = self._bounds(start, end)
+        rows = slice(self.offsets[first], self.offsets[last])
+        totals = np.bincount(self.tags[rows], weights=self.counts[rows], minlength=len(self.names))
+        best = heapq.nlargest(k, np.flatnonzero(totals).tolist(), key=lambda tag: (totals[tag], -tag))
+        return [[self.names[tag], int(totals[tag])] for tag in best]
+
+    def tag_ids(self, hashtags):
+        """Position in names of each of hashtags, with or without the '#', -1 for hashtags never in a top ten"""
+        return [self.ids.get(hashtag if hashtag.startswith('#') else '#' + hashtag, -1) for hashtag in hashtags]
+
+    def trends(self, hashtags, start, end):
+        """
+        :param hashtags: Hashtags to follow, with or without the '#'
+        :param start:
+        :param end:
+        :return:
+        (dates, [counts per date of each of hashtags]) from start to end (inclusive) within the
+        store, a count being 0 on the days the hashtag was not in the top ten and None on the
+        days without a row.
+        """
+        first, last = self._bounds(start, end)
+        ids = np.array(self.tag_ids(hashtags), dtype=np.int64)
+        rows = slice(self.offsets[first], self.offsets[last])
+        row_days = np.repeat(np.arange(first, last), np.diff(self.offsets[first:last + 1])) - first
+        series = np.zeros((len(ids), last - first), dtype=np.int64)
+        for i, tag in enumerate(ids):
+            matches = self.tags[rows] == tag
+            np.add.at(series[i], row_days[matches], self.counts[rows][matches])
+        missing = ~self.has_row[first:last]
+        return self.dates[first:last], [[None if gap else count for count, gap in zip(values, missing)]
+                                        for values in series.tolist()]
+
+
+class EmojiStore:
+    """
+    Weekly emoji counts of weekly_emojis_with_colours.csv (or covid_emoji_count_separated.csv,
+    without colours) indexed by week number, week w starting 7 * w days after start. The
+    rows of week w are offsets[w]:offsets[w + 1] in file order, so the week of a date is
+    a division and its bars a slice, and the top k of a window of weeks sums the slices.
+    """
+
+    def __init__(self, start, names, colours, offsets, emojis, counts):
+        self.first_day = date_to_day(start)
+        self.names = list(names)
+        self.colours = list(colours)
+        self.offsets = offsets
+        self.emojis = emojis
+        self.counts = counts
+        self.week_starts = [str(date.date()) for date in
+                            pd.date_range(start=start, periods=len(offsets) - 1, freq='7D')]
+
+    @classmethod
+    def from_frame(cls, emoji_df, start):
+        """
+        :param emoji_df: Frame with 'emoji', 'date' (a week start), 'count' and optionally 'colour'
+        :param start: Start of week 0, rows of earlier dates are left out
+        """
+        week = (to_day_numbers(emoji_df['date']).to_numpy().astype(np.int64) - date_to_day(start)) // 7
+        keep = week >= 0
+        codes = {}
+        emojis = np.array([codes.setdefault(emoji, len(codes)) for emoji in emoji_df['emoji']],
+                          dtype=np.int32)[keep]
+        names = list(codes)
+        # One colour per emoji, the first one given
+        colours = [None] * len(names)
+        if 'colour' in emoji_df.columns:
+            for code, colour in zip(emojis.tolist(), np.asarray(emoji_df['colour'], dtype=object)[keep]):
+                colours[code] = colour if colours[code] is None else colours[code]
+        week, counts = week[keep], emoji_df['count'].to_numpy().astype(np.int64)[keep]
+        # Stable, so the rows of a week stay in file order
+        order = np.argsort(week, kind='stable')
+        n_weeks = int(week.max()) + 1 if len(week) else 0
+        offsets = np.searchsorted(week[order], np.arange(n_weeks + 1)).astype(np.int64)
+        return cls(start, names, colours, offsets, emojis[order], counts[order])
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.emojis.nbytes + self.counts.nbytes
+
+    @property
+    def n_weeks(self):
+        return len(self.offsets) - 1
+
+    def week_of(self, date):
+        """Week number of date, dates outside the weeks go to the first or last one"""
+        return min(max((date_to_day(date) - self.first_day) // 7, 0), max(self.n_weeks - 1, 0))
+
+    def week(self, week):
+        """(emojis, counts, colours) of week in file order"""
+        rows = slice(self.offsets[week], self.offsets[week + 1])
+        codes = self.emojis[rows].tolist()
+        return [self.names[code] for code in codes], self.counts[rows].tolist(), [self.colours[code] for code in codes]
+
+    def top_k(self, start, end, k=10):
+        """
+        (emojis, counts, colours) of the k emojis used most in the weeks holding start to end,
+        most used first, ties going to the emoji seen first
+        """
+        first, last = self.week_of(start), self.week_of(end)
+        rows = slice(self.offsets[first], self.offsets[max(last, first) + 1])
+        totals = np.bincount(self.emojis[rows], weights=self.counts[rows], minlength=len(self.names))
+        best = heapq.nlargest(k, np.flatnonzero(totals).tolist(), key=lambda code: (totals[code], -code))
+        return [self.names[code] for code in best], [int(totals[code]) for code in best], \
+            [self.colours[code] for code in best]
+
+
+class RNumberIntervals:
+    """
+    Weekly R number ranges of r_numbers.csv as intervals of day numbers sorted by start.
+    Each row covers the days after its date up to and including the next row's date,
+    the weeks the old loop over week_pairs tested with check_between_dates, so the
+    week of a date is one bisect. The mid-point of every range and its label
+    ('~0.8', or 'N/A' when the range is 0) are computed once.
+    """
+
+    def __init__(self, starts, ends, lower, upper):
+        order = sorted(range(len(starts)), key=lambda i: starts[i])
+        self.starts = [int(starts[i]) for i in order]
+        self.ends = [int(ends[i]) for i in order]
+        self.lower = [float(lower[i]) for i in order]
+        self.upper = [float(upper[i]) for i in order]
+        self.mid = [round((upper + lower) / 2, 2) for lower, upper in zip(self.lower, self.upper)]
+        self.labels = [f"~{mid}" if mid != 0 else 'N/A' for mid in self.mid]
+
+    @classmethod
+    def from_frame(cls, r_numbers, date_format='%d/%m/%Y'):
+        """
+        :param r_numbers: Frame with 'date' (start of the week), 'lower' and 'upper' columns
+        :param date_format: Format of the 'date' column
+        :return:
+        RNumberIntervals of consecutive rows, with the first row of each start date's range
+        """
+        if r_numbers.empty or 'date' not in r_numbers.columns:
+            return cls([], [], [], [])
+        weeks = to_day_numbers(pd.to_datetime(r_numbers['date'], format=date_format)).tolist()
+        first = r_numbers.assign(day=weeks).drop_duplicates('day').set_index('day')
+        starts, ends = weeks[:-1], weeks[1:]
+        return cls(starts, ends, first.loc[starts, 'lower'].to_numpy(dtype=np.float64),
+                   first.loc[starts, 'upper'].to_numpy(dtype=np.float64))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def week_index(self, day):
+        """Position of the interval holding day number day, None outside every interval"""
+        i = bisect_left(self.starts, day) - 1
+        if i >= 0 and day <= self.ends[i]:
+            return i
+        return None
+
+    def label(self, date):
+        """'~<mid-point>' of the R number range of the week holding date, 'N/A' when there is none"""
+        if not self.starts:
+            return 'N/A'
+        i = self.week_index(date_to_day(date))
+        return self.labels[i] if i is not None else 'N/A'
+
+    def range_series(self, start, end):
+        """
+        :param start:
+        :param end:
+        :return:
+        (dates, labels, lower, upper) of every day from start to end (inclusive) within the
+        intervals, with None bounds on the days no interval holds.
+        """
+        if not self.starts:
+            return [], [], [], []
+        first = max(date_to_day(start), self.starts[0] + 1)
+        last = min(date_to_day(end), max(self.ends))
+        if last < first:
+            return [], [], [], []
+        dates = [str(date.date()) for date in pd.date_range(start=day_to_date(first), periods=last - first + 1)]
+        labels, lower, upper = [], [], []
+        for day in range(first, last + 1):
+            i = self.week_index(day)
+            labels.append(self.labels[i] if i is not None else 'N/A')
+            lower.append(self.lower[i] if i is not None else None)
+            upper.append(self.upper[i] if i is not None else None)
+        return dates, labels, lower, upper
+
+
+def month_index(dates):
+    """Position in months of the month of every ISO date"""
+    return np.array([months.index(number_to_month[date[:7]]) for date in dates])
+
+
+def top_k(values, k):
+    """
+    Indexes of the k largest values that are > 0, ties broken by position. This is the
+    order in which the old strictly-greater loops picked their single maximum.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    order = np.argsort(-np.where(np.isnan(values), -np.inf, values), kind='stable')
+    return order[values[order] > 0][:k]
+
+
+def notable_rankings(volume, labels, tweets, dates, k=1):
+    """
+    Single pass over the daily totals of one region.
+
+    :param volume: Tweet volume per date
+    :param labels: dates x models x sentiment_labels label counts
+    :param tweets: Tweets per date, the denominator of the label ratios
+    :param dates: ISO dates of the first axis
+    :param k: Number of days/months to keep per ranking
+    :return:
+    {(kind, period): [(date or month, value) per rank]}, kind being 'volume' or a sentiment label (with the
+    model as a third key element), period 'day' or 'month'. Ratios are rounded to 2 decimals before
+    ranking, as the table shows them. Months are summed over the given dates only.
+    """
+    month_of_day = month_index(dates)
+    month_volume = np.bincount(month_of_day, weights=volume, minlength=len(months))
+    month_tweets = np.bincount(month_of_day, weights=tweets, minlength=len(months))
+    rankings = {
+        ('volume', 'day'): [(dates[i], volume[i]) for i in top_k(volume, k)],
+        ('volume', 'month'): [(months[i], month_volume[i]) for i in top_k(month_volume, k)],
+    }
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for m, prediction_type in enumerate(prediction_types):
+            for l, label in enumerate(sentiment_labels):
+                month_labels = np.bincount(month_of_day, weights=labels[:, m, l], minlength=len(months))
+                for period, names, counts, totals in [('day', dates, labels[:, m, l], tweets),
+                                                      ('month', months, month_labels, month_tweets)]:
+                    ratios = np.array([round(ratio, 2) if not np.isnan(ratio) else np.nan
+                                       for ratio in counts / np.where(totals > 0, totals, np.nan)])
+                    rankings[(label, period, prediction_type)] = [(names[i], ratios[i]) for i in top_k(ratios, k)]
+    return rankings
 
 
 def aggregate_all_cases_over_time(data):
@@ -0,0 +1,182 @@
+"""
+Versioned artifacts precomputed by build.py
+
+An artifact directory holds one snapshot-format .npz file per formatted frame
+(moving averages, sentiment comparison, notable days, scatter), JSON files for
+plain lists such as the event array, and a manifest.json naming every artifact
+together with the fingerprint of each source file it was built from. The API
+reads them instead of running the aggregations when ARTIFACTS_ONLY=1.
+"""
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+from utils.snapshots import BASE_DIR, file_fingerprint, file_hash, read_frame, write_frame
+
+ARTIFACT_VERSION = 1
+ARTIFACTS_DIR = Path(os.environ.get('ARTIFACTS_DIR', BASE_DIR / 'data' / 'artifacts'))
+ARTIFACTS_ONLY = os.environ.get('ARTIFACTS_ONLY', '0') == '1'
+MANIFEST = 'manifest.json'
+
+
+def _relative_name(path):
+    path = Path(path).resolve()
+    try:
+        return str(path.relative_to(BASE_DIR))
+    except ValueError:
+        return str(path)
+
+
+def _sha1(path):
+    return hashlib.sha1(Path(path).read_bytes()).hexdigest()
+
+
+class ArtifactWriter:
+    """
+    Collects artifacts in a temporary directory next to out_dir and swaps it
+    into place on finish(), so a reader never sees a half written build.
+    """
+
+    def __init__(self, out_dir):
+        self.out_dir = Path(out_dir)
+        self.out_dir.parent.mkdir(parents=True, exist_ok=True)
+        self.tmp_dir = Path(tempfile.mkdtemp(dir=self.out_dir.parent, prefix='.' + self.out_dir.name))
+        self.sources = {}
+        self.artifacts = {}
+
+    def add_source(self, path):
+        """Record an input file so the API can tell when the build is out of date"""
+        if path is not None and Path(path).is_file():
+            self.sources[_relative_name(path)] = dict(file_fingerprint(path), sha1=file_hash(path))
+
+    def write_frame(self, name, df):
+        """
+        :param name: Artifact name, e.g. 'covid/formatted_tweet_count'
+        :param df: Frame to store, its index is discarded
+        """
+        path = self.tmp_dir / f'{name}.npz'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_frame(df.reset_index(drop=True), path, {'artifact': name})
+        self.artifacts[name] = {'file': f'{name}.npz', 'kind': 'frame', 'rows': len(df.index),
+                                'sha1': _sha1(path)}
+
+    def write_json(self, name, data):
+        path = self.tmp_dir / f'{name}.json'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(data, f)
+        self.artifacts[name] = {'file': f'{name}.json', 'kind': 'json', 'rows': len(data), 'sha1': _sha1(path)}
+
+    def finish(self):
+        manifest = {
+            'version': ARTIFACT_VERSION,
+            'built_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'pandas': pd.__version__,
+            'sources': self.sources,
+            'artifacts': self.artifacts,
+        }
+        with open(self.tmp_dir / MANIFEST, 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        if self.out_dir.exists():
+            old = Path(tempfile.mkdtemp(dir=self.out_dir.parent, prefix='.' + self.out_dir.name + '.old'))
+            os.replace(self.out_dir, old / self.out_dir.name)
+            os.replace(self.tmp_dir, self.out_dir)
+            shutil.rmtree(old)
+        else:
+            os.replace(self.tmp_dir, self.out_dir)
+        return manifest
+
+    def abort(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+class ArtifactSet:
+    """Read access to a directory written by ArtifactWriter"""
+
+    def __init__(self, path, manifest):
+        self.path = Path(path)
+        self.manifest = manifest
+
+    def __contains__(self, name):
+        return name in self.manifest['artifacts']
+
+    def names(self):
+        return sorted(self.manifest['artifacts'])
+
+    def frame(self, name, default=None):
+        if name not in self:
+            return default
+        return read_frame(self.path / self.manifest['artifacts'][name]['file'])
+
+    def json(self, name, default=None):
+        if name not in self:
+            return default
+        with open(self.path / self.manifest['artifacts'][name]['file']) as f:
+            return json.load(f)
+
+    def topic_frames(self, topic):
+        """All frame artifacts of a topic, keyed by name without the topic prefix"""
+        prefix = f'{topic}/'
+        return {name[len(prefix):]: self.frame(name) for name, entry in self.manifest['artifacts'].items()
+                if name.startswith(prefix) and entry['kind'] == 'frame'}
+
+    def stale_sources(self):
+        """Source files whose size or content changed since the build"""
+        stale = []
+        for name, stored in self.manifest.get('sources', {}).items():
+            path = BASE_DIR / name if not os.path.isabs(name) else Path(name)
+            if not path.exists():
+                stale.append(name)
+                continue
+            current = file_fingerprint(path)
+            if stored['mtime_ns'] == current['mtime_ns'] and stored['size'] == current['size']:
+                continue
+            if stored['size'] != current['size'] or stored['sha1'] != file_hash(path):
+                stale.append(name)
+        return stale
+
+    def describe(self):
+        return {
+            'path': str(self.path),
+            'version': self.manifest.get('version'),
+            'built_at': self.manifest.get('built_at'),
+            'artifacts': len(self.manifest['artifacts']),
+        }
+
+
+def open_artifacts(path=ARTIFACTS_DIR, required=False):
+    """
+    :param path: Directory written by build.py
+    :param required: Raise instead of returning None when nothing usable was found (ARTIFACTS_ONLY)
+    :return:
+    ArtifactSet, or None when the directory has no manifest of this version.
+    """
+    path = Path(path)
+    manifest, problem = None, None
+    try:
+        with open(path / MANIFEST) as f:
+            manifest = json.load(f)
+        if manifest.get('version') != ARTIFACT_VERSION:
+            problem = f"Artifacts in {path} have version {manifest.get('version')}, expected {ARTIFACT_VERSION}"
+            manifest = None
+    except FileNotFoundError:
+        problem = f"No artifact manifest in {path}"
+    except Exception as e:
+        problem = f"Could not read artifact manifest in {path}: {e}"
+    if manifest is None:
+        if required:
+            # Without its prebuilt tables the app would start and then fail on every request
+            raise RuntimeError(f"{problem}. ARTIFACTS_ONLY=1 serves prebuilt artifacts, run python build.py --out {path}")
+        print(f"{problem}, run python build.py")
+        return None
+    artifacts = ArtifactSet(path, manifest)
+    stale = artifacts.stale_sources()
+    if stale:
+        print(f"Artifacts in {path} are older than {', '.join(stale)}, rerun python build.py")
+    return artifacts
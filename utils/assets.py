@@ -0,0 +1,144 @@
+"""
+In-memory index of the static files
+
+Every file under static/ is looked up once at startup: its case-insensitive
+path, size, content hash and, below ASSET_MEMORY_MAX_BYTES, its bytes and their
+br / gzip encodings (the copies build.py wrote when they are up to date,
+compressed in memory otherwise). A request is then a dictionary lookup instead
+of an exists() / iterdir() walk of the path.
+
+Each file is also served under a fingerprinted name, js/main.<hash>.js, with
+Cache-Control: immutable. index.html is rewritten in memory to reference those
+names and carries the map of them in window.ASSET_URLS for the images the
+scripts swap in. The plain names stay available with no-cache and an ETag.
+"""
+import hashlib
+import json
+import mimetypes
+import os
+import re
+from pathlib import Path
+
+from flask import request, send_file
+
+from utils.compression import available_encodings, best_encoding, compress, fresh_copy, suffixes
+
+ASSET_MEMORY_MAX_BYTES = int(os.environ.get('ASSET_MEMORY_MAX_BYTES', 256 * 1024))
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+# Already compressed formats are sent as they are
+_compressed_types = ('image/png', 'image/jpeg', 'image/gif', 'image/webp', 'font/woff2')
+# src="..." and href="..." attributes of index.html pointing at a local file
+_reference = re.compile(r'(src|href)="([^"#?:]+)"')
+
+
+class Asset:
+    """One static file"""
+
+    __slots__ = ('name', 'path', 'size', 'digest', 'mimetype', 'data', 'encoded')
+
+    def __init__(self, name, path=None, data=None, memory_max_bytes=ASSET_MEMORY_MAX_BYTES):
+        self.name = name
+        self.path = path
+        if data is None:
+            data = path.read_bytes()
+        self.size = len(data)
+        self.digest = hashlib.sha1(data).hexdigest()[:12]
+        self.mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        in_memory = self.size <= memory_max_bytes
+        self.data = data if in_memory else None
+        self.encoded = {}
+        if self.mimetype in _compressed_types:
+            return
+        for encoding in available_encodings():
+            copy = fresh_copy(path, encoding) if path is not None else None
+            if copy is not None:
+                self.encoded[encoding] = copy.read_bytes() if in_memory else copy
+            elif in_memory:
+                encoded = compress(data, encoding)
+                # Tiny files do not shrink
+                if len(encoded) < self.size:
+                    self.encoded[encoding] = encoded
+
+    @property
+    def hashed_name(self):
+        stem, dot, suffix = self.name.rpartition('.')
+        return f'{stem}.{self.digest}.{suffix}' if dot else f'{self.name}.{self.digest}'
+
+
+class AssetIndex:
+    """
+    :param directory: Static directory, indexed recursively. The .br / .gz copies are
+    attached to their file instead of being indexed themselves.
+    """
+
+    def __init__(self, directory, memory_max_bytes=ASSET_MEMORY_MAX_BYTES):
+        self.directory = Path(directory)
+        self.memory_max_bytes = memory_max_bytes
+        self._assets = {}
+        self._hashed = {}
+        copy_suffixes = tuple(suffixes.values())
+        for path in sorted(self.directory.rglob('*')) if self.directory.is_dir() else []:
+            if path.is_file() and not path.name.endswith(copy_suffixes):
+                self._add(Asset(path.relative_to(self.directory).as_posix(), path, memory_max_bytes=memory_max_bytes))
+        index = self._assets.get('index.html')
+        if index is not None:
+            self._add(Asset(index.name, data=self._rewrite_index(index.data or index.path.read_bytes()),
+                            memory_max_bytes=memory_max_bytes))
+
+    def _add(self, asset):
+        self._assets[asset.name.lower()] = asset
+        self._hashed[asset.hashed_name.lower()] = asset
+
+    def __len__(self):
+        return len(self._assets)
+
+    @property
+    def nbytes(self):
+        """Bytes held in memory"""
+        return sum(len(asset.data or b'') + sum(len(data) for data in asset.encoded.values()
+                                                if isinstance(data, bytes))
+                   for asset in self._assets.values())
+
+    def url(self, name):
+        """Fingerprinted path of a static file, name itself when it is not indexed"""
+        asset = self._assets.get(name.lower())
+        return asset.hashed_name if asset is not None else name
+
+    def urls(self):
+        """Fingerprinted path of every static file except index.html, by plain path"""
+        return {asset.name: asset.hashed_name for key, asset in self._assets.items() if key != 'index.html'}
+
+    def _rewrite_index(self, html):
+        """index.html with its local references fingerprinted and the map of the others in window.ASSET_URLS"""
+        html = html.decode('utf-8')
+        html = _reference.sub(lambda match: f'{match.group(1)}="{self.url(match.group(2))}"', html)
+        script = f'<script>window.ASSET_URLS = {json.dumps(self.urls())};</script>\n'
+        return html.replace('</head>', script + '</head>', 1).encode('utf-8')
+
+    def lookup(self, path):
+        """(asset, immutable) of a request path, fingerprinted names are immutable; (None, False) if unknown"""
+        key = path.lower()
+        asset = self._hashed.get(key)
+        if asset is not None and key != asset.name.lower():
+            return asset, True
+        return self._assets.get(key), False
+
+    def response(self, app, path):
+        """Response serving path from the index, None when there is no such file"""
+        asset, immutable = self.lookup(path)
+        if asset is None:
+            return None
+        encoding = best_encoding(list(asset.encoded))
+        body = asset.encoded[encoding] if encoding is not None else asset.data
+        if body is None or isinstance(body, Path):
+            response = send_file(body or asset.path, mimetype=asset.mimetype, conditional=False, etag=False)
+        else:
+            response = app.response_class(body, mimetype=asset.mimetype)
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        # Each encoding is a different representation and gets its own strong ETag
+        response.set_etag(asset.digest if encoding is None else f'{asset.digest}-{encoding}')
+        response.headers['Cache-Control'] = IMMUTABLE if immutable else 'no-cache'
+        return response.make_conditional(request)
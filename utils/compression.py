@@ -0,0 +1,100 @@
+"""
+Compressed responses
+
+The response cache compresses every stored body once per encoding (br and
+gzip) and sends the one the request's Accept-Encoding prefers. Flask-Compress
+covers the responses that are not cached, and build.py writes .br and .gz
+copies of the static files next to them, which the asset index (utils/assets.py)
+serves in place of the file when they are up to date.
+"""
+import gzip
+import os
+from pathlib import Path
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from flask_compress import Compress
+except ImportError:
+    Compress = None
+
+# Cached responses are compressed on the request that stores them, quality 5 keeps that to a few ms
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 5))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', 6))
+
+# File suffix of each encoding, in order of preference
+suffixes = {'br': '.br', 'gzip': '.gz'}
+static_extensions = ('.html', '.js', '.css', '.json', '.svg', '.ico', '.png')
+
+
+def available_encodings():
+    return [encoding for encoding in suffixes if encoding != 'br' or brotli is not None]
+
+
+def compress(body, encoding, static=False):
+    """body compressed with encoding, at the highest quality when static (done once at build time)"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=11 if static else BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=9 if static else GZIP_LEVEL)
+    raise ValueError(f'Unknown encoding {encoding}')
+
+
+def best_encoding(encodings):
+    """The encoding of encodings the request accepts with the highest quality, None for identity"""
+    return request.accept_encodings.best_match(encodings) if encodings else None
+
+
+def install_compression(app):
+    """
+    Flask-Compress for the responses the response cache does not store. Call it before
+    install_response_cache: after_request functions run in reverse order, so the cache then
+    sees the uncompressed body first and Flask-Compress skips the encoded responses it sends.
+    """
+    if Compress is None:
+        print("Flask-Compress is not installed, uncached responses are sent uncompressed")
+        return None
+    app.config.setdefault('COMPRESS_ALGORITHM', available_encodings())
+    return Compress(app)
+
+
+def fresh_copy(path, encoding):
+    """The .br / .gz copy build.py wrote of path, None when there is none or it is older than path"""
+    copy = path.with_name(path.name + suffixes[encoding])
+    try:
+        return copy if copy.stat().st_mtime >= path.stat().st_mtime else None
+    except OSError:
+        return None
+
+
+def precompress_static(directory, min_saving=0.05):
+    """
+    :param directory: Static directory, searched recursively
+    :param min_saving: Copies saving less than this fraction of the file are not kept (PNGs usually)
+    :return:
+    {relative path: {'bytes': size, encoding: compressed size or None when not kept}}
+    """
+    directory = Path(directory)
+    report = {}
+    for path in sorted(directory.rglob('*')):
+        if not path.is_file() or path.suffix.lower() not in static_extensions:
+            continue
+        body = path.read_bytes()
+        sizes = {'bytes': len(body)}
+        # gzip first: a file it cannot shrink (an already compressed PNG) is not worth brotli's time either
+        for encoding in sorted(available_encodings(), key=lambda encoding: encoding != 'gzip'):
+            copy = path.with_name(path.name + suffixes[encoding])
+            compressed = compress(body, encoding, static=True) if sizes.get('gzip', True) else body
+            if len(compressed) <= len(body) * (1 - min_saving):
+                copy.write_bytes(compressed)
+                sizes[encoding] = len(compressed)
+            else:
+                copy.unlink(missing_ok=True)
+                sizes[encoding] = None
+        report[str(path.relative_to(directory))] = sizes
+    return report
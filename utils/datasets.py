@@ -0,0 +1,51 @@
+"""
+Registry of per-topic datasets that are only loaded when first requested
+"""
+import threading
+
+
+class TopicRegistry:
+    """
+    Maps a topic ('covid', 'lockdown') to the dict of frames returned by
+    loader(topic). Each topic is loaded at most once per process, by the first
+    request that asks for it; concurrent first requests wait on a per-topic
+    lock instead of loading the same data twice.
+    """
+
+    def __init__(self, loader, topics):
+        self._loader = loader
+        self._topics = tuple(topics)
+        self._locks = {topic: threading.Lock() for topic in self._topics}
+        self._datasets = {}
+
+    @property
+    def topics(self):
+        return self._topics
+
+    def get(self, topic):
+        datasets = self._datasets.get(topic)
+        if datasets is not None:
+            return datasets
+        if topic not in self._locks:
+            raise KeyError(topic)
+        with self._locks[topic]:
+            # Another thread may have finished loading while we waited
+            datasets = self._datasets.get(topic)
+            if datasets is None:
+                print(f"Loading datasets for topic '{topic}'...")
+                datasets = self._loader(topic)
+                self._datasets[topic] = datasets
+        return datasets
+
+    __getitem__ = get
+
+    def is_loaded(self, topic):
+        return topic in self._datasets
+
+    def loaded_topics(self):
+        return [topic for topic in self._topics if topic in self._datasets]
+
+    def preload(self, topics=None):
+        """Load topics eagerly, e.g. from a PRELOAD_TOPICS setting"""
+        for topic in topics or self._topics:
+            self.get(topic)
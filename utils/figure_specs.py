@@ -0,0 +1,345 @@
+"""
+Plain dict figure specs of the hot endpoints
+
+plot_covid_stats, plot_sentiment and the other builders in utils/plotting.py go
+through make_subplots, go.Scatter and plotly express, which validate and copy
+every property of every trace, although the API only sends the result on to
+Plotly.js as JSON. The builders here return the same {'data': ..., 'layout': ...}
+as figure_dict(plot_...(...)) as plain dicts, from arrays split per country once
+(SeriesTable) so that a date range is a mask instead of a frame filter. The
+2x2 subplot figures keep their layout and trace attributes in a FigureTemplate
+built at startup, and a request only adds its sliced arrays.
+`python benchmark.py figure-specs` checks them against the plotly figures.
+"""
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.io as pio
+
+from utils.plotting import case_str, death_str
+
+# Plotly express draws lines with WebGL when its frame has more rows than this
+_webgl_rows = 1000
+sentiment_labels = ['neg', 'neu', 'pos']
+sent_comp_names = {'nn-score_avg': 'lstm', 'textblob-score_avg': 'textblob',
+                   'vader-score_avg': 'vader', 'native-score_avg': 'naive'}
+subplot_titles = ('England', 'Scotland', 'NI', 'Wales')
+stats_columns = [case_str, death_str]
+
+
+class SeriesTable:
+    """
+    Columns of a frame with a 'date' column as arrays, split by a key column (one series
+    per country of a long frame) or kept whole (a wide frame, key=None). Rows keep the
+    frame's order, as the plotly figures do.
+    """
+
+    def __init__(self, df, columns, key=None):
+        self.columns = list(columns)
+        if key is None:
+            groups = [(None, np.arange(len(df)))]
+        else:
+            key_values = df[key].to_numpy()
+            groups = [(value, np.flatnonzero(key_values == value)) for value in pd.unique(key_values)]
+        dates = df['date'].astype(str).to_numpy()
+        self._series = {value: dict({'date': dates[rows]}, **{column: df[column].to_numpy()[rows]
+                                                              for column in self.columns})
+                        for value, rows in groups}
+        self.keys = [value for value, _ in groups]
+        # Series whose dates run one way (all of the formatted frames) are sliced by binary search
+        self._order = {value: _date_order(series['date']) for value, series in self._series.items()}
+
+    @property
+    def nbytes(self):
+        return sum(values.nbytes for series in self._series.values() for values in series.values())
+
+    def between(self, start, end, key=None):
+        """Columns of one series from start to end (inclusive ISO dates), empty for an unknown key"""
+        series = self._series.get(key)
+        if series is None:
+            return dict({'date': np.array([], dtype=object)}, **{column: np.array([]) for column in self.columns})
+        dates, order = series['date'], self._order[key]
+        if order == 1:
+            rows = slice(np.searchsorted(dates, start, 'left'), np.searchsorted(dates, end, 'right'))
+        elif order == -1:
+            # Newest first, search the reversed view and map the bounds back
+            rows = slice(len(dates) - np.searchsorted(dates[::-1], end, 'right'),
+                         len(dates) - np.searchsorted(dates[::-1], start, 'left'))
+        else:
+            rows = (dates >= start) & (dates <= end)
+        return {name: values[rows] for name, values in series.items()}
+
+
+def _date_order(dates):
+    """1 for ascending, -1 for descending, 0 for unordered dates"""
+    if (dates[:-1] <= dates[1:]).all():
+        return 1
+    if (dates[:-1] >= dates[1:]).all():
+        return -1
+    return 0
+
+
+@lru_cache(maxsize=None)
+def _template():
+    """The default template as a dict, shared by every spec instead of copied"""
+    return pio.templates[pio.templates.default].to_plotly_json()
+
+
+def _colour(i):
+    colorway = _template()['layout']['colorway']
+    return colorway[i % len(colorway)]
+
+
+def _axis_name(axis, number):
+    return axis if number == 1 else f'{axis}{number}'
+
+
+def _secondary_y_grid(horizontal_spacing, vertical_spacing, rows=2, cols=2):
+    """
+    :return:
+    Layout of make_subplots(rows, cols, secondary_y in every cell, subplot_titles) and the
+    (xaxis, yaxis, secondary yaxis) trace references of each cell, row by row from the top.
+    """
+    # make_subplots leaves room on the right for the secondary y axis titles
+    width = (0.94 - horizontal_spacing * (cols - 1)) / cols
+    height = (1.0 - vertical_spacing * (rows - 1)) / rows
+    layout, cells, annotations = {}, [], []
+    for r in range(rows):
+        for c in range(cols):
+            x_start = width * c + c * horizontal_spacing
+            y_start = height * (rows - 1 - r) + (rows - 1 - r) * vertical_spacing
+            x_domain, y_domain = [x_start, x_start + width], [y_start, y_start + height]
+            n = r * cols + c + 1
+            x, y, y2 = _axis_name('x', n), _axis_name('y', 2 * n - 1), _axis_name('y', 2 * n)
+            layout[_axis_name('xaxis', n)] = {'anchor': y, 'domain': x_domain}
+            layout[_axis_name('yaxis', 2 * n - 1)] = {'anchor': x, 'domain': y_domain}
+            layout[_axis_name('yaxis', 2 * n)] = {'anchor': x, 'overlaying': y, 'side': 'right'}
+            annotations.append({'font': {'size': 16}, 'showarrow': False, 'text': subplot_titles[n - 1],
+                                'x': sum(x_domain) / 2.0, 'xanchor': 'center', 'xref': 'paper',
+                                'y': y_domain[1], 'yanchor': 'bottom', 'yref': 'paper'})
+            cells.append((x, y, y2))
+    layout['annotations'] = annotations
+    return layout, cells
+
+
+def _grid_layout(layout, x_title, y_title, y2_title):
+    """Sets the axis titles of a _secondary_y_grid layout the way update_xaxes / update_yaxes do"""
+    for name, axis in layout.items():
+        if name.startswith('xaxis'):
+            axis.update(title={'text': x_title}, showgrid=False)
+        elif name.startswith('yaxis'):
+            axis.update(title={'text': y2_title if 'overlaying' in axis else y_title}, showgrid=False)
+    layout['template'] = _template()
+    return layout
+
+
+def _scatter(name, events, xaxis, yaxis):
+    return {'name': name, 'text': events, 'textposition': 'bottom center', 'type': 'scatter',
+            'xaxis': xaxis, 'yaxis': yaxis}
+
+
+class FigureTemplate:
+    """
+    Layout and constant trace attributes (names, event text, axes) of a subplot figure,
+    built once. A request's figure only adds its x / y arrays to copies of the traces.
+    """
+
+    def __init__(self, countries, traces, layout):
+        self.countries = list(countries)
+        self.traces = traces
+        self.layout = layout
+
+    def fill(self, arrays):
+        """
+        :param arrays: (x, y) of each trace, in trace order
+        :return:
+        The figure spec. Its layout is a shallow copy, the nested axis dicts are shared and must not be modified.
+        """
+        return {'data': [dict(trace, x=x, y=y) for trace, (x, y) in zip(self.traces, arrays)],
+                'layout': dict(self.layout)}
+
+
+def _express_layout(x_title, y_title, legend_title, **layout):
+    """Layout plotly express gives a single subplot figure, before update_layout"""
+    return dict({'template': _template(),
+                 'xaxis': {'anchor': 'y', 'domain': [0.0, 1.0], 'title': {'text': x_title}},
+                 'yaxis': {'anchor': 'x', 'domain': [0.0, 1.0], 'title': {'text': y_title}},
+                 'legend': {'title': {'text': legend_title}, 'tracegroupgap': 0},
+                 'margin': {'t': 60}}, **layout)
+
+
+def _express_lines(series, colour_title, x_title, y_title):
+    """
+    :param series: (name, x, y) of each line, in legend order
+    :return:
+    Traces of px.line with one colour per name, on WebGL above _webgl_rows points as px does.
+    """
+    webgl = sum(len(x) for _, x, _ in series) > _webgl_rows
+    traces = []
+    for i, (name, x, y) in enumerate(series):
+        trace = {'hovertemplate': f'{colour_title}={name}<br>{x_title}=%{{x}}<br>{y_title}=%{{y}}<extra></extra>',
+                 'legendgroup': name, 'line': {'color': _colour(i), 'dash': 'solid'},
+                 'marker': {'symbol': 'circle'}, 'mode': 'lines', 'name': name, 'showlegend': True,
+                 'x': x, 'xaxis': 'x', 'y': y, 'yaxis': 'y', 'type': 'scattergl' if webgl else 'scatter'}
+        if not webgl:
+            trace['orientation'] = 'v'
+        traces.append(trace)
+    return traces
+
+
+def _line_chart_layout(legend_title, y_range):
+    """The update_layout / update_axes of plot_sentiment and plot_sentiment_comp"""
+    layout = _express_layout('Date', 'Sentiment(7MA)', legend_title, height=700, autosize=True)
+    layout['legend'].update(orientation='h', yanchor='bottom', y=1.05, xanchor='right', x=1, itemsizing='constant')
+    layout['margin'].update(t=80, l=20, r=20, b=20)
+    layout['xaxis']['showgrid'] = False
+    layout['yaxis'].update(showgrid=False, range=y_range)
+    return layout
+
+
+def covid_stats_template(countries, events):
+    """
+    :param countries: Countries in subplot order
+    :param events: Event text of every date, as given to plot_covid_stats
+    :return:
+    FigureTemplate of plot_covid_stats, a cases and a deaths trace per country.
+    """
+    layout, cells = _secondary_y_grid(horizontal_spacing=0.3, vertical_spacing=0.25)
+    traces = []
+    for country, (x, y, y2) in zip(countries, cells):
+        traces.append(_scatter(f'{country} 7 Day MA: Covid Cases', events, x, y))
+        traces.append(_scatter(f'{country} 7 Day MA: Covid Deaths', events, x, y2))
+    layout.update(legend={'orientation': 'h', 'yanchor': 'bottom', 'y': 1.1, 'xanchor': 'right', 'x': 1},
+                  height=750, autosize=True)
+    return FigureTemplate(countries, traces, _grid_layout(layout, 'Date', 'Covid Cases', 'Covid Deaths'))
+
+
+def covid_stats_spec(stats, template, start, end):
+    """
+    :param stats: SeriesTable of the formatted COVID stats by country, with the case and death columns
+    :param template: covid_stats_template(countries, events)
+    :return:
+    Spec of plot_covid_stats(data, countries, events, start, end).
+    """
+    arrays = []
+    for country in template.countries:
+        series = stats.between(start, end, country)
+        arrays += [(series['date'], series[case_str]), (series['date'], series[death_str])]
+    return template.fill(arrays)
+
+
+def sent_vs_vol_template(countries, events):
+    """FigureTemplate of plot_dropdown_sent_vs_vol, a sentiment and a tweet volume trace per country"""
+    layout, cells = _secondary_y_grid(horizontal_spacing=0.2, vertical_spacing=0.25)
+    traces = []
+    for country, (x, y, y2) in zip(countries, cells):
+        traces.append(_scatter(f'{country} 7 Day MA: Sentiment', events, x, y))
+        traces.append(_scatter(f'{country} 7 Day MA: Number of Tweets', events, x, y2))
+        layout['yaxis' + y[1:]]['range'] = [-0.4, 0.5]
+    layout.update(legend={'orientation': 'h', 'yanchor': 'bottom', 'y': 1.05, 'xanchor': 'right', 'x': 1,
+                          'itemsizing': 'constant'},
+                  height=750, autosize=True, margin={'l': 20, 'r': 20, 't': 80, 'b': 20})
+    return FigureTemplate(countries, traces, _grid_layout(layout, 'Date', 'Sentiment(7MA)', 'Tweet Volume'))
+
+
+def sent_vs_vol_spec(sent, counts, sentiment_col, template, start, end):
+    """
+    :param sent: SeriesTable of the formatted tweet sentiment by country
+    :param counts: SeriesTable of the formatted (wide) tweet counts, one column per country
+    :param template: sent_vs_vol_template(countries, events)
+    :return:
+    Spec of plot_dropdown_sent_vs_vol(df_sent, df_vol, sentiment_col, events, countries, start, end).
+    """
+    volume = counts.between(start, end)
+    arrays = []
+    for country in template.countries:
+        series = sent.between(start, end, country)
+        arrays += [(series['date'], series[sentiment_col]), (volume['date'], volume[country])]
+    return template.fill(arrays)
+
+
+def sentiment_spec(sent, sentiment_col, start, end):
+    """Spec of plot_sentiment(df_sent, sentiment_col, start, end), sent being its SeriesTable by country"""
+    lines = []
+    for country in sent.keys:
+        series = sent.between(start, end, country)
+        if len(series['date']):
+            lines.append((country, series['date'], series[sentiment_col]))
+    y_range = [-0.4, 0.5] if sentiment_col != 'native-score_avg' else [-0.4, 0.6]
+    return {'data': _express_lines(lines, 'Country', 'date', sentiment_col),
+            'layout': _line_chart_layout('Country', y_range)}
+
+
+def sentiment_comp_spec(comp, start, end):
+    """Spec of plot_sentiment_comp(df_sent, start, end), comp being the SeriesTable of its score columns"""
+    series = comp.between(start, end)
+    lines = [(name, series['date'], series[column]) for column, name in sent_comp_names.items()] \
+        if len(series['date']) else []
+    return {'data': _express_lines(lines, 'sentiment_type', 'date', 'sentiment_score'),
+            'layout': _line_chart_layout('sentiment_type', [-0.4, 0.5])}
+
+
+def sentiment_counts_bar_spec(counts, countries):
+    """Spec of plot_sentiment_counts_bar(counts, countries)"""
+    traces = [{'alignmentgroup': 'True',
+               'hovertemplate': f'sentiment={label}<br>country=%{{x}}<br>count=%{{y}}<extra></extra>',
+               'legendgroup': label, 'marker': {'color': _colour(i), 'pattern': {'shape': ''}},
+               'name': label, 'offsetgroup': label, 'orientation': 'v', 'showlegend': True,
+               'textposition': 'auto', 'x': list(countries), 'xaxis': 'x',
+               'y': [int(count) for count in counts[i]], 'yaxis': 'y', 'type': 'bar'}
+              for i, label in enumerate(sentiment_labels)]
+    return {'data': traces,
+            'layout': _express_layout('country', 'count', 'sentiment', barmode='group', autosize=True)}
+
+
+def hashtag_table_spec(hashtags):
+    """Spec of plot_hashtag_table of the [hashtag, count] pairs hashtags"""
+    trace = {'cells': {'align': 'left', 'height': 40,
+                       'values': [[hashtag for hashtag, _ in hashtags], [count for _, count in hashtags]]},
+             'columnwidth': [300, 80],
+             'header': {'align': 'left', 'fill': {'color': 'paleturquoise'},
+                        'values': ['<b>Hashtag<b>', '<b>Count<b>']},
+             'type': 'table'}
+    return {'data': [trace],
+            'layout': {'template': _template(), 'margin': {'b': 5, 't': 20, 'l': 5, 'r': 5},
+                       'autosize': True, 'height': 500}}
+
+
+def emoji_bar_spec(emojis, counts, colours, title):
+    """Spec of plot_emoji_bar_chart for the emojis of one week (or window), titled title"""
+    trace = {'cliponaxis': False, 'hoverinfo': 'none', 'marker': {'color': list(colours)}, 'orientation': 'v',
+             'textposition': 'outside', 'texttemplate': '%{x}<br>%{y}', 'x': list(emojis),
+             'y': [int(count) for count in counts], 'type': 'bar'}
+    layout = {'template': _template(), 'bargap': 0.1, 'font': {'size': 14}, 'plot_bgcolor': '#FFFFFF',
+              'title': {'text': title},
+              'xaxis': {'showline': False, 'visible': False, 'categoryorder': 'total descending'},
+              'yaxis': {'showline': False, 'visible': False},
+              'margin': {'l': 10, 'r': 10, 'b': 50, 't': 100, 'pad': 4}, 'barmode': 'stack'}
+    return {'data': [trace], 'layout': layout}
+
+
+def county_choropleth_spec(geojson, ids, names, values, date, score):
+    """
+    :param ids: GeoJSON feature ids of the counties with a value on date
+    :param names: Hover names of those counties
+    :param values: Their scores
+    :param score: Name of the score column, shown in the hover text and colour bar
+    :return:
+    Spec of the px.choropleth_mapbox figure of /api/county_choropleth for one date.
+    """
+    scale = px.colors.diverging.Temps_r
+    trace = {'coloraxis': 'coloraxis', 'featureidkey': 'properties.id', 'geojson': geojson,
+             'hovertemplate': f'<b>%{{hovertext}}</b><br><br>date={date}<br>id=%{{location}}<br>'
+                              f'{score}=%{{z}}<extra></extra>',
+             'hovertext': names, 'locations': ids, 'name': '', 'subplot': 'mapbox', 'z': values,
+             'type': 'choroplethmapbox'}
+    layout = {'template': _template(),
+              'mapbox': {'domain': {'x': [0.0, 1.0], 'y': [0.0, 1.0]}, 'center': {'lat': 55, 'lon': 0},
+                         'zoom': 3.5, 'style': 'white-bg'},
+              'coloraxis': {'colorbar': {'title': {'text': score}},
+                            'colorscale': [[i / (len(scale) - 1), colour] for i, colour in enumerate(scale)],
+                            'cmin': -1, 'cmax': 1},
+              'legend': {'tracegroupgap': 0}, 'margin': {'t': 60}, 'autosize': True, 'height': 900}
+    return {'data': [trace], 'layout': layout}
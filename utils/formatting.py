@@ -1,11 +1,11 @@
 from functools import reduce
+import numpy as np
 import pandas as pd
 import datetime
-from sklearn.preprocessing import StandardScaler
-from utils.aggregations import aggregate_sentiment_by_region_type_by_date
+from utils.aggregations import SentimentCube
 from utils.aggregations import aggregate_all_sentiments_per_day_per_country, aggregate_vol_per_day_per_country, \
-    aggregate_stats_per_day_per_country, notable_month_by_sent_label, notable_months_count, notable_days_count, \
-    notable_day_by_sent_label, aggregate_sentiment_by_date
+    aggregate_stats_per_day_per_country, aggregate_sentiment_by_date, count_sentiment_labels, notable_rankings
+from utils.schema import to_day_numbers, date_to_day
 
 start_global = '2020-03-20'
 end_global = '2021-03-25'
@@ -37,6 +37,8 @@ def create_event_array(df_events, start, end):
 
 
 def format_df_corr(df_sent, df_count, df_stats, dates_list):
+    # Only the offline build needs scikit-learn, the API never imports it
+    from sklearn.preprocessing import StandardScaler
     countries = ['England', 'Scotland', 'Northern Ireland', 'Wales']
     sentiments_per_day_per_country = aggregate_all_sentiments_per_day_per_country(df_sent, dates_list,
                                                                                   countries)
@@ -55,7 +57,7 @@ def format_df_corr(df_sent, df_count, df_stats, dates_list):
     for country in countries:
         df.loc[df['country'] == country, ['volume', 'cases', 'deaths']] = scaler.fit_transform(
             df.loc[df['country'] == country, ['volume', 'cases', 'deaths']])
-    sentiments_per_day_per_country.reset_index(inplace=True)
+    sentiments_per_day_per_country = sentiments_per_day_per_country.reset_index()
     res_df = pd.concat([df, sentiments_per_day_per_country], axis=1)
     return res_df
 
@@ -124,42 +126,32 @@ def format_df_ma_tweet_vol(data, region_list):
 
 
 def format_df_ma_sent(df):
-    # Get data and make a copy
-    df = aggregate_sentiment_by_region_type_by_date(df, countries, 'country', start_global,
-                                                   end_global).copy()
-    
-    # First, ensure all avg_cols are float64 type across entire dataframe
-    for col in avg_cols:
-        df[col] = df[col].astype('float64')
-    
-    # Process each region
-    for region in df['region_name'].unique():
-        # Create mask for the region
-        region_mask = df['region_name'] == region
-        
-        # Determine window size based on dataframe length
-        window_size = MA_win if len(df) >= 7 else len(df)
-        
-        # For each sentiment column
-        for col in avg_cols:
-            # Extract the values for this region and column
-            region_values = df.loc[region_mask, col]
-            
-            # Calculate rolling mean
-            rolling_values = region_values.rolling(window=window_size).mean()
-            
-            # Replace NaN with 0 and assign back
-            df.loc[region_mask, col] = rolling_values.fillna(0)
-    
-    return df
+    """
+    :param df: Long format sentiment frame (the geo CSV), or a per-country SentimentCube of it
+    :return:
+    7 day moving average of every model's daily per-country mean, in the layout of
+    aggregate_sentiment_by_region_type_by_date.
+    """
+    cube = df if isinstance(df, SentimentCube) else \
+        SentimentCube.from_frame(df, 'country', start_global, end_global, countries)
+    # Rolling windows run per region, but the window size follows the original frame length
+    n_rows = len(cube.dates) * len(cube.regions)
+    window_size = MA_win if n_rows >= 7 else n_rows
+    return cube.to_frame(cube.moving_average(window_size))
 
 
 def format_df_ma_sent_comp(df):
     # Get the aggregated data
     df = aggregate_sentiment_by_date(df, start_global, end_global)
-    
+    return format_df_ma_daily_sent(df)
+
+
+def format_df_ma_daily_sent(df):
+    # Takes the output of aggregate_sentiment_by_date (or TweetStore.daily_score_means)
     # Determine window size based on dataframe length
     window_size = MA_win if len(df) >= 7 else len(df)
+    # The input may be a shared frame, the averages go into a copy
+    df = df.copy()
     
     # Ensure all avg_cols are float64 type
     for col in avg_cols:
@@ -205,29 +197,51 @@ def separate_top_10_emojis(df):
     return (df)
 
 
-def format_df_notable_days(df_sent, df_count):
-    indexes = ['Highest Tweet Volume Day', 'Highest Tweet Volume Month', 'Highest Positive Sentiment Ratio Day',
-               'Highest Positive Sentiment Ratio Month',
-               'Highest Negative Sentiment Ratio Day',
-               'Highest Negative Sentiment Ratio Month']
-    result_df_list = []
-    for sentiment in prediction_types:
-        columns = {'date': [], 'rate': [], 'sentiment_type': []}
-        max_day, day_count = notable_days_count(df_count, str_dates_list, countries)
-        max_month, month_count = notable_months_count(df_count, countries)
-        pos_day, day_pos_rate = notable_day_by_sent_label(df_sent, sentiment, 'pos', str_dates_list)
-        pos_month, month_pos_rate = notable_month_by_sent_label(df_sent, sentiment, 'pos')
-        neg_day, day_neg_rate = notable_day_by_sent_label(df_sent, sentiment, 'neg', str_dates_list)
-        neg_month, month_neg_rate = notable_month_by_sent_label(df_sent, sentiment, 'neg')
-
-        columns['sentiment_type'].append(sentiment)
-        columns['date'] += [max_day, max_month, pos_day, pos_month, neg_day, neg_month]
-        columns['rate'] += [day_count, month_count, day_pos_rate, month_pos_rate, day_neg_rate, month_neg_rate]
-        data = pd.DataFrame(columns, index=indexes)
-        result_df_list.append(data)
-
-    df = pd.concat(result_df_list, axis=0)
-    df.index.name = 'notable_label'
-
-    return df
-
+notable_label_names = {'pos': 'Positive', 'neg': 'Negative', 'neu': 'Neutral'}
+
+
+def daily_volume_per_country(df_count, region_list):
+    """dates x regions tweet volumes of daily_tweet_count_country.csv over str_dates_list, 0 for missing dates"""
+    days = to_day_numbers(df_count['date']).to_numpy().astype(np.int64) - date_to_day(start_global)
+    volume = np.zeros((len(str_dates_list), len(region_list)))
+    keep = (days >= 0) & (days < len(str_dates_list))
+    for r, region in enumerate(region_list):
+        np.add.at(volume[:, r], days[keep], df_count[region].to_numpy(dtype=np.float64)[keep])
+    return volume
+
+
+def format_df_notable_days(df_sent, df_count, k=1, labels=('pos', 'neg'), by_country=False):
+    """
+    :param df_sent: Per-tweet frame with 'date', 'country' and the *-predictions columns
+    :param df_count: Daily tweet volume per country
+    :param k: Number of days/months listed under each notable label, numbered by the 'rank' column
+    :param labels: Sentiment labels ('pos', 'neg', 'neu') to rank days and months by
+    :param by_country: Rank every country separately and add a 'country' column
+    :return:
+    DataFrame with the columns notable_label, date, rate, sentiment_type and rank (and country), one block
+    of rows per model. Month volumes are the totals of the month's days.
+    """
+    label_counts, tweets = count_sentiment_labels(df_sent, start_global, end_global,
+                                                  countries if by_country else None)
+    volume = daily_volume_per_country(df_count, countries)
+    regions = countries if by_country else [None]
+    rows = []
+    for r, country in enumerate(regions):
+        rankings = notable_rankings(volume[:, r] if by_country else volume.sum(axis=1),
+                                    label_counts[:, r], tweets[:, r], str_dates_list, k)
+        for sentiment in prediction_types:
+            entries = [('Highest Tweet Volume Day', rankings[('volume', 'day')]),
+                       ('Highest Tweet Volume Month', rankings[('volume', 'month')])]
+            for label in labels:
+                name = notable_label_names[label]
+                entries += [(f'Highest {name} Sentiment Ratio Day', rankings[(label, 'day', sentiment)]),
+                            (f'Highest {name} Sentiment Ratio Month', rankings[(label, 'month', sentiment)])]
+            for notable_label, ranked in entries:
+                # A ranking without any candidate keeps one empty row, as the old loops returned (None, 0)
+                for rank, (date, rate) in enumerate(ranked or [(None, 0)], start=1):
+                    row = {'notable_label': notable_label, 'date': date, 'rate': float(rate),
+                           'sentiment_type': sentiment, 'rank': rank}
+                    if by_country:
+                        row['country'] = country
+                    rows.append(row)
+    return pd.DataFrame(rows)
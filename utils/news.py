@@ -0,0 +1,111 @@
+"""
+In-memory index of the news timeline
+
+news_timeline.csv is read once into the [headline, URL] pairs and the HTML
+fragment of every date, so the daily news is a dictionary lookup instead of a
+filter over the frame per request. An inverted index from headline tokens to
+the headlines holding them answers full-text searches over the whole
+timeline, ranked with BM25.
+"""
+import math
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from utils.schema import date_to_day, to_day_numbers
+
+# BM25 term frequency saturation and headline length normalisation
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_token = re.compile(r'[^\W_]+')
+stopwords = frozenset(['a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has', 'in', 'is', 'it',
+                       'its', 'of', 'on', 'or', 's', 'says', 'that', 'the', 'to', 'was', 'with'])
+
+
+def tokenize(text):
+    """Lower case words and numbers of text, without stopwords"""
+    return [token for token in _token.findall(str(text).lower()) if token not in stopwords]
+
+
+def news_link(headline, URL):
+    return f'<a href="{URL}" target="_blank"><b>{headline}</b></a><br><br>'
+
+
+class NewsIndex:
+    """
+    :param news_df: Frame with 'Date' (ISO), 'Headline' and 'URL' columns, in the order
+    the headlines of a date are shown
+    """
+
+    def __init__(self, news_df):
+        self.dates = news_df['Date'].astype(str).tolist()
+        self.headlines = news_df['Headline'].astype(str).tolist()
+        self.urls = news_df['URL'].astype(str).tolist()
+        self.days = to_day_numbers(news_df['Date']).to_numpy().astype(np.int64)
+
+        self._items = defaultdict(list)
+        for date, headline, URL in zip(self.dates, self.headlines, self.urls):
+            self._items[date].append([headline, URL])
+        self._items = dict(self._items)
+        self._fragments = {date: ''.join(news_link(headline, URL) for headline, URL in items)
+                           for date, items in self._items.items()}
+
+        # token -> (headline positions, term frequencies)
+        postings = defaultdict(list)
+        lengths = []
+        for i, headline in enumerate(self.headlines):
+            tokens = tokenize(headline)
+            lengths.append(len(tokens))
+            for token, frequency in Counter(tokens).items():
+                postings[token].append((i, frequency))
+        self.lengths = np.array(lengths, dtype=np.float64)
+        self.average_length = self.lengths.mean() if len(lengths) else 0.0
+        self._postings = {token: (np.array([i for i, _ in pairs], dtype=np.int64),
+                                  np.array([frequency for _, frequency in pairs], dtype=np.float64))
+                          for token, pairs in postings.items()}
+
+    def __len__(self):
+        return len(self.headlines)
+
+    @property
+    def vocabulary_size(self):
+        return len(self._postings)
+
+    def items(self, date):
+        """[headline, URL] pairs of the news of date"""
+        return self._items.get(date, [])
+
+    def fragment(self, date):
+        """HTML links to the news headlines of date, '' when there are none"""
+        return self._fragments.get(date, '')
+
+    def _idf(self, n_matches):
+        return math.log(1 + (len(self) - n_matches + 0.5) / (n_matches + 0.5))
+
+    def search(self, query, start=None, end=None, limit=20):
+        """
+        :param query: Words to look for, a headline matches when it holds any of them
+        :param start: First date (inclusive), defaults to the first headline
+        :param end: Last date (inclusive), defaults to the last headline
+        :param limit: Results returned
+        :return:
+        (number of matching headlines, [(position, score)] of the best limit of them by
+        BM25 score, the most recent first on ties).
+        """
+        scores = np.zeros(len(self))
+        for token in set(tokenize(query)):
+            if token not in self._postings:
+                continue
+            positions, frequencies = self._postings[token]
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[positions] / self.average_length)
+            scores[positions] += self._idf(len(positions)) * frequencies * (BM25_K1 + 1) / (frequencies + norm)
+        matches = scores > 0
+        if start is not None:
+            matches &= self.days >= date_to_day(start)
+        if end is not None:
+            matches &= self.days <= date_to_day(end)
+        positions = np.flatnonzero(matches)
+        order = np.lexsort((-self.days[positions], -scores[positions]))[:limit]
+        return len(positions), [(int(i), float(scores[i])) for i in positions[order]]
@@ -0,0 +1,48 @@
+"""
+Case-insensitive lookup of the files in data/
+
+The repository stores the county files under data/Geojson, which only
+resolves as data/geojson on case-insensitive file systems.
+"""
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def find_case_insensitive_path(base_path, path_components):
+    """
+    Recursively find a path regardless of case sensitivity
+
+    Args:
+        base_path: The starting directory (Path object)
+        path_components: List of directory/file names to navigate
+
+    Returns:
+        Path object if found, None if not found
+    """
+    if not path_components:
+        return base_path
+
+    if not base_path.exists() or not base_path.is_dir():
+        return None
+
+    target = path_components[0]
+    remaining = path_components[1:]
+
+    # Try exact match first
+    next_path = base_path / target
+    if next_path.exists():
+        return find_case_insensitive_path(next_path, remaining)
+
+    # Try case-insensitive match
+    for item in base_path.iterdir():
+        if item.name.lower() == target.lower():
+            return find_case_insensitive_path(item, remaining)
+
+    # Not found
+    return None
+
+
+def data_path(relative_path, base_dir=BASE_DIR):
+    """Path of a file relative to base_dir regardless of case, None if missing"""
+    return find_case_insensitive_path(Path(base_dir), relative_path.split('/'))
@@ -0,0 +1,67 @@
+"""
+Server-sent event stream of the timeline playback
+
+The Play button used to request every chart once per date. /api/playback
+instead streams one compact frame per date from a generator: the server
+builds the frames ahead of the client, bounded by the socket buffer, and the
+client queues them and shows one per tick. The stream opens with a 'figures'
+event holding the specs of the bar chart and hashtag table, which the client
+draws once and then only restyles with the data of each frame. Each frame
+carries its date as the event id, so an EventSource that reconnects resumes
+after the last frame it received.
+"""
+from flask import request, stream_with_context
+
+
+def sse_message(data, event=None, event_id=None):
+    """
+    :param data: Text of the event, newlines become extra data: lines
+    :param event: Event type, the client's onmessage handler receives untyped events
+    :param event_id: Id the client sends back in Last-Event-ID when it reconnects
+    :return:
+    One server-sent event, terminated by a blank line.
+    """
+    lines = []
+    if event is not None:
+        lines.append(f'event: {event}')
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.extend(f'data: {line}' for line in str(data).split('\n'))
+    return '\n'.join(lines) + '\n\n'
+
+
+def playback_dates(dates, start, end, last_event_id=None):
+    """ISO dates from start to end (inclusive), after last_event_id when resuming"""
+    return [date for date in dates if start <= date <= end and (last_event_id is None or date > last_event_id)]
+
+
+def stream_frames(dates, encode_frame, figures=None):
+    """
+    :param dates: Dates to stream, in order
+    :param encode_frame: Function of a date returning the frame's JSON text
+    :param figures: JSON text of the figure specs the frames restyle, sent first as a 'figures' event
+    :return:
+    Generator of one event per date followed by an 'end' event.
+    """
+    # Tells the client to wait 3 s before reconnecting a dropped stream
+    yield 'retry: 3000\n\n'
+    if figures is not None:
+        yield sse_message(figures, event='figures')
+    for date in dates:
+        yield sse_message(encode_frame(date), event_id=date)
+    yield sse_message('{}', event='end')
+
+
+def playback_response(app, dates, encode_frame, figures=None):
+    """Streaming text/event-stream response of stream_frames"""
+    response = app.response_class(stream_with_context(stream_frames(dates, encode_frame, figures)),
+                                  mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stops nginx style proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def last_event_id():
+    """Date of the last frame a reconnecting EventSource received, None on the first connection"""
+    return request.headers.get('Last-Event-ID') or None
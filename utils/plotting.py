@@ -141,7 +141,7 @@ def plot_hashtag_table(df):
 
 def plot_sentiment(df_sent, sentiment_column, start, end):
     df_sent = select_df_between_dates(df_sent, start, end)
-    df_sent.rename(columns={'region_name': 'Country'}, inplace=True)
+    df_sent = df_sent.rename(columns={'region_name': 'Country'})
     fig = px.line(df_sent, x='date', y=sentiment_column, color='Country')
 
     fig.update_layout(legend=dict(
@@ -193,19 +193,25 @@ def plot_sentiment_comp(df_sent, start, end):
 
 
 def plot_sentiment_bar(df, sentiment_col, countries):
+    sentiment_labels = ['neg', 'neu', 'pos']
+    counts = [[len(df[(df['country'] == country) & (df[sentiment_col] == sentiment)].index)
+               for country in countries] for sentiment in sentiment_labels]
+    return plot_sentiment_counts_bar(counts, countries)
+
+
+def plot_sentiment_counts_bar(counts, countries):
+    """counts: tweets per sentiment label (neg, neu, pos) and country, e.g. from LabelCounts.range_counts"""
     sentiment_labels = ['neg', 'neu', 'pos']
     sentiment_dict = {
         'country': [],
         'count': [],
         'sentiment': []
     }
-    for sentiment in sentiment_labels:
-        for country in countries:
+    for i, sentiment in enumerate(sentiment_labels):
+        for j, country in enumerate(countries):
             sentiment_dict['country'].append(country)
             sentiment_dict['sentiment'].append(sentiment)
-            df_reg = df[df['country'] == country]
-            df_sent = df_reg[df_reg[sentiment_col] == sentiment]
-            sentiment_dict['count'].append(len(df_sent.index))
+            sentiment_dict['count'].append(int(counts[i][j]))
     fig = px.bar(pd.DataFrame(sentiment_dict), x='country',
                  y='count', color='sentiment', barmode='group')
     fig.update_layout(autosize=True)
@@ -261,6 +267,28 @@ def emoji_to_colour(emojis, r_min=0, r_max=255, g_min=0, g_max=255, b_min=0, b_m
     return mapping_colours
 
 
+def plot_county_choropleth(geojson, ids, names):
+    """
+    Choropleth of every GeoJSON feature with no values yet. The client fetches it once and
+    restyles z with the per date values, in the same order as ids.
+    """
+    fig = go.Figure(go.Choroplethmapbox(
+        geojson=geojson,
+        locations=ids,
+        featureidkey='properties.id',
+        z=[None] * len(ids),
+        text=names,
+        hovertemplate='<b>%{text}</b><br>%{z:.3f}<extra></extra>',
+        colorscale=px.colors.diverging.Temps_r,
+        zmin=-1,
+        zmax=1,
+        marker_line_width=0.5,
+    ))
+    fig.update_layout(mapbox_style='white-bg', mapbox_zoom=3.5, mapbox_center={"lat": 55, "lon": 0},
+                      autosize=True, height=900)
+    return fig
+
+
 def plot_emoji_bar_chart(df, date):
     # mapping_colours = emoji_to_colour(df.emoji)
     # df['colour'] = df['emoji'].map(mapping_colours)
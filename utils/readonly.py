@@ -0,0 +1,73 @@
+"""
+Read-only datasets shared by the request threads
+
+A worker serves requests from several threads over the same module-level
+frames, cubes and stores, so nothing a request reaches may be written once it
+is loaded. freeze() marks every NumPy array behind a loaded dataset as not
+writeable: the column blocks of frames and Series, the arrays held by the
+classes of utils/ (SentimentCube, HashtagStore, SeriesTable, ...) and those in
+dicts, lists and tuples of them. A stray in-place write then raises
+"assignment destination is read-only" instead of racing another request.
+
+With pandas copy-on-write on, a frame selected, renamed or sliced from a
+shared frame behaves as a copy, so request code can still modify what it
+derived without touching the original. Python lists and dicts inside the
+stores are not protected; nothing in utils/ writes to them after loading.
+"""
+import numpy as np
+import pandas as pd
+
+
+def enable_copy_on_write():
+    """Frames derived from another frame never write through to it (pandas >= 1.5)"""
+    pd.set_option('mode.copy_on_write', True)
+
+
+def _backing_arrays(data):
+    """NumPy arrays holding the values of a frame or Series, including the codes of categoricals"""
+    for array in data._mgr.arrays:
+        array = array if isinstance(array, np.ndarray) else getattr(array, '_ndarray', None)
+        if isinstance(array, np.ndarray):
+            yield array
+
+
+def _freeze(value, seen):
+    if isinstance(value, (str, bytes, int, float, bool)) or value is None or id(value) in seen:
+        return
+    seen.add(id(value))
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, (pd.DataFrame, pd.Series)):
+        for array in _backing_arrays(value):
+            array.flags.writeable = False
+    elif isinstance(value, dict):
+        for item in value.values():
+            _freeze(item, seen)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _freeze(item, seen)
+    elif type(value).__module__.startswith('utils.'):
+        attributes = getattr(value, '__dict__', None) or {}
+        for name in getattr(type(value), '__slots__', ()):
+            _freeze(getattr(value, name, None), seen)
+        for item in attributes.values():
+            _freeze(item, seen)
+
+
+def freeze(*values):
+    """
+    :param values: Loaded datasets: frames, arrays, utils/ structures, or dicts / lists of them
+    :return:
+    The first value, with every array it holds write-protected.
+    """
+    seen = set()
+    for value in values:
+        _freeze(value, seen)
+    return values[0] if values else None
+
+
+def is_frozen(value):
+    """Whether none of the arrays of a frame, Series or array can be written"""
+    if isinstance(value, np.ndarray):
+        return not value.flags.writeable
+    return all(not array.flags.writeable for array in _backing_arrays(value))
@@ -0,0 +1,222 @@
+"""
+Bounded in-process cache of the /api responses
+
+Every /api endpoint except the diagnostics is a pure function of its query
+string over data that does not change while the worker runs. The first
+response for a path + normalised query is stored compressed once per encoding
+(br when Brotli is installed, and gzip) together with a content hash, suffixed with
+the encoding to give each representation its own ETag; later
+requests get the stored bytes in the encoding their Accept-Encoding prefers
+without rebuilding the figure, or a bodiless 304 when they send the ETag back
+in If-None-Match.
+Below that, PayloadCache keeps the JSON text of the individual payloads that
+single endpoints and composite responses are assembled from.
+"""
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from flask import g, request
+
+from utils.compression import available_encodings, best_encoding, compress
+
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 512))
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+PAYLOAD_CACHE_SIZE = int(os.environ.get('PAYLOAD_CACHE_SIZE', 4096))
+PAYLOAD_CACHE_MAX_BYTES = int(os.environ.get('PAYLOAD_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+
+class CachedResponse:
+    """The stored form of one response"""
+
+    __slots__ = ('etag', 'mimetype', 'cache_control', 'encoded', 'size')
+
+    def __init__(self, body, mimetype, cache_control=None):
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.mimetype = mimetype
+        # Endpoints whose data never changes (the county geometry) may allow the browser to keep them
+        self.cache_control = cache_control or 'no-cache'
+        # Only the compressed bodies are kept, a client accepting neither gets the gzip body decompressed
+        self.encoded = {encoding: compress(body, encoding) for encoding in available_encodings()}
+        self.size = sum(len(data) for data in self.encoded.values())
+
+    def body(self, encoding=None):
+        if encoding is not None:
+            return self.encoded[encoding]
+        return gzip.decompress(self.encoded['gzip'])
+
+
+class ResponseCache:
+    """
+    LRU mapping of request keys to CachedResponse, bounded both by number of
+    entries and by total compressed bytes. Safe to share between threads.
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.not_modified = 0
+
+    @staticmethod
+    def key(path, args):
+        """path plus the query arguments sorted by name, so ?a=1&b=2 and ?b=2&a=1 share an entry"""
+        return path + '?' + '&'.join(f'{name}={value}' for name, value in sorted(args.items(multi=True)))
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.size
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self.evictions += 1
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'not_modified': self.not_modified,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+class EncodedPayload:
+    """The JSON text of one payload"""
+
+    __slots__ = ('text', 'size')
+
+    def __init__(self, text):
+        self.text = text
+        self.size = len(text)
+
+
+class PayloadCache(ResponseCache):
+    """
+    JSON encoded payloads of the endpoint builders, keyed by builder and arguments.
+    A single endpoint and a composite response such as the timeline bundle share
+    the entries, and each part is keyed only by the arguments it depends on, so the
+    COVID stats of a date are reused when the topic or model changes.
+    """
+
+    def __init__(self, dumps, max_entries=PAYLOAD_CACHE_SIZE, max_bytes=PAYLOAD_CACHE_MAX_BYTES):
+        super().__init__(max_entries, max_bytes)
+        self.dumps = dumps
+
+    def encoded(self, builder, *args):
+        """JSON text of builder(*args), built on the first call only"""
+        if self.max_entries <= 0:
+            return self.dumps(builder(*args))
+        key = builder.__name__ + repr(args)
+        entry = self.get(key)
+        if entry is None:
+            entry = EncodedPayload(self.dumps(builder(*args)))
+            self.put(key, entry)
+        return entry.text
+
+    def compose(self, parts):
+        """
+        :param parts: Mapping of output name to (builder, args)
+        :return:
+        JSON text of an object holding every part, joined from the encoded parts without decoding them.
+        """
+        return '{' + ','.join(f'{self.dumps(name)}:{self.encoded(builder, *args)}'
+                              for name, (builder, args) in parts.items()) + '}'
+
+
+def _send(app, cache, entry):
+    """Response for a stored entry: 304, br, gzip or plain bytes depending on the request headers"""
+    encoding = best_encoding(list(entry.encoded))
+    # Each encoding is a different representation and gets its own strong ETag, as in utils/assets.py
+    etag = entry.etag if encoding is None else f'{entry.etag}-{encoding}'
+    if etag in request.if_none_match:
+        cache.record_not_modified()
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(entry.body(encoding), mimetype=entry.mimetype)
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = entry.cache_control
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def install_response_cache(app, cache=None, prefix='/api/', exclude=()):
+    """
+    :param app: Flask app
+    :param cache: ResponseCache to use, a new one by default
+    :param prefix: Only GET requests under this path are cached
+    :param exclude: Paths never cached (endpoints reporting live process state)
+    :return:
+    The ResponseCache serving the app.
+    """
+    cache = cache if cache is not None else ResponseCache()
+    if cache.max_entries <= 0:
+        # RESPONSE_CACHE_SIZE=0 turns the cache off
+        return cache
+    exclude = set(exclude)
+
+    def cacheable():
+        return request.method == 'GET' and request.path.startswith(prefix) and request.path not in exclude
+
+    @app.before_request
+    def serve_cached_response():
+        if not cacheable():
+            return None
+        g.response_cache_key = ResponseCache.key(request.path, request.args)
+        entry = cache.get(g.response_cache_key)
+        if entry is None:
+            return None
+        g.response_cache_hit = True
+        return _send(app, cache, entry)
+
+    @app.after_request
+    def store_response(response):
+        key = g.pop('response_cache_key', None)
+        if key is None or g.pop('response_cache_hit', False):
+            return response
+        # Only complete, uncompressed JSON bodies are stored
+        if response.status_code != 200 or response.mimetype != 'application/json' or response.direct_passthrough \
+                or 'Content-Encoding' in response.headers:
+            return response
+        entry = CachedResponse(response.get_data(), response.mimetype, response.headers.get('Cache-Control'))
+        cache.put(key, entry)
+        return _send(app, cache, entry)
+
+    return cache
@@ -0,0 +1,146 @@
+"""
+Load-time schemas that shrink the in-memory frames
+
+Each dataset name maps to the columns that are dropped, dictionary-encoded as
+categoricals, stored as integer day offsets from day_zero, downcast to float32
+or to the smallest integer type. compact_frame applies a schema and records
+the deep memory usage before and after so /api/memory_report can show the
+saving per worker.
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Same as start_global, day offset 0
+day_zero = pd.Timestamp('2020-03-20')
+
+countries = ['England', 'Scotland', 'Northern Ireland', 'Wales']
+prediction_types = ['nn', 'vader', 'textblob', 'native']
+avg_score_columns = ['nn-score_avg', 'textblob-score_avg',
+                     'vader-score_avg', 'native-score_avg']
+prediction_cols = [f'{p}-predictions' for p in prediction_types]
+score_cols = [f'{p}-score' for p in prediction_types]
+
+dataset_schemas = {
+    'geo': {
+        'drop': [f'{p}-predictions_avg' for p in prediction_types],
+        'categories': ['county', 'country'],
+        'day_offsets': ['date'],
+        'float32': avg_score_columns,
+        'integers': ['id'],
+    },
+    'all_sentiments': {
+        'keep': ['date', 'country'] + prediction_cols + score_cols,
+        'categories': ['country'] + prediction_cols,
+        'day_offsets': ['date'],
+        'float32': score_cols,
+    },
+    'tweet_count': {
+        'integers': countries,
+    },
+    'scatter': {
+        'drop': ['Unnamed: 0', 'index'],
+        'float32': ['volume', 'deaths', 'cases'] + avg_score_columns,
+    },
+    'hashtags': {
+        'drop': ['index'],
+    },
+    'emojis': {
+        'drop': ['Unnamed: 0', 'Unnamed: 0.1'],
+        'integers': ['count'],
+    },
+    'covid_stats': {
+        'drop': ['areaCode'],
+        'categories': ['country'],
+        'integers': ['newCasesByPublishDate', 'cumCasesByPublishDate',
+                     'newDeathsByDeathDate', 'cumDeathsByDeathDate'],
+    },
+}
+
+# 'topic/name' -> {'rows', 'bytes_before', 'bytes_after'} for every compacted frame
+memory_report = {}
+
+
+def date_to_day(date):
+    """ISO date (or anything pd.Timestamp accepts) to its day offset from day_zero"""
+    return (pd.Timestamp(date).normalize() - day_zero).days
+
+
+def day_to_date(day):
+    return str((day_zero + pd.Timedelta(days=int(day))).date())
+
+
+def to_day_numbers(dates):
+    """Day offsets of a date column, whether it holds ISO strings, timestamps or offsets already"""
+    if pd.api.types.is_integer_dtype(dates):
+        return dates
+    return (pd.to_datetime(dates).dt.normalize() - day_zero).dt.days
+
+
+def decode_days(days):
+    """Day offset column back to ISO date strings"""
+    return pd.Series(day_zero + pd.to_timedelta(np.asarray(days), unit='D'), index=getattr(days, 'index', None)) \
+        .dt.strftime('%Y-%m-%d')
+
+
+def deep_memory(df):
+    """
+    Bytes of df, the Python objects of its object columns included. pandas cannot measure
+    those once the frame is write-protected (utils/readonly.py), so they are added up here.
+    """
+    objects = (df.dtypes == object).to_numpy()
+    total = int(df.iloc[:, ~objects].memory_usage(deep=True, index=True).sum())
+    for i in np.flatnonzero(objects):
+        values = df.iloc[:, i].to_numpy()
+        total += values.nbytes + sum(sys.getsizeof(value) for value in values.tolist())
+    return total
+
+
+def compact_frame(df, name, report_key=None):
+    """
+    :param df: Frame as loaded from its CSV
+    :param name: Key of dataset_schemas, frames without a schema are returned as is
+    :param report_key: Key to record the before/after memory usage under
+    :return:
+    A new, compacted frame. Columns missing from df are ignored.
+    """
+    schema = dataset_schemas.get(name)
+    if schema is None or df.empty:
+        if report_key:
+            memory_report[report_key] = {'rows': len(df.index), 'bytes_before': deep_memory(df),
+                                         'bytes_after': deep_memory(df)}
+        return df
+    before = deep_memory(df)
+    if 'keep' in schema:
+        df = df[[column for column in schema['keep'] if column in df.columns]]
+    df = df.drop(columns=[column for column in schema.get('drop', []) if column in df.columns])
+    converted = {}
+    for column in schema.get('categories', []):
+        if column in df.columns:
+            converted[column] = df[column].astype('category')
+    for column in schema.get('day_offsets', []):
+        if column in df.columns:
+            converted[column] = to_day_numbers(df[column]).astype(np.int16)
+    for column in schema.get('float32', []):
+        if column in df.columns:
+            converted[column] = df[column].astype(np.float32)
+    for column in schema.get('integers', []):
+        if column in df.columns and pd.api.types.is_integer_dtype(df[column]):
+            converted[column] = pd.to_numeric(df[column], downcast='integer')
+    df = df.assign(**converted)
+    if report_key:
+        memory_report[report_key] = {'rows': len(df.index), 'bytes_before': before, 'bytes_after': deep_memory(df)}
+    return df
+
+
+def summarise_memory_report(keys=None):
+    entries = {key: value for key, value in memory_report.items() if keys is None or key in keys}
+    before = sum(entry['bytes_before'] for entry in entries.values())
+    after = sum(entry['bytes_after'] for entry in entries.values())
+    return {
+        'datasets': entries,
+        'bytes_before': before,
+        'bytes_after': after,
+        'saving': round(1 - after / before, 3) if before else 0.0,
+    }
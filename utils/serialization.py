@@ -0,0 +1,102 @@
+"""
+JSON encoding of the API payloads
+
+fig_to_json used to serialise every figure three times (fig.to_dict(),
+json.dumps with a NumPy encoder and json.loads) before jsonify encoded it a
+fourth time. figure_dict now returns the figure's own data and layout without
+copying them, NumPy arrays included, and dumps writes the payload once: with
+orjson when it is installed, otherwise with plotly's JSON encoder. NaN and
+infinities become null and dates ISO strings either way, where the old path
+wrote bare NaN tokens that JSON.parse rejects.
+
+With TYPED_ARRAYS=1, 1-d numeric arrays of at least TYPED_ARRAY_MIN_LENGTH
+items are sent as base64 typed arrays ({"dtype": "f8", "bdata": ...}), which
+Plotly.js 2.28 and later decodes without parsing a number per item.
+"""
+import base64
+import datetime
+import json
+import os
+
+import numpy as np
+from flask.json.provider import DefaultJSONProvider
+from plotly.utils import PlotlyJSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+TYPED_ARRAYS = os.environ.get('TYPED_ARRAYS', '0') == '1'
+TYPED_ARRAY_MIN_LENGTH = int(os.environ.get('TYPED_ARRAY_MIN_LENGTH', 64))
+
+# NumPy kinds and sizes Plotly.js has typed arrays for
+_typed_array_dtypes = {('f', 8): 'f8', ('f', 4): 'f4', ('i', 4): 'i4', ('i', 2): 'i2', ('i', 1): 'i1',
+                       ('u', 4): 'u4', ('u', 2): 'u2', ('u', 1): 'u1'}
+
+
+def _default(obj):
+    """Types orjson does not encode itself"""
+    # Object arrays and NumPy scalars, whose NaN orjson then writes as null like any float
+    if isinstance(obj, (np.ndarray, np.generic)):
+        return obj.tolist()
+    if isinstance(obj, (datetime.date, datetime.datetime)):
+        return obj.isoformat()
+    if hasattr(obj, 'to_plotly_json'):
+        return obj.to_plotly_json()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def dumps(obj):
+    """JSON text of obj, which may hold NumPy arrays and scalars, NaN and dates"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, cls=PlotlyJSONEncoder)
+
+
+def typed_array(values):
+    """Base64 typed array spec of a 1-d numeric array, None when Plotly.js has no matching type"""
+    if values.ndim != 1 or len(values) < TYPED_ARRAY_MIN_LENGTH:
+        return None
+    if values.dtype.kind == 'i' and values.dtype.itemsize == 8:
+        if values.min() < np.iinfo(np.int32).min or values.max() > np.iinfo(np.int32).max:
+            return None
+        values = values.astype(np.int32)
+    dtype = _typed_array_dtypes.get((values.dtype.kind, values.dtype.itemsize))
+    if dtype is None:
+        return None
+    return {'dtype': dtype, 'bdata': base64.b64encode(np.ascontiguousarray(values, values.dtype.newbyteorder('<'))
+                                                      .tobytes()).decode('ascii')}
+
+
+def encode_typed_arrays(obj):
+    """
+    Copy of a trace with its long numeric arrays, also those of nested attributes such as
+    marker, replaced by typed array specs. Lists (GeoJSON coordinates, text) are left as they are.
+    """
+    if isinstance(obj, dict):
+        return {key: encode_typed_arrays(value) for key, value in obj.items()}
+    if isinstance(obj, np.ndarray):
+        spec = typed_array(obj)
+        return spec if spec is not None else obj
+    return obj
+
+
+def figure_dict(fig, typed_arrays=TYPED_ARRAYS):
+    """
+    :param fig: Plotly figure
+    :param typed_arrays: Send long numeric arrays as base64 typed arrays
+    :return:
+    {'data': ..., 'layout': ...} sharing the figure's arrays, encoded by dumps.
+    """
+    spec = fig.to_plotly_json()
+    data = [encode_typed_arrays(trace) for trace in spec['data']] if typed_arrays else spec['data']
+    return {'data': data, 'layout': spec['layout']}
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask JSON provider whose jsonify encodes with dumps"""
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj)
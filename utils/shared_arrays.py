@@ -0,0 +1,251 @@
+"""
+Dataset arrays in named shared memory, mapped by every prefork worker
+
+Under gunicorn.conf.py the app is imported once in the master with every topic
+preloaded. share() then copies the NumPy arrays behind the loaded datasets
+(numeric and categorical frame columns, the arrays of the cubes, stores and
+series tables of utils/) into one multiprocessing.shared_memory segment per
+group, and rebuilds the frames around read-only views of it with the public
+pandas constructors. The workers forked from the master inherit the mappings,
+so those pages are the same physical memory in every worker.
+
+Object columns hold pointers into one process' heap and stay private, as do
+arrays under SHARED_ARRAY_MIN_BYTES and the memory-mapped tweet store, whose
+pages the OS already shares. memory_rollup() reads /proc/self/smaps_rollup for
+the shared and private bytes of the calling process.
+"""
+import atexit
+import mmap
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from utils.readonly import freeze
+
+SHARED_DATASETS = os.environ.get('SHARED_DATASETS', '0') == '1'
+SHARED_ARRAY_MIN_BYTES = int(os.environ.get('SHARED_ARRAY_MIN_BYTES', 4096))
+# Start of every array in a segment, a cache line
+ALIGNMENT = 64
+
+# Segments created by this process, name -> SharedSegment
+segments = {}
+
+
+class SharedSegment:
+    """One named segment holding the arrays of a group of datasets"""
+
+    def __init__(self, group, arrays):
+        """
+        :param group: Name of the datasets in the reports
+        :param arrays: {_key(array): array} of the arrays to copy
+        """
+        self.group = group
+        offsets, size = [], 0
+        for array in arrays.values():
+            offsets.append(size)
+            size += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+        # A random name, so a segment left behind by a killed master never collides with a new one
+        self.memory = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        self.name = self.memory.name
+        self.size = size
+        self.creator = os.getpid()
+        # Bytes of the group's arrays that stay in the process heap, set by share()
+        self.private_bytes = 0
+        self.views = {}
+        for (key, array), offset in zip(arrays.items(), offsets):
+            order = 'F' if array.flags.f_contiguous and not array.flags.c_contiguous else 'C'
+            view = np.ndarray(array.shape, array.dtype, buffer=self.memory.buf, offset=offset, order=order)
+            view[...] = array
+            view.flags.writeable = False
+            self.views[key] = view
+
+    def __len__(self):
+        return len(self.views)
+
+    def release(self):
+        """Unmap the segment, and remove its name when called by the process that created it"""
+        self.views = {}
+        try:
+            self.memory.close()
+        except BufferError:
+            # Views still referenced by the datasets keep the mapping until exit
+            pass
+        if os.getpid() == self.creator:
+            try:
+                self.memory.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _memory_mapped(array):
+    """Whether array is (a view of) a memory-mapped file"""
+    while isinstance(array, np.ndarray):
+        if isinstance(array, np.memmap):
+            return True
+        array = array.base
+    return isinstance(array, mmap.mmap)
+
+
+def _shareable(array):
+    return array.dtype != object and array.nbytes >= SHARED_ARRAY_MIN_BYTES and not _memory_mapped(array)
+
+
+def _key(array):
+    """The memory an array covers; the column views of a frame are new objects on every access"""
+    return array.__array_interface__['data'][0], array.shape, array.strides, array.dtype.str
+
+
+def _column(column, visit):
+    """column with its values or categorical codes replaced by what visit returned"""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        codes = column.array.codes
+        replaced = visit(codes)
+        return column if replaced is codes else pd.Categorical.from_codes(replaced, dtype=column.dtype)
+    if isinstance(column.dtype, np.dtype) and column.dtype != object:
+        values = column.to_numpy()
+        replaced = visit(values)
+        return column if replaced is values else replaced
+    return column
+
+
+def _frame(frame, visit):
+    """frame rebuilt around the arrays visit returned for its columns, frame itself when there are none"""
+    if isinstance(frame, pd.Series):
+        column = _column(frame, visit)
+        return frame if column is frame else pd.Series(column, index=frame.index, name=frame.name, copy=False)
+    # With copy-on-write every items() call returns new Series, so compare with the same ones
+    items = [column for _, column in frame.items()]
+    columns = [_column(column, visit) for column in items]
+    if all(new is old for new, old in zip(columns, items)):
+        return frame
+    # By position, the labels may repeat
+    rebuilt = pd.DataFrame(dict(enumerate(columns)), index=frame.index, copy=False)
+    rebuilt.columns = frame.columns
+    return rebuilt
+
+
+def _walk(value, visit, seen):
+    """
+    Calls visit(array) for every array value holds and returns value with each array
+    replaced by what visit returned. Frames, Series and tuples are rebuilt, lists, dicts
+    and utils/ objects are updated in place.
+    :param seen: {id: (value, replacement)} of the values walked so far, so a value held twice
+    is replaced by the same object (the value is kept so that its id is not reused)
+    """
+    if isinstance(value, np.ndarray):
+        return visit(value)
+    if isinstance(value, (str, bytes, int, float, bool)) or value is None:
+        return value
+    if id(value) in seen:
+        return seen[id(value)][1]
+    seen[id(value)] = (value, value)
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        seen[id(value)] = (value, _frame(value, visit))
+        return seen[id(value)][1]
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            value[key] = _walk(item, visit, seen)
+    elif isinstance(value, list):
+        for i, item in enumerate(value):
+            value[i] = _walk(item, visit, seen)
+    elif isinstance(value, tuple):
+        items = [_walk(item, visit, seen) for item in value]
+        if any(new is not old for new, old in zip(items, value)):
+            seen[id(value)] = (value, type(value)(*items) if hasattr(value, '_fields') else type(value)(items))
+            return seen[id(value)][1]
+    elif type(value).__module__.startswith('utils.'):
+        names = list(getattr(value, '__dict__', {})) + list(getattr(type(value), '__slots__', ()))
+        for name in names:
+            if hasattr(value, name):
+                item = getattr(value, name)
+                replaced = _walk(item, visit, seen)
+                if replaced is not item:
+                    setattr(value, name, replaced)
+    return value
+
+
+def share(group, *values):
+    """
+    :param group: Name of the segment ('global', a topic)
+    :param values: Loaded datasets: frames, arrays, utils/ structures, or dicts / lists of them
+    :return:
+    values, with each frame, Series or array replaced by one reading from the segment. Containers
+    are updated in place, a frame or array passed directly has to be rebound by the caller.
+    """
+    arrays, private = {}, [0]
+
+    def collect(array):
+        if _shareable(array):
+            arrays.setdefault(_key(array), array)
+        else:
+            private[0] += array.nbytes
+        return array
+
+    seen = {}
+    for value in values:
+        _walk(value, collect, seen)
+    if not arrays:
+        return list(values)
+    segment = SharedSegment(group, arrays)
+    seen = {}
+    shared = [_walk(value, lambda array: segment.views.get(_key(array), array), seen) for value in values]
+    # The rebuilt frames are as read-only as the ones they replace
+    freeze(*shared)
+    segments[segment.name] = segment
+    segment.private_bytes = private[0]
+    print(f"Shared {len(segment)} {group} arrays in {segment.name} ({segment.size / 2 ** 20:.1f} MiB), "
+          f"{private[0] / 2 ** 20:.1f} MiB left private")
+    return shared
+
+
+def shared_report():
+    """Segments created before the fork, with their size and the bytes of the arrays left private"""
+    return {
+        'segments': {name: {'group': segment.group, 'arrays': len(segment), 'bytes': segment.size,
+                            'private_bytes': segment.private_bytes}
+                     for name, segment in segments.items()},
+        'bytes': sum(segment.size for segment in segments.values()),
+    }
+
+
+def memory_rollup(pid='self'):
+    """
+    Rss, Pss and the shared and private clean / dirty bytes of a process from
+    /proc/<pid>/smaps_rollup (Linux 4.14+), {} where it is not available.
+    """
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            lines = f.read().splitlines()[1:]
+    except OSError:
+        return {}
+    rollup = {}
+    for line in lines:
+        name, _, amount = line.partition(':')
+        fields = amount.split()
+        if len(fields) == 2 and fields[1] == 'kB':
+            rollup[name] = int(fields[0]) * 1024
+    return rollup
+
+
+def worker_memory_report(pid='self'):
+    """Shared and private bytes of a worker, as logged by gunicorn.conf.py"""
+    rollup = memory_rollup(pid)
+    if not rollup:
+        return {}
+    return {
+        'rss': rollup.get('Rss', 0),
+        'pss': rollup.get('Pss', 0),
+        'shared': rollup.get('Shared_Clean', 0) + rollup.get('Shared_Dirty', 0),
+        'private': rollup.get('Private_Clean', 0) + rollup.get('Private_Dirty', 0),
+        'shared_datasets': sum(segment.size for segment in segments.values()),
+    }
+
+
+@atexit.register
+def release():
+    """Unmap every segment; the master also removes their names (forked workers inherit this handler)"""
+    for segment in list(segments.values()):
+        segment.release()
+    segments.clear()
@@ -0,0 +1,257 @@
+"""
+Binary columnar snapshots of the files in data/
+
+The first time a CSV is loaded it is parsed with pandas as usual and then
+written next to the other snapshots as an uncompressed .npz file holding one
+typed array per column (string columns are stored as integer codes plus their
+distinct values). Later loads read the arrays straight back, skipping the CSV
+parser. A snapshot is reused while the source file keeps the same mtime and
+size; if either changed the source is hashed and the snapshot is only rebuilt
+when the content actually differs (a fresh checkout touches every mtime).
+"""
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+SNAPSHOT_DIR = Path(os.environ.get('SNAPSHOT_DIR', BASE_DIR / 'data' / '.snapshots'))
+SNAPSHOTS_ENABLED = os.environ.get('DATA_SNAPSHOTS', '1') != '0'
+SNAPSHOT_VERSION = 1
+
+# One entry per file loaded through this module, in load order
+load_report = []
+
+
+def file_fingerprint(path):
+    stat = os.stat(path)
+    return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def snapshot_path(source, suffix, options=None):
+    """
+    :param source: Path of the source file
+    :param suffix: File extension of the snapshot
+    :param options: Loader keyword arguments, part of the snapshot identity
+    :return:
+    Path of the snapshot for this source/options pair.
+    """
+    source = Path(source).resolve()
+    try:
+        name = source.relative_to(BASE_DIR)
+    except ValueError:
+        name = source
+    key = '{}|{}|{}'.format(SNAPSHOT_VERSION, name, json.dumps(options or {}, sort_keys=True, default=str))
+    tag = hashlib.sha1(key.encode('utf-8')).hexdigest()[:10]
+    return SNAPSHOT_DIR / '{}.{}.{}'.format(source.name, tag, suffix)
+
+
+def write_frame(df, path, meta=None):
+    """
+    Write a DataFrame with a default RangeIndex as one array per column.
+    Raises ValueError for columns that cannot be stored as typed arrays.
+    """
+    if not isinstance(df.index, pd.RangeIndex) or df.index.start != 0 or df.index.step != 1:
+        raise ValueError('only frames with a default RangeIndex can be snapshotted')
+    arrays = {}
+    columns = []
+    for i, name in enumerate(df.columns):
+        column = df[name]
+        if column.dtype == object:
+            codes, uniques = pd.factorize(column)
+            if not all(isinstance(value, str) for value in uniques):
+                raise ValueError('column {!r} mixes strings with other objects'.format(name))
+            arrays['c{}'.format(i)] = codes.astype(np.int32)
+            arrays['c{}_values'.format(i)] = np.array(list(uniques), dtype=str)
+            columns.append({'name': str(name), 'kind': 'strings'})
+        elif isinstance(column.dtype, pd.CategoricalDtype):
+            categories = column.cat.categories
+            if not all(isinstance(value, str) for value in categories):
+                raise ValueError('column {!r} has non-string categories'.format(name))
+            arrays['c{}'.format(i)] = column.cat.codes.to_numpy()
+            arrays['c{}_values'.format(i)] = np.array(list(categories), dtype=str)
+            columns.append({'name': str(name), 'kind': 'category'})
+        elif column.dtype.kind in 'biuf':
+            arrays['c{}'.format(i)] = column.to_numpy()
+            columns.append({'name': str(name), 'kind': 'values'})
+        else:
+            raise ValueError('column {!r} has unsupported dtype {}'.format(name, column.dtype))
+    meta = dict(meta or {}, columns=columns, rows=len(df.index))
+    arrays['__meta__'] = np.array(json.dumps(meta))
+    _atomic_write(path, lambda f: np.savez(f, **arrays))
+
+
+def read_meta(path):
+    if path.suffix == '.npz':
+        with np.load(path, allow_pickle=False) as npz:
+            return json.loads(str(npz['__meta__']))
+    with open(path, 'rb') as f:
+        return pickle.load(f)[0]
+
+
+def read_frame(path):
+    with np.load(path, allow_pickle=False) as npz:
+        meta = json.loads(str(npz['__meta__']))
+        data = {}
+        for i, column in enumerate(meta['columns']):
+            values = npz['c{}'.format(i)]
+            if column['kind'] == 'strings':
+                uniques = npz['c{}_values'.format(i)].astype(object)
+                decoded = np.empty(len(values), dtype=object)
+                missing = values < 0
+                decoded[~missing] = uniques[values[~missing]]
+                decoded[missing] = np.nan
+                values = decoded
+            elif column['kind'] == 'category':
+                values = pd.Categorical.from_codes(values, npz['c{}_values'.format(i)].astype(object))
+            data[column['name']] = values
+    return pd.DataFrame(data, columns=[column['name'] for column in meta['columns']])
+
+
+def _atomic_write(path, write):
+    # Several gunicorn workers may boot at once, never expose a half written file
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.' + path.name)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _snapshot_is_fresh(snapshot, source):
+    """
+    Compare the source against the fingerprint stored in the snapshot.
+    Returns (fresh, meta) where meta is the stored metadata (or None). When
+    only the mtime moved but the content hash matches, the returned meta
+    carries the new fingerprint so the caller can refresh the snapshot.
+    """
+    if not snapshot.exists():
+        return False, None
+    try:
+        meta = read_meta(snapshot)
+    except Exception:
+        return False, None
+    stored = meta.get('source', {})
+    current = file_fingerprint(source)
+    if stored.get('mtime_ns') == current['mtime_ns'] and stored.get('size') == current['size']:
+        return True, meta
+    if stored.get('size') == current['size'] and stored.get('sha1') == file_hash(source):
+        return True, dict(meta, source=dict(stored, **current), touched=True)
+    return False, meta
+
+
+def _record(source, origin, seconds, rows, csv_seconds=None):
+    source = Path(source)
+    try:
+        name = str(source.resolve().relative_to(BASE_DIR))
+    except ValueError:
+        name = str(source)
+    entry = {'file': name, 'source': origin, 'seconds': round(seconds, 4), 'rows': rows,
+             'csv_seconds': round(csv_seconds, 4) if csv_seconds is not None else None}
+    load_report.append(entry)
+    print(f"Loaded {name} from {origin} in {seconds * 1000:.1f} ms")
+    return entry
+
+
+def load_csv(path, **kwargs):
+    """
+    Drop-in replacement for pd.read_csv(path, **kwargs) backed by a snapshot.
+    Falls back to plain pd.read_csv when the snapshot cannot be read or written.
+    """
+    path = Path(path)
+    start = time.perf_counter()
+    if not SNAPSHOTS_ENABLED:
+        df = pd.read_csv(path, **kwargs)
+        _record(path, 'csv', time.perf_counter() - start, len(df.index))
+        return df
+
+    snapshot = snapshot_path(path, 'npz', kwargs)
+    fresh, meta = _snapshot_is_fresh(snapshot, path)
+    if fresh:
+        try:
+            df = read_frame(snapshot)
+            _record(path, 'snapshot', time.perf_counter() - start, len(df.index), meta.get('parse_seconds'))
+            if meta.pop('touched', False):
+                meta.pop('columns', None)
+                meta.pop('rows', None)
+                write_frame(df, snapshot, meta)
+            return df
+        except Exception as e:
+            print(f"Could not read snapshot {snapshot.name}: {e}")
+
+    start = time.perf_counter()
+    df = pd.read_csv(path, **kwargs)
+    parse_seconds = time.perf_counter() - start
+    _record(path, 'csv', parse_seconds, len(df.index), parse_seconds)
+    try:
+        source = dict(file_fingerprint(path), sha1=file_hash(path))
+        write_frame(df, snapshot, {'source': source, 'parse_seconds': parse_seconds})
+    except (OSError, ValueError) as e:
+        print(f"Could not write snapshot for {path.name}: {e}")
+    return df
+
+
+def load_json(path):
+    """Drop-in replacement for json.load(open(path)) backed by a pickle snapshot"""
+    path = Path(path)
+    start = time.perf_counter()
+    if SNAPSHOTS_ENABLED:
+        snapshot = snapshot_path(path, 'pickle')
+        fresh, meta = _snapshot_is_fresh(snapshot, path)
+        if fresh:
+            try:
+                touched = meta.pop('touched', False)
+                with open(snapshot, 'rb') as f:
+                    stored_meta, data = pickle.load(f)
+                _record(path, 'snapshot', time.perf_counter() - start, len(data), meta.get('parse_seconds'))
+                if touched:
+                    _atomic_write(snapshot, lambda f: pickle.dump((meta, data), f, protocol=pickle.HIGHEST_PROTOCOL))
+                return data
+            except Exception as e:
+                print(f"Could not read snapshot {snapshot.name}: {e}")
+
+    start = time.perf_counter()
+    with open(path, 'r') as f:
+        data = json.load(f)
+    parse_seconds = time.perf_counter() - start
+    _record(path, 'json', parse_seconds, len(data), parse_seconds)
+    if SNAPSHOTS_ENABLED:
+        try:
+            meta = {'source': dict(file_fingerprint(path), sha1=file_hash(path)), 'parse_seconds': parse_seconds}
+            _atomic_write(snapshot, lambda f: pickle.dump((meta, data), f, protocol=pickle.HIGHEST_PROTOCOL))
+        except OSError as e:
+            print(f"Could not write snapshot for {path.name}: {e}")
+    return data
+
+
+def summarise_load_report():
+    """Totals of the load report, split by where each file was read from"""
+    totals = {}
+    for entry in load_report:
+        total = totals.setdefault(entry['source'], {'files': 0, 'seconds': 0.0})
+        total['files'] += 1
+        total['seconds'] = round(total['seconds'] + entry['seconds'], 4)
+    csv_seconds = [entry['csv_seconds'] for entry in load_report if entry['csv_seconds'] is not None]
+    return {
+        'by_source': totals,
+        'total_seconds': round(sum(entry['seconds'] for entry in load_report), 4),
+        'csv_seconds': round(sum(csv_seconds), 4) if len(csv_seconds) == len(load_report) else None,
+    }
@@ -0,0 +1,244 @@
+"""
+Memory-mapped, date-sorted store of the per-tweet sentiment predictions
+
+all_tweet_sentiments.csv holds one row per tweet. build_tweet_store converts
+it once into a directory of fixed-width .npy columns sorted by day, plus an
+offsets table where rows offsets[d]:offsets[d + 1] are the tweets of day d.
+Workers open the columns with mmap, so a day's tweets are a zero-copy slice
+and the pages are shared between processes through the OS page cache.
+The store records the size, mtime and hash of the CSV it was built from;
+open_tweet_store ignores a store whose CSV has changed since.
+
+    python -m utils.tweet_store data/covid/all_tweet_sentiments.csv data/covid/tweet_store
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils.aggregations import prediction_types, score_columns, prediction_columns, avg_score_columns
+from utils.schema import date_to_day
+from utils.snapshots import BASE_DIR, file_fingerprint, file_hash
+
+STORE_VERSION = 1
+default_columns = ['country'] + [prediction_columns[p] for p in prediction_types] + \
+                  [score_columns[p] for p in prediction_types]
+
+
+def _code_dtype(n_categories):
+    return np.int8 if n_categories < 127 else np.int16 if n_categories < 32767 else np.int32
+
+
+def _source_name(path):
+    path = Path(path).resolve()
+    try:
+        return str(path.relative_to(BASE_DIR))
+    except ValueError:
+        return str(path)
+
+
+def _write_meta(store_path, meta):
+    # Workers may open the store while the metadata is refreshed, never expose a half written file
+    fd, tmp = tempfile.mkstemp(dir=store_path, prefix='.meta')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(meta, f, indent=1)
+        os.replace(tmp, store_path / 'meta.json')
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def build_tweet_store(csv_path, store_path, columns=None):
+    """
+    :param csv_path: Per-tweet CSV with a 'date' column
+    :param store_path: Directory to write the store to (replaced atomically)
+    :param columns: Columns to keep, defaults to country, predictions and scores
+    :return:
+    Path of the written store.
+    """
+    store_path = Path(store_path)
+    wanted = columns or default_columns
+    header = pd.read_csv(csv_path, nrows=0).columns
+    keep = [column for column in wanted if column in header]
+    df = pd.read_csv(csv_path, usecols=['date'] + keep)
+
+    days = pd.to_datetime(df['date'], errors='coerce').dt.normalize()
+    if days.isna().any():
+        # A row without a usable date belongs to no day, skip it instead of failing the build
+        print(f"Skipping {int(days.isna().sum())} rows of {csv_path} without a valid date")
+        df = df.loc[days.notna()].reset_index(drop=True)
+        days = days.dropna().reset_index(drop=True)
+    first_day = days.min()
+    day_index = (days - first_day).dt.days.to_numpy(dtype=np.int64)
+    n_days = int(day_index.max()) + 1 if len(day_index) else 0
+    order = np.argsort(day_index, kind='stable')
+    offsets = np.zeros(n_days + 1, dtype=np.int64)
+    np.cumsum(np.bincount(day_index, minlength=n_days), out=offsets[1:])
+
+    tmp = Path(tempfile.mkdtemp(dir=store_path.parent, prefix='.' + store_path.name))
+    meta_columns = []
+    for column in keep:
+        values = df[column].to_numpy()[order]
+        if df[column].dtype == object:
+            codes, categories = pd.factorize(values)
+            np.save(tmp / f'{column}.npy', codes.astype(_code_dtype(len(categories))))
+            meta_columns.append({'name': column, 'kind': 'categorical', 'categories': list(categories)})
+        else:
+            if values.dtype.kind == 'f':
+                values = values.astype(np.float32)
+            np.save(tmp / f'{column}.npy', values)
+            meta_columns.append({'name': column, 'kind': 'values'})
+    np.save(tmp / 'offsets.npy', offsets)
+    meta = {
+        'version': STORE_VERSION,
+        'rows': int(len(df.index)),
+        'first_day': str(first_day.date()) if n_days else None,
+        'days': n_days,
+        'columns': meta_columns,
+        'source': dict(file_fingerprint(csv_path), path=_source_name(csv_path), sha1=file_hash(csv_path)),
+    }
+    _write_meta(tmp, meta)
+
+    if store_path.exists():
+        shutil.rmtree(store_path)
+    os.replace(tmp, store_path)
+    return store_path
+
+
+class TweetStore:
+    """Read-only view over a store written by build_tweet_store"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / 'meta.json') as f:
+            self.meta = json.load(f)
+        if self.meta.get('version') != STORE_VERSION:
+            raise ValueError(f"Unsupported tweet store version in {self.path}")
+        self.first_day = pd.Timestamp(self.meta['first_day']) if self.meta['first_day'] else None
+        self.offsets = np.load(self.path / 'offsets.npy', mmap_mode='r')
+        self.columns = {}
+        self.categories = {}
+        for column in self.meta['columns']:
+            self.columns[column['name']] = np.load(self.path / f"{column['name']}.npy", mmap_mode='r')
+            if column['kind'] == 'categorical':
+                self.categories[column['name']] = column['categories']
+
+    def __len__(self):
+        return self.meta['rows']
+
+    def stale_source(self):
+        """Path of the CSV the store was built from if its size or content changed since, else None"""
+        stored = self.meta.get('source')
+        if stored is None:
+            # Built before the source was recorded
+            return None
+        path = BASE_DIR / stored['path'] if not os.path.isabs(stored['path']) else Path(stored['path'])
+        if not path.exists():
+            # Deployed without the CSV, the store is all there is
+            return None
+        current = file_fingerprint(path)
+        if stored['mtime_ns'] == current['mtime_ns'] and stored['size'] == current['size']:
+            return None
+        if stored['size'] != current['size'] or stored['sha1'] != file_hash(path):
+            return path
+        # Only the mtime moved (touch, checkout, copy): store it so later opens skip the hash
+        self.meta['source'] = dict(stored, **current)
+        try:
+            _write_meta(self.path, self.meta)
+        except OSError as e:
+            print(f"Could not refresh the source fingerprint of tweet store {self.path}: {e}")
+        return None
+
+    def day_number(self, date):
+        if self.first_day is None:
+            return -1
+        return (pd.Timestamp(date).normalize() - self.first_day).days
+
+    def row_range(self, start, end=None):
+        """Row slice holding the tweets from start to end (inclusive)"""
+        n_days = self.meta['days']
+        first = min(max(self.day_number(start), 0), n_days)
+        last = min(max(self.day_number(end if end is not None else start) + 1, first), n_days)
+        return slice(int(self.offsets[first]), int(self.offsets[last]))
+
+    def day(self, start, end=None, columns=None):
+        """Zero-copy column views (category codes for categorical columns)"""
+        rows = self.row_range(start, end)
+        return {name: self.columns[name][rows] for name in (columns or self.columns)}
+
+    def day_frame(self, start, end=None, columns=None, with_dates=False):
+        """
+        The tweets of a day (or date range) as a DataFrame with categorical labels,
+        plus a 'date' column of day offsets (see utils.schema) when with_dates is set
+        """
+        data = {}
+        if with_dates:
+            days = np.repeat(np.arange(self.meta['days']), np.diff(self.offsets))[self.row_range(start, end)]
+            data['date'] = (days + date_to_day(self.first_day)).astype(np.int16)
+        for name, values in self.day(start, end, columns).items():
+            if name in self.categories:
+                values = pd.Categorical.from_codes(values, self.categories[name])
+            data[name] = values
+        return pd.DataFrame(data)
+
+    def daily_score_means(self, start, end):
+        """
+        Same output as aggregate_sentiment_by_date: one row per date between
+        start and end with the mean score of every model, 0.0 for days without tweets.
+        """
+        dates = pd.date_range(start=start, end=end)
+        n_days = self.meta['days']
+        counts_per_day = np.diff(self.offsets)
+        day_of_row = np.repeat(np.arange(n_days), counts_per_day)
+        wanted = np.asarray((dates - self.first_day).days) if self.first_day is not None \
+            else np.full(len(dates), -1)
+        in_store = (wanted >= 0) & (wanted < n_days)
+        scores = {}
+        for i, prediction_type in enumerate(score_columns):
+            values = self.columns[score_columns[prediction_type]]
+            valid = ~np.isnan(values)
+            sums = np.bincount(day_of_row[valid], weights=values[valid], minlength=n_days)
+            counts = np.bincount(day_of_row[valid], minlength=n_days)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means = sums / counts
+            column = np.zeros(len(dates))
+            column[in_store] = np.where(counts_per_day[wanted[in_store]] > 0, means[wanted[in_store]], 0.0)
+            scores[avg_score_columns[i]] = column
+        return pd.concat([pd.DataFrame({'date': [str(date.date()) for date in dates]}),
+                          pd.DataFrame(scores)], axis=1)
+
+
+def open_tweet_store(path):
+    """Open the store at path, or return None when it has not been built or its CSV has changed since"""
+    path = Path(path)
+    if not (path / 'meta.json').exists():
+        return None
+    try:
+        store = TweetStore(path)
+        source = store.stale_source()
+    except Exception as e:
+        print(f"Could not open tweet store {path}: {e}")
+        return None
+    if source is not None:
+        # The CSV is read instead, until the store is rebuilt
+        print(f"Ignoring tweet store {path}, {source} changed since it was built. Rebuild it with "
+              f"python -m utils.tweet_store {source} {path}")
+        return None
+    return store
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert all_tweet_sentiments.csv into a memory-mapped store')
+    parser.add_argument('csv_path')
+    parser.add_argument('store_path')
+    args = parser.parse_args()
+    path = build_tweet_store(args.csv_path, args.store_path)
+    store = TweetStore(path)
+    print(f"Wrote {len(store)} tweets over {store.meta['days']} days to {path}")